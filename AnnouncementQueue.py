@@ -0,0 +1,65 @@
+import asyncio
+
+
+class AnnouncementQueue:
+    # Collects the announcements mirrored to a channel during a short window and sends them
+    # as one embed, only splitting when the joined text would pass char_limit.
+    # With ordered=True a channel's batches go out strictly one after another;
+    # otherwise a new batch may be sent while the previous one is still in flight.
+    def __init__(self, send, window=1.0, char_limit=1000, ordered=True):
+        self.send = send
+        self.window = window
+        self.char_limit = char_limit
+        self.ordered = ordered
+        self.pending = {}
+        self.flushing = {}
+        self.announced = 0
+        self.api_calls = 0
+        self.api_calls_saved = 0
+
+    def announce(self, channel, description, footer=""):
+        self.announced += 1
+        batch = self.pending.get(channel.id)
+        if batch is not None:
+            batch[1].append((description, footer))
+            return
+        self.pending[channel.id] = (channel, [(description, footer)])
+        if self.window > 0:
+            asyncio.get_event_loop().call_later(self.window, self.start_flush, channel.id)
+        else:
+            self.start_flush(channel.id)
+
+    def start_flush(self, channel_id):
+        channel, announcements = self.pending.pop(channel_id)
+        previous = self.flushing.get(channel_id) if self.ordered else None
+        task = asyncio.ensure_future(self.flush(channel, announcements, previous))
+        self.flushing[channel_id] = task
+        task.add_done_callback(lambda t: self.flushing.pop(channel_id) if self.flushing.get(channel_id) is t else None)
+
+    def batches(self, announcements):
+        lines = []
+        length = 0
+        footer = ""
+        for description, announcement_footer in announcements:
+            if lines and length + len(description) + 1 > self.char_limit:
+                yield "\n".join(lines), footer
+                lines = []
+                length = 0
+            lines.append(description)
+            length += len(description) + 1
+            # later footers carry the newer counts
+            footer = announcement_footer
+        if lines:
+            yield "\n".join(lines), footer
+
+    async def flush(self, channel, announcements, previous=None):
+        if previous is not None:
+            await asyncio.wait([previous])
+        batches = list(self.batches(announcements))
+        self.api_calls += len(batches)
+        self.api_calls_saved += len(announcements) - len(batches)
+        for description, footer in batches:
+            try:
+                await self.send(channel, description, footer=footer)
+            except Exception as e:
+                print('Announcement to %s failed: %r' % (channel.id, e))
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+MENTION_RE = re.compile(r'<@!?([0-9]+)>')
+BARE_ID_RE = re.compile(r'(?<![0-9])[0-9]{15,21}(?![0-9])')
+TOKEN_RE = re.compile(r'"[^"]*"|\S+')
+FLUSH_INTERVAL = 5.0  # seconds; lines written since the last flush are lost if the process dies
+
+
+class CommandRecorder:
+    # Appends one JSON line per invoked command. User and channel IDs, including mentions and bare
+    # IDs in the arguments, are replaced with keyed hashes: stable within a recording, but not
+    # reversible without the salt, which is random per process unless one is given.
+    # Arguments that name a user (user_arguments maps a command to how many leading arguments do,
+    # None for all of them) are hashed too: resolve_user(session_id, name) gives the ID a name
+    # stands for, so a name and an ID for the same user come out the same. Names it can't place
+    # are hashed as they are, and keywords are kept.
+    def __init__(self, path, session_of=None, salt=None, resolve_user=None, user_arguments=None, keywords=()):
+        self.path = path
+        self.session_of = session_of
+        self.salt = salt if salt is not None else os.urandom(16)
+        self.resolve_user = resolve_user
+        self.user_arguments = user_arguments or {}
+        self.keywords = set(keywords)
+        self.started = time.monotonic()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.flushed = self.started
+        self.recorded = 0
+
+    def anonymize(self, snowflake):
+        return hashlib.blake2b(str(snowflake).encode(), key=self.salt, digest_size=6).hexdigest()
+
+    def anonymize_text(self, text, session_id=None, user_arguments=0):
+        position = 0
+
+        def anonymize_token(match):
+            nonlocal position
+            token = match.group(0)
+            position += 1
+            if user_arguments is None or position <= user_arguments:
+                name = token.strip('"')
+                if name.lower() in self.keywords:
+                    return token
+                if MENTION_RE.fullmatch(name) or BARE_ID_RE.fullmatch(name):
+                    return "<@%s>" % self.anonymize(re.sub(r'[^0-9]', '', name))
+                user_id = self.resolve_user(session_id, name) if self.resolve_user and session_id is not None else None
+                return "<@%s>" % self.anonymize(user_id if user_id is not None else name)
+            token = MENTION_RE.sub(lambda m: "<@%s>" % self.anonymize(m.group(1)), token)
+            return BARE_ID_RE.sub(lambda m: "<@%s>" % self.anonymize(m.group(0)), token)
+        return TOKEN_RE.sub(anonymize_token, text)
+
+    def begin(self, ctx):
+        # names are resolved in the session the author was in when the command started,
+        # which a leave or end has taken away by the time it's recorded
+        if self.session_of is not None:
+            ctx.recorded_session = self.session_of(ctx.author.id)
+
+    def record(self, ctx, seconds, failed):
+        arguments = ctx.message.content[len(ctx.prefix) + len(ctx.invoked_with):].strip()
+        command = ctx.command.qualified_name
+        session_id = getattr(ctx, 'recorded_session', None)
+        entry = {'t': round(time.monotonic() - seconds - self.started, 4),
+                 'c': command,
+                 'a': self.anonymize_text(arguments, session_id, self.user_arguments.get(command, 0)),
+                 'u': self.anonymize(ctx.author.id),
+                 'ch': self.anonymize(ctx.channel.id),
+                 'dm': int(ctx.guild is None),
+                 'd': round(seconds, 6),
+                 'ok': int(not failed)}
+        if self.session_of is not None:
+            # looked up after the command ran, so a start records the session it created
+            entry['s'] = self.session_of(ctx.author.id)
+        self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.recorded += 1
+        now = time.monotonic()
+        if now - self.flushed > FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.flushed = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_recording(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,40 @@
+import asyncio
+import discord
+
+# message components arrived with discord.py 2.0; on 1.x confirmations stay on reactions
+BUTTONS_SUPPORTED = hasattr(discord, 'ui')
+
+if BUTTONS_SUPPORTED:
+    class ConfirmView(discord.ui.View):
+        # Yes/No buttons for one confirmation. Only receiver_id may answer; the first answer
+        # resolves self.answer with (accepted, interaction) so the caller can edit the message
+        # through the interaction response instead of a separate REST call.
+        def __init__(self, receiver_id, timeout, yes_label, no_label):
+            super().__init__(timeout=timeout)
+            self.receiver_id = receiver_id
+            self.answer = asyncio.get_event_loop().create_future()
+            self.yes_button.label = yes_label
+            self.no_button.label = no_label
+
+        async def interaction_check(self, interaction):
+            if interaction.user.id != self.receiver_id:
+                await interaction.response.send_message("This request isn't for you!", ephemeral=True)
+                return False
+            return not self.answer.done()
+
+        def resolve(self, accepted, interaction):
+            if not self.answer.done():
+                self.answer.set_result((accepted, interaction))
+            self.stop()
+
+        @discord.ui.button(style=discord.ButtonStyle.success)
+        async def yes_button(self, interaction, button):
+            self.resolve(True, interaction)
+
+        @discord.ui.button(style=discord.ButtonStyle.danger)
+        async def no_button(self, interaction, button):
+            self.resolve(False, interaction)
+
+        async def on_timeout(self):
+            if not self.answer.done():
+                self.answer.set_exception(asyncio.TimeoutError())
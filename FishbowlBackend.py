@@ -1,9 +1,18 @@
 import json
+import os
 import discord
 from discord.ext import commands
 import asyncio
+import time
+from dotenv import load_dotenv
+from NotificationDispatcher import NotificationDispatcher
+from AnnouncementQueue import AnnouncementQueue
+from ReactionWaiters import ReactionWaiters
+from UserCache import UserCache
+import ConfirmButtons
+from Metrics import MetricsRegistry
 
-intents = discord.Intents.default()
+load_dotenv()
 
 DEFAULT_EMBED_COLOR = 0xFFA500
 ERROR_EMBED_COLOR = 0xFF6347
@@ -11,58 +20,174 @@ BUG_EMBED_COLOR = 0x5058a8
 MESSAGE_MAX_LEN = 2000
 DEFAULT_PREFIX = "!"
 PREFIX_JSON = "guild_prefixes.json"
+SEND_CONCURRENCY = 16
+ROUTE_CONCURRENCY = 1  # one in-flight send per channel/DM keeps that destination's messages in order
+ROUTE_RATE = 5  # Discord allows ~5 messages per 5 seconds per channel
+ROUTE_PERIOD = 5.0
+ANNOUNCE_WINDOW = 1.0  # seconds to collect home channel announcements before sending; 0 sends right away
+ANNOUNCE_CHAR_LIMIT = 1000
+ANNOUNCE_ORDERED = True
+USER_CACHE_SIZE = 10000
+USER_MISS_TTL = 300.0  # seconds to remember users Discord couldn't find
+USER_FETCH_RATE = 10  # fetch_user calls per USER_FETCH_PERIOD
+USER_FETCH_PERIOD = 1.0
+# lean mode asks for only the events the bot handles and keeps no member or message cache;
+# session players are held by each session's MemberIndex and everyone else is fetched by ID on demand,
+# so users outside a session can't be named in lean mode, only mentioned
+LEAN_GATEWAY = os.getenv('LEAN_GATEWAY', '0') != '0'
+# "buttons" needs discord.py 2.0 message components; anything else (or 1.x) uses reactions
+CONFIRM_MODE = os.getenv('CONFIRM_MODE', 'buttons')
+CONFIRM_BUTTONS = CONFIRM_MODE == 'buttons' and ConfirmButtons.BUTTONS_SUPPORTED
+
+
+PREFIX_SAVE_DELAY = 5.0
+
+prefixes = {}
+_prefixes_dirty = False
+_prefix_save_task = None
+
+
+def load_prefixes():
+    prefixes.clear()
+    try:
+        with open(PREFIX_JSON, 'r') as f:
+            prefixes.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    return prefixes
 
 
 def get_prefix(bot, message):
     if message.channel.type is not discord.ChannelType.private:
-        with open(PREFIX_JSON, 'r') as f:
-            prefixes = json.load(f)
-            if str(message.guild.id) not in prefixes:
-                prefixes[str(message.guild.id)] = DEFAULT_PREFIX
-            pf = prefixes[str(message.guild.id)]
-    else:
-        pf = DEFAULT_PREFIX
-    return pf
+        return prefixes.get(str(message.guild.id), DEFAULT_PREFIX)
+    return DEFAULT_PREFIX
 
 
-client = discord.Client()
-bot = commands.Bot(command_prefix=get_prefix, help_command=None)
+def write_prefixes(prefix_snapshot):
+    # write to a temp file and rename over the old one so a crash never leaves half a json file
+    tmp_path = PREFIX_JSON + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(prefix_snapshot, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, PREFIX_JSON)
 
-waiting_users = []
+
+async def save_prefixes_later():
+    global _prefixes_dirty, _prefix_save_task
+    try:
+        while _prefixes_dirty:
+            await asyncio.sleep(PREFIX_SAVE_DELAY)
+            _prefixes_dirty = False
+            await asyncio.get_event_loop().run_in_executor(None, write_prefixes, dict(prefixes))
+    finally:
+        _prefix_save_task = None
+
+
+def schedule_prefix_save():
+    global _prefixes_dirty, _prefix_save_task
+    _prefixes_dirty = True
+    if _prefix_save_task is None:
+        _prefix_save_task = asyncio.get_event_loop().create_task(save_prefixes_later())
+
+
+def gateway_options(lean=LEAN_GATEWAY):
+    intents = discord.Intents.default() if not lean else discord.Intents.none()
+    # 2.0 only sends message text to bots with this intent, and prefix commands need it
+    if hasattr(intents, 'message_content'):
+        intents.message_content = True
+    if not lean:
+        return {'intents': intents}
+    intents.guilds = True
+    intents.messages = True
+    # confirmations answered with buttons arrive as interactions, not reactions
+    intents.reactions = not CONFIRM_BUTTONS
+    return {'intents': intents,
+            'member_cache_flags': discord.MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+            'max_messages': None}
+
+
+bot = commands.Bot(command_prefix=get_prefix, help_command=None, **gateway_options())
+
+reaction_waiters = ReactionWaiters()
+user_cache = UserCache(bot,
+                       max_size=USER_CACHE_SIZE,
+                       negative_ttl=USER_MISS_TTL,
+                       fetch_rate=USER_FETCH_RATE,
+                       fetch_period=USER_FETCH_PERIOD)
+dispatcher = NotificationDispatcher(concurrency=SEND_CONCURRENCY,
+                                    route_concurrency=ROUTE_CONCURRENCY,
+                                    route_rate=ROUTE_RATE,
+                                    route_period=ROUTE_PERIOD)
+
+
+metrics = MetricsRegistry()
+command_count = metrics.counter('fishbowl_commands_total', 'Commands run, by command and outcome', ('command', 'status'))
+command_latency = metrics.histogram('fishbowl_command_seconds', 'Command handler latency', ('command',))
+command_errors = metrics.counter('fishbowl_command_errors_total', 'Command errors, by command and error type', ('command', 'error'))
+api_latency = metrics.histogram('fishbowl_discord_api_seconds', 'Discord REST call latency, including rate limit waits',
+                                ('method', 'route'))
+metrics.gauge('fishbowl_notifications_sent_total', 'Messages sent through the dispatcher', lambda: dispatcher.sent, 'counter')
+metrics.gauge('fishbowl_notifications_failed_total', 'Dispatcher sends that failed', lambda: dispatcher.failed, 'counter')
+metrics.gauge('fishbowl_announcements_total', 'Home channel announcements queued', lambda: announcements.announced, 'counter')
+metrics.gauge('fishbowl_announcement_api_calls_saved_total', 'Sends saved by batching announcements',
+              lambda: announcements.api_calls_saved, 'counter')
+metrics.gauge('fishbowl_user_cache_hit_ratio', 'User cache hit ratio', lambda: user_cache.stats()['hit_rate'])
+metrics.gauge('fishbowl_user_fetches_total', 'fetch_user calls made on cache misses', lambda: user_cache.fetches, 'counter')
+metrics.gauge('fishbowl_pending_confirmations', 'Confirmations waiting for an answer', lambda: len(reaction_waiters.pairs))
+
+
+def time_api_calls(http):
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        finally:
+            api_latency.observe(time.perf_counter() - started, route.method, route.path)
+    http.request = timed_request
+
+
+time_api_calls(bot.http)
+
+# set to a CommandRecorder to log every invoked command for offline replay
+recorder = None
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started = time.perf_counter()
+    if recorder is not None:
+        recorder.begin(ctx)
+
+
+@bot.after_invoke
+async def record_command(ctx):
+    seconds = time.perf_counter() - ctx.started
+    command_latency.observe(seconds, ctx.command.qualified_name)
+    command_count.inc(ctx.command.qualified_name, 'error' if ctx.command_failed else 'ok')
+    if recorder is not None:
+        recorder.record(ctx, seconds, ctx.command_failed)
 
 
 @bot.event
 async def on_guild_join(guild): #when the bot joins the guild
-    with open(PREFIX_JSON, 'r') as f:
-        prefixes = json.load(f)
-
     prefixes[str(guild.id)] = DEFAULT_PREFIX
-
-    with open(PREFIX_JSON, 'w') as f:
-        json.dump(prefixes, f, indent=4)
+    schedule_prefix_save()
 
 
 @bot.event
 async def on_guild_remove(guild):
-    with open(PREFIX_JSON, 'r') as f:
-        prefixes = json.load(f)
-
     if str(guild.id) in prefixes:
         prefixes.pop(str(guild.id))
-
-    with open(PREFIX_JSON, 'w') as f:
-        json.dump(prefixes, f, indent=4)
+        schedule_prefix_save()
 
 
 async def changeprefix(guild_id, prefix):
-    with open(PREFIX_JSON, 'r') as f:
-        prefixes = json.load(f)
-
     prefixes[str(guild_id)] = prefix
-
-    with open(PREFIX_JSON, 'w') as f:
-        json.dump(prefixes, f, indent=4)
-
+    schedule_prefix_save()
     return True
 
 
@@ -72,35 +197,53 @@ async def on_ready():
     print(f'{bot.user} has connected to Discord!')
 
 
+@bot.event
+async def on_message(message):
+    # almost no messages are commands: skip building a Context unless the content starts with the prefix
+    if message.author.bot or not message.content.startswith(get_prefix(bot, message)):
+        return
+    await bot.process_commands(message)
+
+
+@bot.event
+async def on_raw_reaction_add(payload):
+    reaction_waiters.dispatch(payload)
+
+
 @bot.event
 async def on_command_error(ctx, error):
+    command_errors.inc(ctx.command.qualified_name if ctx.command else 'unknown', type(error).__name__)
     if isinstance(error, commands.CommandNotFound):
         return await send_error(ctx, str(error)+"!")
     pass
 
 
 async def is_already_waiting(sender, receiver):
-    return (sender.id, receiver.id) in waiting_users
+    return reaction_waiters.is_waiting(sender.id, receiver.id)
+
 
+async def wait_for_reaction(message, sender, receiver, emoji, timeout):
+    return await reaction_waiters.wait(message.id, sender.id, receiver.id, emoji, timeout)
 
-async def wait_for_reaction(sender, receiver, timeout, check):
-    waiting_users.append((sender.id, receiver.id))
+
+async def wait_for_buttons(view, sender, receiver):
+    # shares the (sender, receiver) bookkeeping with reaction confirmations
+    reaction_waiters.pairs.add((sender.id, receiver.id))
     try:
-        reaction, user = await bot.wait_for('reaction_add', timeout=timeout, check=check)
-    except asyncio.TimeoutError as e:
-        raise e
+        return await view.answer
     finally:
-        waiting_users.remove((sender.id, receiver.id))
-    return reaction, user
+        reaction_waiters.pairs.discard((sender.id, receiver.id))
 
 
-async def send_message(context, msg_text):
+async def send_message(context, msg_text, view=None):
     msg_embed = discord.Embed(description=msg_text,
                               color=DEFAULT_EMBED_COLOR)
-    return await context.send(embed=msg_embed)
+    if view is not None:
+        return await dispatcher.send(context, embed=msg_embed, view=view)
+    return await dispatcher.send(context, embed=msg_embed)
 
 
-async def send_embed(context, description, footer="", color=DEFAULT_EMBED_COLOR, fields={}, title=""):
+def build_embed(description, footer="", color=DEFAULT_EMBED_COLOR, fields={}, title=""):
     msg_embed = discord.Embed(description=description,
                               title=title,
                               color=color)
@@ -110,17 +253,59 @@ async def send_embed(context, description, footer="", color=DEFAULT_EMBED_COLOR,
     if fields:
         for key in fields:
             msg_embed.add_field(name=key, value=fields[key])
-    return await context.send(embed=msg_embed)
+    return msg_embed
+
+
+async def send_embed(context, description, footer="", color=DEFAULT_EMBED_COLOR, fields={}, title=""):
+    msg_embed = build_embed(description, footer=footer, color=color, fields=fields, title=title)
+    return await dispatcher.send(context, embed=msg_embed)
+
+
+async def send_built_embed(context, msg_embed):
+    return await dispatcher.send(context, embed=msg_embed)
 
 
 async def send_error(context, msg_text):
     msg_embed = discord.Embed(description=msg_text,
                               color=ERROR_EMBED_COLOR)
-    return await context.send(embed=msg_embed)
+    return await dispatcher.send(context, embed=msg_embed)
+
+
+announcements = AnnouncementQueue(send_embed,
+                                  window=ANNOUNCE_WINDOW,
+                                  char_limit=ANNOUNCE_CHAR_LIMIT,
+                                  ordered=ANNOUNCE_ORDERED)
+
+
+def announce(channel, description, footer=""):
+    announcements.announce(channel, description, footer=footer)
+
+
+async def fan_out(sends):
+    failures = [f for f in await dispatcher.fan_out(sends) if f is not None]
+    for failure in failures:
+        print('Notification failed: %r' % failure)
+    return failures
 
 
 async def find_user(user_id):
     if isinstance(user_id, int):
-        return bot.get_user(user_id)
+        return await user_cache.get_user(user_id)
+    else:
+        return None
+
+
+async def find_dm(user_id):
+    if isinstance(user_id, int):
+        return await user_cache.get_dm(user_id)
     else:
         return None
+
+
+async def send_dm(user_id, msg_text):
+    # looks up the DM channel and sends, so a batch of these can go through fan_out together and a
+    # failed lookup is reported like a failed send; users Discord can't find are skipped
+    dm_ctx = await find_dm(user_id)
+    if dm_ctx is None:
+        return None
+    return await send_message(dm_ctx, msg_text)
@@ -1,29 +1,69 @@
 # bot.py
+import StartupProfiler
 import os
 #import json
 import discord
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 import FishbowlBackend
-import datetime
-import random
+import SessionStore
+from SessionRegistry import SessionRegistry
+import ConfirmButtons
+import SlashCommands
+from CommandRecorder import CommandRecorder
+from Session import Session
+from MemberIndex import MemberIndex
+from ScrapPile import scrap_bytes
+from UndoHistory import UndoHistory, MOVED, REMOVED
+import time
+import sys
 import typing
 import traceback
 import asyncio
-import pandas as pd
+import csv
+import itertools
 import re
 
+profiler = StartupProfiler.StartupProfiler()
+profiler.mark("imports")
+
 load_dotenv()
 token = os.getenv('DISCORD_TOKEN')
+session_db = os.getenv('SESSION_DB')
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite')  # 'sqlite' keeps rows, 'journal' keeps an event log
 
 MAX_USER_SESSIONS = 1
 MAX_USERS_PER_SESSION = 99
-MAX_TOTAL_SESSIONS = 100
-MAX_BOWL_SIZE = 999
+MAX_TOTAL_SESSIONS = int(os.getenv('MAX_TOTAL_SESSIONS', 10000))
+MAX_BOWL_SIZE = int(os.getenv('MAX_BOWL_SIZE', 10000))
+# a full bowl of MAX_BOWL_SIZE scraps of typical length (up to ~250 characters) fits in MAX_SESSION_BYTES;
+# MAX_TOTAL_BYTES caps all sessions together (piles and undo histories), whatever the session count
+MAX_SESSION_BYTES = int(os.getenv('MAX_SESSION_BYTES', 4 * 1024 * 1024))
+MAX_TOTAL_BYTES = int(os.getenv('MAX_TOTAL_BYTES', 512 * 1024 * 1024))
 CONFIRM_TIME_OUT = 10.0
 BG_REFRESH_TIME = 60.0
-SESSION_TIMEOUT = datetime.timedelta(days=0, hours=1, seconds=0)
+SESSION_TIMEOUT = 60.0 * 60.0
 BUG_REPORT_CHANNEL = 796498229872820314
+SLASH_COMMANDS = os.getenv('SLASH_COMMANDS', '1') != '0' and SlashCommands.SLASH_SUPPORTED
+SYNC_SLASH_COMMANDS = os.getenv('SYNC_SLASH_COMMANDS', '0') != '0'
+# slash commands whose scrap arguments autocomplete from the invoker's hand
+HAND_SCRAP_COMMANDS = ('play', 'destroy', 'return', 'pass', 'edit')
+# unmatched scraps get "did you mean" suggestions from the pile; a single suggestion at least
+# FUZZY_AUTO_PICK similar is taken as if it had been typed, except by commands that discard or destroy
+FUZZY_MATCH = os.getenv('FUZZY_MATCH', '0') != '0'
+# commands that only take scraps named in full (in any case) and suggest prefix and fuzzy matches instead,
+# since the player can't take a wrong pick back (edit never auto-picks)
+NO_AUTO_PICK_COMMANDS = ('discard', 'destroy')
+FUZZY_AUTO_PICK = float(os.getenv('FUZZY_AUTO_PICK', 0.9))
+# how many leading arguments of each command name a user (None: all of them), for the recorder
+USER_ARGUMENTS = {'show': 1, 'pass': 1, 'take': 1, 'leave': 1, 'ban': None, 'unban': None}
+SHOW_KEYWORDS = ('all', 'public', 'hand')
+# metrics are served at http://METRICS_HOST:METRICS_PORT/metrics when a port is set
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+# append every invoked command, anonymized, to this file for Simulator.py --replay
+RECORD_COMMANDS = os.getenv('RECORD_COMMANDS')
+STARTUP_BUDGET = float(os.getenv('STARTUP_BUDGET', 5.0))
 SCRAP_MAX_LEN = 1000
 EMBED_DESCRIPTION_LIMIT = 1000
 EMBED_FOOTER_LIMIT = 1000
@@ -31,11 +71,45 @@ EMBED_FOOTER_LIMIT = 1000
 EMOJI_Y = "\N{THUMBS UP SIGN}"
 EMOJI_N = "\N{THUMBS DOWN SIGN}"
 
-help_df = pd.read_csv(r"Fishbowl_help.tsv", index_col="Command", sep="\t").fillna('')
-help_df["DetailedHelp"] = help_df["DetailedHelp"].str.replace('\\\\n', '\n', regex=True)
+HELP_TSV = "FishBowl_help.tsv"
+
+
+def load_help_table(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f, delimiter='\t', quoting=csv.QUOTE_NONE))
+    help_table = {}
+    for row in sorted(rows, key=lambda r: r["Command"]):
+        row = {key: value or '' for key, value in row.items()}
+        row["DetailedHelp"] = row["DetailedHelp"].replace('\\n', '\n')
+        help_table[row["Command"]] = row
+    return help_table
+
+
+with profiler.phase("help table"):
+    help_table = load_help_table(HELP_TSV)
+help_embeds = {}
+
+# Handlers change session state only in synchronous sections (the apply_* closures and the
+# tail of join/leave/ban): nothing is awaited between reading the state and writing it, so each
+# section is atomic on the event loop. Anything read before an await is checked again there.
+registry = SessionRegistry(MAX_TOTAL_SESSIONS, SESSION_TIMEOUT)
+sessions = registry.sessions
+users = registry.users
 
-sessions = {}
-users = {}
+FishbowlBackend.metrics.gauge('fishbowl_sessions', 'Active sessions', lambda: len(sessions))
+FishbowlBackend.metrics.gauge('fishbowl_users', 'Users in a session', lambda: len(users))
+FishbowlBackend.metrics.gauge('fishbowl_scraps', 'Scraps across all sessions',
+                              lambda: sum(session.total_scraps for session in sessions.values()))
+FishbowlBackend.metrics.gauge('fishbowl_session_bytes', 'Approximate memory held by session piles', registry.total_bytes)
+FishbowlBackend.metrics.gauge('fishbowl_undo_bytes', 'Approximate memory held by undo histories',
+                              lambda: sum(session.history.nbytes for session in sessions.values()))
+
+if session_db and SESSION_STORE == 'journal':
+    store = SessionStore.JournalStore(session_db, state_of=sessions.get)
+elif session_db:
+    store = SessionStore.SQLiteStore(session_db)
+else:
+    store = SessionStore.MemoryStore()
 
 
 class CreatorOnly(commands.CheckFailure):
@@ -71,7 +145,7 @@ def check_creator():
     async def predicate(ctx):
         user_id = ctx.author.id
         session_id = users[user_id]
-        if sessions[session_id]['creator'] != user_id:
+        if sessions[session_id].creator != user_id:
             raise CreatorOnly()
         return True
     return commands.check(predicate)
@@ -109,7 +183,8 @@ async def general_errors(ctx, error):
 
 
 def clean_session_id(argument):
-    return argument.lower().strip()
+    argument = argument.strip()
+    return int(argument) if argument.isdigit() else None
 
 
 def clean_arg(argument):
@@ -117,11 +192,19 @@ def clean_arg(argument):
 
 
 def session_update_time(session_id):
-    sessions[session_id]['last_modified'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sessions[session_id].last_active = time.monotonic()
+    store.touch(session_id, time.time())
     return
 
 
+def still_playing(session, user_id):
+    # for handlers picking up after an await: the session may have ended or the user left it meanwhile
+    return sessions.get(session.id) is session and user_id in session.players
+
+
 def user_to_readable(user):
+    if user is None:
+        return "(unknown user)"
     return "%s#%s" % (user.name, user.discriminator)
 
 
@@ -155,60 +238,188 @@ async def get_user_session(ctx, user_id):
     return session_id
 
 
-async def username_session_lookup(session_id, username):
-    if session_id not in sessions:
+async def lookup_member(ctx, arg):
+    # IDs and mentions are fetched over HTTP, which needs no intents; names can only be found through
+    # the member cache or a gateway query, and both need the members intent
+    user_id = MemberIndex.parse_id(arg)
+    if user_id is not None:
+        return await FishbowlBackend.find_user(user_id)
+    if not FishbowlBackend.bot.intents.members:
         return None
+    return await commands.MemberConverter().convert(ctx, arg)
 
-    try:
-        username, discrim = username.split("#")
-    except ValueError:
+
+async def resolve_members(ctx, session_id, args, fallback=False):
+    # players and banned users are looked up in the session's index; with fallback, the rest
+    # are looked up together instead of one after another
+    members = sessions[session_id].members
+    resolved = {arg: members.resolve(arg) for arg in args}
+    missing = [arg for arg in resolved if resolved[arg] is None]
+    if fallback and missing:
+        looked_up = await asyncio.gather(*[lookup_member(ctx, arg) for arg in missing], return_exceptions=True)
+        for arg, user in zip(missing, looked_up):
+            if not isinstance(user, Exception):
+                resolved[arg] = user
+    return resolved
+
+
+def resolve_player(session_id, arg):
+    return sessions[session_id].members.resolve(arg)
+
+
+def recorded_user_id(session_id, arg):
+    if session_id not in sessions:
         return None
+    user = resolve_player(session_id, arg)
+    return user.id if user is not None else None
 
-    all_players = [await FishbowlBackend.find_user(user_id) for user_id in sessions[session_id]['players'].keys()]
-    player_match = next((player for player in all_players if player.name == username and player.discriminator == discrim),
-                        None)
-    return player_match
 
+def take_scraps(pile, scraps, partial=True, auto_pick=True):
+    # exact, then case-insensitive, then unique prefix, then fuzzy matches;
+    # ambiguous prefixes and near misses come back with their candidates, as do all prefixes without auto_pick
+    taken = []
+    not_found = []
+    ambiguous = []
+    for scrap in scraps:
+        if partial and auto_pick:
+            match_scrap, candidates = pile.take_match(scrap)
+        elif partial:
+            match_scrap = pile.take(scrap)
+            candidates = pile.complete(scrap) if match_scrap is None else []
+        else:
+            match_scrap, candidates = pile.take(scrap), []
+        if match_scrap is None and not candidates and partial and FUZZY_MATCH:
+            suggestions = pile.suggest(scrap)
+            if auto_pick and suggestions and suggestions[0][0] >= FUZZY_AUTO_PICK and \
+                    (len(suggestions) == 1 or suggestions[1][0] < FUZZY_AUTO_PICK):
+                match_scrap = suggestions[0][1]
+                pile.remove(match_scrap)
+            else:
+                candidates = [suggestion for ratio, suggestion in suggestions]
+        if match_scrap is not None:
+            taken.append(match_scrap)
+        elif candidates:
+            ambiguous.append((scrap, candidates))
+        else:
+            not_found.append(scrap)
+    return taken, not_found, ambiguous
 
-def reaction_check(message=None, emoji=None, author=None, ignore_bot=True):
-    message_id = message.id
 
-    def check(reaction, user):
-        if ignore_bot and user.bot:
-            return False
-        if message and reaction.message.id != message_id:
-            return False
-        if emoji and reaction.emoji not in emoji:
-            return False
-        if author and user.id != author.id:
-            return False
-        return True
-    return check
+def ambiguous_note(ambiguous):
+    return "".join("\nNote: Did you mean %s for `%s`?" % (cut_off_list(EMBED_FOOTER_LIMIT, candidates, delineator="` or `"), scrap)
+                   for scrap, candidates in ambiguous)
+
+
+def hand_scraps(user_id):
+    if user_id not in users:
+        return None
+    return sessions[users[user_id]].players[user_id]
 
 
-@tasks.loop(seconds=BG_REFRESH_TIME)
+# sleeps until the next session is due instead of polling every session on a fixed interval
+@tasks.loop(seconds=0)
 async def clean_inactive_sessions():
-    check_time = datetime.datetime.now()
-    inactive_sess = [key for key in sessions if
-                     (check_time - datetime.datetime.strptime(sessions[key]["last_modified"], '%Y-%m-%d %H:%M:%S')) > SESSION_TIMEOUT]
-    for key in inactive_sess:
+    await asyncio.sleep(min(registry.seconds_until_expiry(time.monotonic()), BG_REFRESH_TIME))
+    expired = []
+    for key in registry.pop_expired(time.monotonic()):
         print('Clearing Session #%s for inactivity...' % key)
-        user_list = sessions[key]['players'].keys()
-        for user_id in user_list:
-            msg = "Session #%s has been closed due to inactivity!" % key
-            if user_id == sessions[key]['creator']:
-                msg += "\nNext time, make sure to close the session once you're done with `end`!"
-            dm_ctx = await FishbowlBackend.find_user(user_id)
-            await FishbowlBackend.send_message(dm_ctx, msg)
+        session = sessions.pop(key)
+        for user_id in session.players:
             del users[user_id]
-        del sessions[key]
+        registry.release_id(key)
+        store.delete_session(key)
+        expired.append(session)
+    # every session is closed before the first await; the DMs are then looked up and sent all at once,
+    # and one that fails doesn't stop the others or the loop
+    notices = []
+    for session in expired:
+        for user_id in session.players:
+            msg = "Session #%s has been closed due to inactivity!" % session.id
+            if user_id == session.creator:
+                msg += "\nNext time, make sure to close the session once you're done with `end`!"
+            notices.append(FishbowlBackend.send_dm(user_id, msg))
+    await FishbowlBackend.fan_out(notices)
     return
 
 
+async def restore_sessions():
+    stored_sessions = store.load()
+    # DM channels aren't cached on startup, and a private home channel always belongs to the creator;
+    # look those and every member up at once rather than one session at a time
+    for session in stored_sessions.values():
+        session.home_channel = FishbowlBackend.bot.get_channel(session.home_channel) or session.home_channel
+    missing_channels = [session for session in stored_sessions.values() if isinstance(session.home_channel, int)]
+    member_ids = list({user_id for session in stored_sessions.values()
+                       for user_id in itertools.chain(session.players, session.bans)})
+    dm_channels, members = await asyncio.gather(
+        asyncio.gather(*[FishbowlBackend.find_dm(session.creator) for session in missing_channels]),
+        asyncio.gather(*[FishbowlBackend.find_user(user_id) for user_id in member_ids]))
+    for session, dm_channel in zip(missing_channels, dm_channels):
+        session.home_channel = dm_channel
+    members = dict(zip(member_ids, members))
+
+    for session_id, session in stored_sessions.items():
+        if session.home_channel is None:
+            print('Dropping Session #%s: could not find its home channel' % session_id)
+            store.delete_session(session_id)
+            continue
+        session.history = UndoHistory(max_bytes=MAX_SESSION_BYTES)
+        for user_id in itertools.chain(session.players, session.bans):
+            if members[user_id] is not None:
+                session.members.add(members[user_id])
+        if not registry.claim_id(session_id):
+            # a session started since then has the ID and its rows; leave both alone
+            print('Skipping Session #%s: its ID is already in use' % session_id)
+            continue
+        # players who are in another session by now stay there
+        conflicts = [user_id for user_id in session.players if users.get(user_id, session_id) != session_id]
+        if session.creator in conflicts:
+            print('Dropping Session #%s: its creator is in Session #%s' % (session_id, users[session.creator]))
+            registry.release_id(session_id)
+            store.delete_session(session_id)
+            continue
+        for user_id in conflicts:
+            session.add_scraps(session.bowl, list(session.remove_player(user_id)))
+            session.members.remove(user_id)
+            store.move_all(session_id, SessionStore.hand(user_id), SessionStore.BOWL)
+            store.remove_player(session_id, user_id)
+        sessions[session_id] = session
+        registry.track_expiry(session_id)
+        for user_id in session.players:
+            users[user_id] = session_id
+    if sessions:
+        print('Restored %d session(s)' % len(sessions))
+
+
+# Commands wait here until the stored sessions are back, so nothing runs against a half-restored table.
+sessions_restored = asyncio.Event()
+restore_task = None
+
+
+async def restore_then_open():
+    try:
+        await restore_sessions()
+    finally:
+        sessions_restored.set()
+
+
+async def accept_commands():
+    # restores the stored sessions the first time it's called
+    global restore_task
+    if restore_task is None:
+        restore_task = asyncio.ensure_future(restore_then_open())
+    await restore_task
+
+
+async def wait_for_restore(ctx):
+    await sessions_restored.wait()
+    return True
+
+
 @clean_inactive_sessions.before_loop
 async def wait_for_ready():
     print('Background tasks waiting...')
-    await FishbowlBackend.bot.wait_until_ready()
+    await sessions_restored.wait()
 
 
 @commands.command(name="changeprefix")
@@ -234,26 +445,27 @@ async def changeprefix_error(ctx, error):
 @commands.command()
 async def start(ctx, *args):
     creator_id = ctx.author.id
-    session_id = next((str(i) for i in range(MAX_TOTAL_SESSIONS) if i not in sessions), None)
+    seed = None
+    if args:
+        try:
+            seed = int(args[0])
+        except ValueError:
+            return await FishbowlBackend.send_error(ctx, "The session seed has to be a whole number!")
+    if creator_id in users:
+        return await FishbowlBackend.send_error(ctx, "Already in a session! (Session #`%s`)" % users[creator_id])
 
+    session_id = registry.allocate_id()
     if session_id is None:
         return await FishbowlBackend.send_error(ctx,
                                                 "Bot is handling too many sessions right now! Please try again later!")
 
-    if creator_id in users:
-        return await FishbowlBackend.send_error(ctx, "Already in a session! (Session #`%s`)" % users[creator_id])
-
     users[creator_id] = session_id
 
-    sessions[session_id] = {'bowl': [],
-                            'discard': [],
-                            'last_modified': "",
-                            'players': {creator_id: []},
-                            'creator': creator_id,
-                            'home_channel': ctx.channel,
-                            'total_scraps': 0,
-                            'ban_list': []}
-    session_update_time(session_id)
+    sessions[session_id] = Session(session_id, creator_id, ctx.channel, time.monotonic(),
+                                   seed=seed, history_bytes=MAX_SESSION_BYTES)
+    sessions[session_id].members.add(ctx.author)
+    store.create_session(session_id, creator_id, ctx.channel.id, time.time())
+    registry.track_expiry(session_id)
     return await FishbowlBackend.send_message(ctx,
                                               "Fishbowl session successfully created! (Session #%s)\n" % session_id +
                                               "Other users can join with `join %s`!" % session_id)
@@ -272,22 +484,24 @@ async def join(ctx, *args):
     if user_id in users:
         return await FishbowlBackend.send_error(ctx, "Already in a session! (Session ID `%s`)" % users[user_id])
     if session_id not in sessions:
-        return await FishbowlBackend.send_error(ctx, "Can't find Session #%s! Did you type it in correctly?" % session_id)
+        return await FishbowlBackend.send_error(ctx, "Can't find Session #%s! Did you type it in correctly?" % args[0])
 
-    if len(sessions[session_id]['players']) >= MAX_USERS_PER_SESSION:
+    if len(sessions[session_id].players) >= MAX_USERS_PER_SESSION:
         return await FishbowlBackend.send_error(ctx,
                                                 "Session #%s is at its maximum of %d players! Please try again later!" %
                                                 (session_id, MAX_USERS_PER_SESSION))
-    if ctx.author.id in sessions[session_id]['ban_list']:
+    if ctx.author.id in sessions[session_id].bans:
         return await FishbowlBackend.send_error(ctx,
                                                 "Can't join! You were banned from Session #%s by the creator!" % session_id)
 
-    sessions[session_id]['players'][user_id] = []
+    sessions[session_id].add_player(user_id)
+    sessions[session_id].members.add(ctx.author)
     users[user_id] = session_id
+    store.add_player(session_id, user_id)
     session_update_time(session_id)
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_message(sessions[session_id]['home_channel'], "%s joined Session #%s!" % (ctx.author.mention, session_id))
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel, "%s joined Session #%s!" % (ctx.author.mention, session_id))
 
     return await FishbowlBackend.send_message(ctx, "%s successfully joined Session #%s!" % (ctx.author.mention, session_id))
 
@@ -302,11 +516,12 @@ async def join_error(ctx, error):
 async def check_session(ctx, *args):
     user_id = ctx.author.id
     session_id = users[user_id]
-    session_players = [await FishbowlBackend.find_user(k) for k in sessions[session_id]['players']]
-    creator_user = await FishbowlBackend.find_user(sessions[session_id]['creator'])
+    session_update_time(session_id)
+    session = sessions[session_id]
+    session_players = await asyncio.gather(*[FishbowlBackend.find_user(k) for k in session.players])
+    creator_user = await FishbowlBackend.find_user(session.creator)
     if creator_user is None:
         return await FishbowlBackend.send_error(ctx, "Oops, internal error!")
-    session_update_time(session_id)
     valid_session_players = [user for user in session_players if user is not None]
     not_found_users = len(session_players) - len(valid_session_players)
     if not_found_users > 0:
@@ -326,11 +541,16 @@ async def check_bowl(ctx, *args):
     user_id = ctx.author.id
     session_id = users[user_id]
     session_update_time(session_id)
-    session_players = sessions[session_id]['players']
-    session_dict = {"Bowl Scraps": len(sessions[session_id]['bowl']),
-                    "Discard Scraps": "%d" % len(sessions[session_id]['discard']),
-                    "Player Hands": "\n".join(["%s: %d" % (await FishbowlBackend.find_user(player), len(session_players[player])) for player in session_players]),
-                    "Total Scraps": "%d" % sessions[session_id]['total_scraps']}
+    session = sessions[session_id]
+    player_ids = list(session.players)
+    player_users = await asyncio.gather(*[FishbowlBackend.find_user(player) for player in player_ids])
+    # counts are as of now; anyone who left during the lookups is skipped
+    session_dict = {"Bowl Scraps": len(session.bowl),
+                    "Discard Scraps": "%d" % len(session.discard),
+                    "Player Hands": "\n".join(["%s: %d" % (user_to_readable(player_user), len(session.players[player]))
+                                               for player, player_user in zip(player_ids, player_users)
+                                               if player in session.players]),
+                    "Total Scraps": "%d" % session.total_scraps}
 
     await FishbowlBackend.send_embed(ctx, "", title="Session #%s" % session_id, fields=session_dict)
 
@@ -353,12 +573,11 @@ async def leave(ctx, *args):
 
     session_update_time(session_id)
     if len(args) > 0:
-        try:
-            new_creator = await commands.MemberConverter().convert(ctx, args[0])
-        except commands.BadArgument:
+        new_creator = resolve_player(session_id, args[0])
+        if new_creator is None:
             return await FishbowlBackend.send_error(ctx,
                                                       "Couldn't find the specified user! Try mentioning them!")
-        if new_creator.id not in sessions[session_id]['players']:
+        if new_creator.id not in sessions[session_id].players:
             return await FishbowlBackend.send_error(ctx,
                                                       "Can't pass Creator status to someone not in the game!")
         if new_creator.id == user_id:
@@ -369,26 +588,41 @@ async def leave(ctx, *args):
         new_creator = ""
 
     creator_update = ""
-    if sessions[session_id]['creator'] == user_id:
-        if len(sessions[session_id]['players']) <= 1:
+    session = sessions[session_id]
+    if session.creator == user_id:
+        if len(session.players) <= 1:
             await FishbowlBackend.send_message(ctx, "Last person leaving; closing session...")
+            if not still_playing(session, user_id) or session.creator != user_id or len(session.players) > 1:
+                return await FishbowlBackend.send_error(ctx, "Session #%s changed while you were leaving! Try again!" % session_id)
             return await end(ctx, session_id)
         if not new_creator:
-            new_creator_id = random.sample(sessions[session_id]['players'].keys(), 1)[0]
+            new_creator_id = session.rng.choice([k for k in session.players if k != user_id])
             new_creator = await FishbowlBackend.find_user(new_creator_id)
-        if sessions[session_id]['home_channel'].type is discord.ChannelType.private:
-            if sessions[session_id]['home_channel'].recipient.id == sessions[session_id]['creator']:
-                sessions[session_id]['home_channel'] = await new_creator.create_dm()
-        sessions[session_id]['creator'] = new_creator.id
+            if new_creator is None:
+                return await FishbowlBackend.send_error(ctx, "Couldn't find a new creator! Try naming one!")
+        new_home_channel = None
+        if session.home_channel.type is discord.ChannelType.private and \
+                session.home_channel.recipient.id == session.creator:
+            new_home_channel = await FishbowlBackend.find_dm(new_creator.id)
+        # the lookups above awaited, so check nothing changed under us before handing over
+        if sessions.get(session_id) is not session or session.creator != user_id or \
+                user_id not in session.players or new_creator.id not in session.players:
+            return await FishbowlBackend.send_error(ctx, "Session #%s changed while you were leaving! Try again!" % session_id)
+        if new_home_channel is not None:
+            session.home_channel = new_home_channel
+            store.set_home_channel(session_id, new_home_channel.id)
+        session.creator = new_creator.id
+        store.set_creator(session_id, new_creator.id)
         creator_update = "\nCreator of Session #%s is now %s!" % (session_id, new_creator.mention)
 
-    sessions[session_id]['total_scraps'] -= len(sessions[session_id]['players'][user_id])
     del users[user_id]
-    del sessions[session_id]['players'][user_id]
+    sessions[session_id].remove_player(user_id)
+    sessions[session_id].members.remove(user_id)
+    store.remove_player(session_id, user_id)
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_message(sessions[session_id]['home_channel'],
-                                           "%s left Session #%s!" % (ctx.author.mention, session_id) + creator_update)
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel,
+                                 "%s left Session #%s!" % (ctx.author.mention, session_id) + creator_update)
 
     return await FishbowlBackend.send_message(ctx,
                                               "%s successfully left Session #%s!" % (ctx.author.mention, session_id)
@@ -411,16 +645,21 @@ async def end(ctx, *args):
         return await FishbowlBackend.send_error(ctx, "Oops, internal error!")
 
     notify_players = ctx.channel.type is discord.ChannelType.private and \
-                     sessions[session_id]['home_channel'].type is discord.ChannelType.private
+                     sessions[session_id].home_channel.type is discord.ChannelType.private
 
-    for player_id in sessions[session_id]['players']:
-        if notify_players and player_id != sessions[session_id]['creator']:
-            player_user = await FishbowlBackend.find_user(player_id)
-            player_dm = await player_user.create_dm()
-            await FishbowlBackend.send_message(player_dm, "%s ended Session #%s!" % (ctx.author.mention, session_id))
+    session = sessions.pop(session_id)
+    for player_id in session.players:
         del users[player_id]
-
-    del sessions[session_id]
+    registry.release_id(session_id)
+    store.delete_session(session_id)
+
+    notices = []
+    if notify_players:
+        notices = [FishbowlBackend.send_dm(player_id, "%s ended Session #%s!" % (ctx.author.mention, session_id))
+                   for player_id in session.players if player_id != session.creator]
+    failures = await FishbowlBackend.fan_out(notices)
+    if failures:
+        return await FishbowlBackend.send_message(ctx, "Session #%s ended! (Couldn't notify %d player(s))" % (session_id, len(failures)))
     return await FishbowlBackend.send_message(ctx, "Session #%s ended!" % session_id)
 
 
@@ -431,34 +670,68 @@ async def end_error(ctx, error):
     return await general_errors(ctx, error)
 
 
+def add_room_error(session_id, scraps):
+    if (sessions[session_id].total_scraps + len(scraps)) > MAX_BOWL_SIZE:
+        return "Too many scraps in the session! (Max: %d)" % MAX_BOWL_SIZE
+    nbytes = sum(scrap_bytes(scrap) for scrap in scraps)
+    if registry.session_bytes(session_id) + nbytes > MAX_SESSION_BYTES:
+        return "Session #%s is out of room for scraps! Try destroying some first!" % session_id
+    if registry.budget_used(time.monotonic()) + nbytes > MAX_TOTAL_BYTES:
+        return "I'm out of room for scraps right now! Try again once some sessions have ended!"
+    return None
+
+
 async def add_master(ctx, scraps, to_hand=False):
     user_id = ctx.author.id
     session_id = users[user_id]
     session_update_time(session_id)
 
-    if (sessions[session_id]['total_scraps'] + len(scraps)) > MAX_BOWL_SIZE:
+    if (sessions[session_id].total_scraps + len(scraps)) > MAX_BOWL_SIZE:
         await FishbowlBackend.send_embed(ctx,
                                          description="Too many scraps in the session! (Max: %d)" % MAX_BOWL_SIZE,
-                                         footer="Scraps: %d (Session #%s)" % (sessions[session_id]['total_scraps'], session_id),
+                                         footer="Scraps: %d (Session #%s)" % (sessions[session_id].total_scraps, session_id),
                                          color=FishbowlBackend.ERROR_EMBED_COLOR)
         return
 
     if any(len(scrap) > SCRAP_MAX_LEN for scrap in scraps):
         return await FishbowlBackend.send_error(ctx, "Scrap(s) too long! %d characters or less, please!" % SCRAP_MAX_LEN)
 
+    room_error = add_room_error(session_id, scraps)
+    if room_error:
+        return await FishbowlBackend.send_error(ctx, room_error)
+
     bad_scraps = [s for s in scraps if check_scrap(s)]
     for s in bad_scraps:
         await FishbowlBackend.send_error(ctx, check_scrap(s))
         scraps.remove(s)
 
-    sessions[session_id]['total_scraps'] += len(scraps)
     if to_hand:
         keywords = ("to their hand", "Hand")
-        target_place = sessions[session_id]['players'][user_id]
+        target_location = SessionStore.hand(user_id)
     else:
         keywords = ("to the bowl", "Bowl")
-        target_place = sessions[session_id]['bowl']
-    target_place += scraps
+        target_location = SessionStore.BOWL
+
+    def apply_add():
+        # checked again here since other commands may have landed while errors were sent
+        session = sessions.get(session_id)
+        if session is None or user_id not in session.players:
+            return None, "You're no longer in Session #%s!" % session_id
+        room_error = add_room_error(session_id, scraps)
+        if room_error:
+            return None, room_error
+        if to_hand:
+            target_place = session.players[user_id]
+        else:
+            target_place = session.bowl
+        session.add_scraps(target_place, scraps)
+        registry.charge_budget(sum(scrap_bytes(scrap) for scrap in scraps))
+        store.add_scraps(session_id, target_location, scraps)
+        return target_place, None
+
+    target_place, room_error = apply_add()
+    if room_error:
+        return await FishbowlBackend.send_error(ctx, room_error)
 
     if not scraps:
         descript = "%s added... 0 scrap(s) %s! Huh?\n" % (ctx.author.mention, keywords[0])
@@ -468,8 +741,8 @@ async def add_master(ctx, scraps, to_hand=False):
     else:
         descript = "%s added %d scrap(s) %s!\n" % (ctx.author.mention, len(scraps), keywords[0])
         footer = "%s: %d (Session #%s)" % (keywords[1], len(target_place), session_id)
-        if ctx.channel.id != sessions[session_id]['home_channel'].id:
-            await FishbowlBackend.send_embed(sessions[session_id]['home_channel'], description=descript, footer=footer)
+        if ctx.channel.id != sessions[session_id].home_channel.id:
+            FishbowlBackend.announce(sessions[session_id].home_channel, description=descript, footer=footer)
 
     await FishbowlBackend.send_embed(ctx, description=descript, footer=footer)
     return
@@ -497,6 +770,7 @@ async def draw_master(ctx, args, from_discard=False):
     user_id = ctx.author.id
     session_id = users[user_id]
     session_update_time(session_id)
+    session = sessions[session_id]
     try:
         args = int(args[0])
         is_int = True
@@ -504,49 +778,47 @@ async def draw_master(ctx, args, from_discard=False):
         is_int = False
 
     if from_discard:
-        source_pile = sessions[session_id]['discard']
+        source_location = SessionStore.DISCARD
         keyword = "discard pile"
     else:
-        source_pile = sessions[session_id]['bowl']
+        source_location = SessionStore.BOWL
         keyword = "bowl"
 
-    had_err = False
-    if is_int:
-        if args < 0:
-            return await FishbowlBackend.send_error(ctx, "Can't draw negative scraps!")
-        if args == 0:
-            drawn_scraps = []
-            descript = "... 0 scraps from the %s! Huh?" % keyword
-        elif args > len(source_pile):
-            drawn_scraps = []
-            descript = "Not enough scraps in the %s!" % keyword
-            had_err = True
-        else:
-            drawn_scraps = random.sample(source_pile, args)
-            [source_pile.remove(scrap) for scrap in drawn_scraps]
-            descript = " %d scrap(s) from the %s" % (args, keyword)
-    else:
-        drawn_scraps = []
-        fail_scraps = []
-        for arg in args:
-            match_scrap = next((s for s in source_pile if arg == s),
-                               next((s for s in source_pile if arg.lower() == s.lower()), None))
-            if match_scrap is None:
-                fail_scraps.append(arg)
-                continue
-            drawn_scraps.append(match_scrap)
-            source_pile.remove(match_scrap)
-
-        if not drawn_scraps:
-            descript = "Couldn't find any of those scraps in the %s!" % keyword
-            had_err = True
+    if is_int and args < 0:
+        return await FishbowlBackend.send_error(ctx, "Can't draw negative scraps!")
+
+    def apply_draw():
+        source_pile = SessionStore.pile_at(session, source_location)
+        had_err = False
+        if is_int:
+            if args == 0:
+                drawn_scraps = []
+                descript = "... 0 scraps from the %s! Huh?" % keyword
+            elif args > len(source_pile):
+                drawn_scraps = []
+                descript = "Not enough scraps in the %s!" % keyword
+                had_err = True
+            else:
+                drawn_scraps = source_pile.draw(args, session.rng)
+                descript = " %d scrap(s) from the %s" % (args, keyword)
         else:
-            descript = " %d specific scrap(s) from the %s" % (len(args), keyword)
+            drawn_scraps, fail_scraps, ambiguous_scraps = take_scraps(source_pile, args)
+
+            if not drawn_scraps:
+                descript = "Couldn't find any of those scraps in the %s!" % keyword
+                had_err = True
+            else:
+                descript = " %d specific scrap(s) from the %s" % (len(drawn_scraps), keyword)
+
+            if fail_scraps and not had_err:
+                descript += "\nNote: Couldn't find `%s`" % "`, `".join(fail_scraps)
+            descript += ambiguous_note(ambiguous_scraps)
 
-        if fail_scraps and not had_err:
-            descript += "\nNote: Couldn't find `%s`" % "`, `".join(fail_scraps)
+        session.players[user_id] += drawn_scraps
+        store.move_scraps(session_id, source_location, SessionStore.hand(user_id), drawn_scraps)
+        return drawn_scraps, descript, had_err
 
-    sessions[session_id]['players'][user_id] += drawn_scraps
+    drawn_scraps, descript, had_err = apply_draw()
 
     if not had_err:
         public_msg = "%s drew%s!" % (ctx.author.mention, descript)
@@ -557,8 +829,8 @@ async def draw_master(ctx, args, from_discard=False):
         public_msg = descript
         private_msg = descript
 
-    footer = "Hand: %d, Bowl: %d (Session #%s)" % (len(sessions[session_id]['players'][user_id]),
-                                                   len(sessions[session_id]['bowl']),
+    footer = "Hand: %d, Bowl: %d (Session #%s)" % (len(session.players[user_id]),
+                                                   len(session.bowl),
                                                    session_id)
 
     if ctx.message.channel.type is not discord.ChannelType.private:
@@ -570,8 +842,9 @@ async def draw_master(ctx, args, from_discard=False):
         else:
             await FishbowlBackend.send_embed(ctx.author, description=private_msg, footer=footer)
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id and not had_err:
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'], description=public_msg, footer=footer)
+    # the sends above awaited; the session may have ended since, but its home channel is still right
+    if ctx.channel.id != session.home_channel.id and not had_err:
+        FishbowlBackend.announce(session.home_channel, description=public_msg, footer=footer)
 
     return
 
@@ -673,22 +946,23 @@ async def peek(ctx, num_draw: int):
     if num_draw == 0:
         return await FishbowlBackend.send_embed(ctx,
                                                 description="%s peeked at... 0 scraps! Huh?" % ctx.author.mention,
-                                                footer="Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id))
+                                                footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id))
 
-    if num_draw > len(sessions[session_id]['bowl']):
+    if num_draw > len(sessions[session_id].bowl):
         return await FishbowlBackend.send_embed(ctx,
                                                 description="Not enough scraps in the bowl!\n",
-                                                footer="Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id),
+                                                footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id),
                                                 color=FishbowlBackend.ERROR_EMBED_COLOR)
-    drawn_scraps = random.sample(sessions[session_id]['bowl'], num_draw)
+    session = sessions[session_id]
+    drawn_scraps = session.bowl.sample(num_draw, session.rng)
 
-    footer = "Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id)
+    footer = "Bowl: %d (Session #%s)" % (len(session.bowl), session_id)
     public_msg = "%s is peeking at %d scrap(s) in the bowl..." % (ctx.author.mention, num_draw)
     if ctx.message.channel.type is not discord.ChannelType.private:
         await FishbowlBackend.send_embed(ctx, description=public_msg, footer=footer)
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'], description=public_msg, footer=footer)
+    if ctx.channel.id != session.home_channel.id:
+        FishbowlBackend.announce(session.home_channel, description=public_msg, footer=footer)
 
     return await list_send(ctx.author, description="You peek at %d scrap(s) in the bowl" % num_draw, entries=drawn_scraps, footer=footer)
 
@@ -718,7 +992,7 @@ async def hand(ctx, show_keyword: typing.Optional[clean_scrap] = ''):
 
     session_id = users[user_id]
     session_update_time(session_id)
-    user_hand = sessions[session_id]['players'][user_id]
+    user_hand = sessions[session_id].players[user_id]
     if ctx.message.channel.type is not discord.ChannelType.private and not public_show:
         await FishbowlBackend.send_embed(ctx,
                                            "%s is checking their hand..." % ctx.author.mention,
@@ -755,7 +1029,7 @@ async def edit(ctx, old_word: clean_scrap, new_word: clean_scrap, *args):
 
     session_id = users[user_id]
     session_update_time(session_id)
-    user_hand = sessions[session_id]['players'][user_id]
+    user_hand = sessions[session_id].players[user_id]
 
     err_msg = check_scrap(new_word)
     if err_msg:
@@ -763,34 +1037,48 @@ async def edit(ctx, old_word: clean_scrap, new_word: clean_scrap, *args):
     if len(new_word) > SCRAP_MAX_LEN:
         return await FishbowlBackend.send_error(ctx, "New scrap exceeds max length! (%d char)" % SCRAP_MAX_LEN)
 
-    try:
-        word_i = user_hand.index(old_word)
-        user_hand[word_i] = new_word
-
-        if ctx.channel.id != sessions[session_id]['home_channel'].id:
-            await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                             description="%s is changing a scrap in their hand!" % ctx.author.mention,
-                                             footer="(Session #%s)" % (session_id))
+    def apply_edit(location, pile, partial=False):
+        # your own hand also matches case-insensitively and by unique prefix; the bowl needs the exact scrap
+        if partial:
+            match_scrap, candidates = pile.match(old_word)
+        elif old_word in pile:
+            match_scrap, candidates = old_word, []
+        else:
+            match_scrap, candidates = None, []
+        if match_scrap is not None:
+            pile.replace(match_scrap, new_word)
+            store.edit_scrap(session_id, location, match_scrap, new_word)
+        return match_scrap, candidates
+
+    match_scrap, candidates = apply_edit(SessionStore.hand(user_id), user_hand, partial=True)
+    if match_scrap is not None:
+        if ctx.channel.id != sessions[session_id].home_channel.id:
+            FishbowlBackend.announce(sessions[session_id].home_channel,
+                                     description="%s is changing a scrap in their hand!" % ctx.author.mention,
+                                     footer="(Session #%s)" % (session_id))
 
         return await FishbowlBackend.send_embed(ctx,
                                                 description="%s changed `%s` to `%s` in their hand!" % (
-                                                ctx.author.mention, old_word, new_word),
+                                                ctx.author.mention, match_scrap, new_word),
                                                 footer="(Session #%s)" % (session_id))
-    except ValueError:
-        pass
-    try:
-        word_i = sessions[session_id]['bowl'].index(old_word)
-        if user_id != sessions[session_id]['creator']:
+    if old_word in sessions[session_id].bowl:
+        if user_id != sessions[session_id].creator:
             return await FishbowlBackend.send_error(ctx, "Only the session creator can edit scraps in the bowl!")
-        sessions[session_id]['bowl'][word_i] = new_word
+    if candidates:
+        return await FishbowlBackend.send_error(ctx, "Which scrap did you mean?" + ambiguous_note([(old_word, candidates)]))
+    match_scrap, _ = apply_edit(SessionStore.BOWL, sessions[session_id].bowl)
+    if match_scrap is not None:
         return await FishbowlBackend.send_embed(ctx,
                                                 description="%s changed `%s` to `%s` in the bowl!" % (
                                                 ctx.author.mention, old_word, new_word),
                                                 footer="(Session #%s)" % (session_id))
-    except ValueError:
-        pass
 
-    return await FishbowlBackend.send_error(ctx, "Couldn't find `%s`! (Must match exactly, including capitals!)" % old_word)
+    note = ""
+    if FUZZY_MATCH:
+        suggestions = [suggestion for ratio, suggestion in user_hand.suggest(old_word)]
+        if suggestions:
+            note = ambiguous_note([(old_word, suggestions)])
+    return await FishbowlBackend.send_error(ctx, "Couldn't find `%s`! (Scraps in the bowl must match exactly, including capitals!)" % old_word + note)
 
 
 @edit.error
@@ -827,52 +1115,65 @@ async def discard_destroy_return(ctx, scraps, func_type):
 
     session_id = users[user_id]
     session_update_time(session_id)
-    success_discard = []
+    session = sessions[session_id]
     fail_discard = []
-    user_hand = sessions[session_id]['players'][user_id]
+    ambiguous_discard = []
+    user_hand = session.players[user_id]
     if len(user_hand) == 0:
         return await FishbowlBackend.send_error(ctx, "%s doesn't have any scraps in their hand!" % ctx.author.mention)
 
+    if 'hand' not in func_type and len(scraps) == 0:
+        return await FishbowlBackend.send_error(ctx, "Need to give me the scrap you're %sing!" % keyword)
     if 'hand' in func_type:
-        success_discard = user_hand
-        if func_type == 'playhand':
-            sessions[session_id]['discard'] += user_hand
-        elif func_type == 'returnhand':
-            sessions[session_id]['bowl'] += user_hand
-        sessions[session_id]['players'][user_id] = []
         keyword = func_type[:-4]
-    else:
-        if len(scraps) == 0:
-            return await FishbowlBackend.send_error(ctx, "Need to give me the scrap you're %sing!" % keyword)
-
-        for scrap in scraps:
-            # tries case-sensitive match first, then case-insensitive match
-            match_scrap = next((s for s in user_hand if scrap == s),
-                               next((s for s in user_hand if scrap.lower() == s.lower()), None))
-            if match_scrap is None:
-                fail_discard.append(scrap)
-                continue
-            user_hand.remove(match_scrap)
+
+    def apply_discard():
+        success_discard = []
+        if 'hand' in func_type:
+            user_hand = sessions[session_id].take_hand(user_id)
+            success_discard = user_hand
+            if func_type == 'playhand':
+                sessions[session_id].discard += user_hand
+                store.move_all(session_id, SessionStore.hand(user_id), SessionStore.DISCARD)
+            elif func_type == 'returnhand':
+                sessions[session_id].bowl += user_hand
+                store.move_all(session_id, SessionStore.hand(user_id), SessionStore.BOWL)
+            else:
+                store.clear(session_id, SessionStore.hand(user_id))
+        else:
+            success_discard, not_found, ambiguous = take_scraps(sessions[session_id].players[user_id], scraps,
+                                                                auto_pick=ctx.command.name not in NO_AUTO_PICK_COMMANDS)
+            fail_discard.extend(not_found)
+            ambiguous_discard.extend(ambiguous)
             if func_type in ['play', 'discard']:
-                sessions[session_id]['discard'].append(match_scrap)
+                sessions[session_id].discard.extend(success_discard)
             elif func_type == 'return':
-                sessions[session_id]['bowl'].append(match_scrap)
-            success_discard.append(match_scrap)
+                sessions[session_id].bowl.extend(success_discard)
 
-    #TODO: discard/destroy/return random cards from your hand
+            if func_type in ['play', 'discard']:
+                store.move_scraps(session_id, SessionStore.hand(user_id), SessionStore.DISCARD, success_discard)
+            elif func_type == 'return':
+                store.move_scraps(session_id, SessionStore.hand(user_id), SessionStore.BOWL, success_discard)
+            else:
+                store.remove_scraps(session_id, SessionStore.hand(user_id), success_discard)
+        if 'destroy' in func_type:
+            sessions[session_id].destroyed(success_discard)
+        return success_discard
+
+    success_discard = apply_discard()
 
-    if 'destroy' in func_type:
-        sessions[session_id]['total_scraps'] -= len(success_discard)
+    #TODO: discard/destroy/return random cards from your hand
 
-    big_footer = "Hand: %d, Bowl: %d, Discard: %d (Session #%s)" % (len(sessions[session_id]['players'][user_id]),
-                                                                    len(sessions[session_id]['bowl']),
-                                                                    len(sessions[session_id]['discard']),
+    big_footer = "Hand: %d, Bowl: %d, Discard: %d (Session #%s)" % (len(sessions[session_id].players[user_id]),
+                                                                    len(sessions[session_id].bowl),
+                                                                    len(sessions[session_id].discard),
                                                                     session_id)
     if fail_discard:
         the_fun = cut_off_list(char_limit=EMBED_FOOTER_LIMIT,  entries=fail_discard, end_part=", etc.")
         embed_footer = "\nNote: Couldn't find %s" % the_fun
     else:
         embed_footer = ""
+    embed_footer += ambiguous_note(ambiguous_discard)
 
     if not success_discard:
         return await FishbowlBackend.send_embed(ctx,
@@ -884,12 +1185,12 @@ async def discard_destroy_return(ctx, scraps, func_type):
                         footer=big_footer)
         embed_descript += "!"
 
-        if ctx.channel.id != sessions[session_id]['home_channel'].id:
-            await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                             description="%s %ss %d scrap(s) from their hand!" % (ctx.author.mention,
-                                                                                  keyword,
-                                                                                  len(success_discard)),
-                                             footer=big_footer)
+        if ctx.channel.id != session.home_channel.id:
+            FishbowlBackend.announce(session.home_channel,
+                                     description="%s %ss %d scrap(s) from their hand!" % (ctx.author.mention,
+                                                                          keyword,
+                                                                          len(success_discard)),
+                                     footer=big_footer)
 
 
 @commands.command(aliases=["play"])
@@ -950,10 +1251,10 @@ async def see(ctx, keyword: str, *args):
         return await FishbowlBackend.send_error(ctx, "Too many arguments!")
 
     if keyword.lower() in ['deck', 'bowl']:
-        look_pile = sessions[session_id]['bowl']
+        look_pile = sessions[session_id].bowl
         grammar_words = ["bowl", "Bowl"]
     elif keyword.lower() in ['discard', 'graveyard', 'grave']:
-        look_pile = sessions[session_id]['discard']
+        look_pile = sessions[session_id].discard
         grammar_words = ["discard pile", "Discard"]
     else:
         return await FishbowlBackend.send_error(ctx,
@@ -961,10 +1262,10 @@ async def see(ctx, keyword: str, *args):
 
     footer = "%s: %d (Session #%s)" % (grammar_words[1], len(look_pile), session_id)
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                         description="%s checks the %s!" % (ctx.author.mention, keyword),
-                                         footer=footer)
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel,
+                                 description="%s checks the %s!" % (ctx.author.mention, keyword),
+                                 footer=footer)
     if not look_pile:
         return await FishbowlBackend.send_embed(ctx, description="The %s is empty!" % grammar_words[0], footer=footer)
     else:
@@ -989,24 +1290,22 @@ async def show_hand(ctx, dest: str):
     user_id = ctx.author.id
     session_id = users[user_id]
     session_update_time(session_id)
+    session = sessions[session_id]
 
-    if dest.lower() in ['all', 'public', 'hand']:
+    if dest.lower() in SHOW_KEYWORDS:
         if ctx.message.channel.type is discord.ChannelType.private:
             return await FishbowlBackend.send_error(ctx, "Can't use `show %s` in DMs!" % dest)
         target_ctx = ctx
     else:
-        try:
-            target_user = await commands.MemberConverter().convert(ctx, dest)
-        except commands.BadArgument:
-            target_user = await username_session_lookup(session_id, dest)
-            if target_user is None:
-                return await FishbowlBackend.send_error(ctx,
-                                                        "Can't find the player! Names are case sensitive; you can also mention them!")
+        target_user = resolve_player(session_id, dest)
+        if target_user is None:
+            return await FishbowlBackend.send_error(ctx,
+                                                    "Can't find the player! Names are case sensitive; you can also mention them!")
 
         if target_user.id == user_id:
             return await FishbowlBackend.send_error(ctx, "Can't show your own hand to yourself! Try `hand` instead!")
 
-        if target_user.id not in sessions[session_id]['players']:
+        if target_user.id not in session.players:
             return await FishbowlBackend.send_error(ctx,
                                                     "%s isn't in the session!" % target_user.name)
         target_ctx = target_user
@@ -1019,6 +1318,8 @@ async def show_hand(ctx, dest: str):
                                               notify_users=True)
             if not req_confirmed:
                 return
+            if not still_playing(session, user_id):
+                return await FishbowlBackend.send_error(ctx, "You're no longer in Session #%s!" % session_id)
 
             await FishbowlBackend.send_embed(ctx,
                                              description="Showing %s your hand..." % target_user.name,
@@ -1032,12 +1333,17 @@ async def show_hand(ctx, dest: str):
                                               notify_users=False)
             if not req_confirmed:
                 return
+            if not still_playing(session, user_id):
+                return await FishbowlBackend.send_error(ctx, "You're no longer in Session #%s!" % session_id)
             await FishbowlBackend.send_embed(ctx,
                                              description="%s is showing %s their hand..." % (ctx.author.name, target_user.name),
                                              footer="Session #%s" % session_id
                                              )
 
-    user_hand = sessions[session_id]['players'][user_id]
+    # the hand as it is now, after the confirmation and the message above
+    if not still_playing(session, user_id):
+        return await FishbowlBackend.send_error(ctx, "You're no longer in Session #%s!" % session_id)
+    user_hand = session.players[user_id]
     if not user_hand:
         return await FishbowlBackend.send_embed(target_ctx,
                                    title="%s's Hand" % ctx.author.name,
@@ -1070,35 +1376,63 @@ async def confirm_req(confirm_ctx, target_user, req_user, req_text, notify_users
         await FishbowlBackend.send_error(callout_ctx, "Already waiting for a response from this user!")
         return False
 
+    if FishbowlBackend.CONFIRM_BUTTONS:
+        return await confirm_buttons(confirm_ctx, target_user, req_user, req_text, notify_users)
+
     confirm_msg = await FishbowlBackend.send_message(confirm_ctx, req_text)
     await confirm_msg.add_reaction(EMOJI_Y)
     await confirm_msg.add_reaction(EMOJI_N)
-    check_func = reaction_check(message=confirm_msg, author=target_user, emoji=(EMOJI_Y, EMOJI_N))
     try:
-        reaction, user = await FishbowlBackend.wait_for_reaction(req_user, target_user,
-                                                                 timeout=CONFIRM_TIME_OUT, check=check_func)
-        if reaction.emoji == EMOJI_Y:
+        emoji = await FishbowlBackend.wait_for_reaction(confirm_msg, req_user, target_user,
+                                                        emoji=(EMOJI_Y, EMOJI_N), timeout=CONFIRM_TIME_OUT)
+        notices = [confirm_msg.remove_reaction(EMOJI_Y, FishbowlBackend.bot.user),
+                   confirm_msg.remove_reaction(EMOJI_N, FishbowlBackend.bot.user)]
+        if emoji == EMOJI_Y:
             if notify_users:
-                await FishbowlBackend.send_message(confirm_ctx, "Request accepted!")
-                await FishbowlBackend.send_message(req_user, "%s accepted your request!" % target_user)
-        if reaction.emoji == EMOJI_N:
+                notices.append(FishbowlBackend.send_message(confirm_ctx, "Request accepted!"))
+                notices.append(FishbowlBackend.send_message(req_user, "%s accepted your request!" % target_user))
+        if emoji == EMOJI_N:
             if notify_users:
-                await FishbowlBackend.send_message(confirm_ctx, "Request denied!")
-                await FishbowlBackend.send_message(req_user, "%s denied your request!" % target_user)
-        await confirm_msg.remove_reaction(EMOJI_Y, FishbowlBackend.bot.user)
-        await confirm_msg.remove_reaction(EMOJI_N, FishbowlBackend.bot.user)
-        return reaction.emoji == EMOJI_Y
+                notices.append(FishbowlBackend.send_message(confirm_ctx, "Request denied!"))
+                notices.append(FishbowlBackend.send_message(req_user, "%s denied your request!" % target_user))
+        await FishbowlBackend.fan_out(notices)
+        return emoji == EMOJI_Y
 
     except asyncio.TimeoutError:
-        await FishbowlBackend.send_message(confirm_ctx, "Request timed out!")
+        notices = [confirm_msg.remove_reaction(EMOJI_Y, FishbowlBackend.bot.user),
+                   confirm_msg.remove_reaction(EMOJI_N, FishbowlBackend.bot.user),
+                   FishbowlBackend.send_message(confirm_ctx, "Request timed out!")]
         if notify_users:
-            await FishbowlBackend.send_message(req_user, "Request timed out!")
-        await confirm_msg.remove_reaction(EMOJI_Y, FishbowlBackend.bot.user)
-        await confirm_msg.remove_reaction(EMOJI_N, FishbowlBackend.bot.user)
-        pass
+            notices.append(FishbowlBackend.send_message(req_user, "Request timed out!"))
+        await FishbowlBackend.fan_out(notices)
     return False
 
 
+# one send for the request and one interaction edit for the answer, instead of
+# add/remove reactions and separate follow-up messages
+async def confirm_buttons(confirm_ctx, target_user, req_user, req_text, notify_users=True):
+    view = ConfirmButtons.ConfirmView(target_user.id, CONFIRM_TIME_OUT, yes_label="Accept", no_label="Deny")
+    confirm_msg = await FishbowlBackend.send_message(confirm_ctx, req_text, view=view)
+    try:
+        accepted, interaction = await FishbowlBackend.wait_for_buttons(view, req_user, target_user)
+    except asyncio.TimeoutError:
+        notices = [confirm_msg.edit(embed=FishbowlBackend.build_embed(req_text + "\n\nRequest timed out!"), view=None)]
+        if notify_users:
+            notices.append(FishbowlBackend.send_message(req_user, "Request timed out!"))
+        await FishbowlBackend.fan_out(notices)
+        return False
+
+    if notify_users:
+        result = "accepted" if accepted else "denied"
+        notices = [interaction.response.edit_message(embed=FishbowlBackend.build_embed("%s\n\nRequest %s!" % (req_text, result)),
+                                                     view=None),
+                   FishbowlBackend.send_message(req_user, "%s %s your request!" % (target_user, result))]
+    else:
+        notices = [interaction.response.edit_message(view=None)]
+    await FishbowlBackend.fan_out(notices)
+    return accepted
+
+
 async def pass_take(ctx, dest, scraps, pass_flag=True):
     user_id = ctx.author.id
     if not scraps:
@@ -1106,15 +1440,13 @@ async def pass_take(ctx, dest, scraps, pass_flag=True):
     session_id = users[user_id]
     session_update_time(session_id)
 
-    try:
-        target_user = await commands.MemberConverter().convert(ctx, dest)
-    except commands.BadArgument:
-        target_user = await username_session_lookup(session_id, dest)
-        if target_user is None:
-            return await FishbowlBackend.send_error(ctx,
-                                                    "Can't find the player! Names are case sensitive; you can also mention them!")
+    session = sessions[session_id]
+    target_user = resolve_player(session_id, dest)
+    if target_user is None:
+        return await FishbowlBackend.send_error(ctx,
+                                                "Can't find the player! Names are case sensitive; you can also mention them!")
 
-    if target_user.id not in sessions[session_id]['players']:
+    if target_user.id not in session.players:
         return await FishbowlBackend.send_error(ctx, "%s isn't in the session!" % target_user.name)
 
     if pass_flag:
@@ -1131,23 +1463,12 @@ async def pass_take(ctx, dest, scraps, pass_flag=True):
     if target_user.id == ctx.author.id:
         return await FishbowlBackend.send_error(ctx, "Can't %s %s yourself!" % (keyword2[0], keyword2[1]))
 
-    source_hand = sessions[session_id]['players'][source_user.id].copy()
-    dest_hand = sessions[session_id]['players'][dest_user.id].copy()
-    success_scraps = []
-    fail_scraps = []
+    # works out what would move on a copy; the real hands are only touched once the request is accepted
+    source_hand = session.players[source_user.id].copy()
     word_scrap = True
-
-    for scrap in scraps:
-        match_scrap = next((s for s in source_hand if scrap == s),
-                           next((s for s in source_hand if scrap.lower() == s.lower()), None))
-
-        if match_scrap is None:
-            fail_scraps.append(scrap)
-            continue
-
-        success_scraps.append(match_scrap)
-        source_hand.remove(match_scrap)
-        dest_hand.append(match_scrap)
+    # prefixes only resolve in your own hand: taking by prefix would reveal what's in someone else's
+    success_scraps, fail_scraps, ambiguous_scraps = take_scraps(source_hand, scraps,
+                                                                partial=pass_flag and not scraps[0].isdigit())
 
     if not success_scraps:
         try:
@@ -1158,51 +1479,30 @@ async def pass_take(ctx, dest, scraps, pass_flag=True):
                                                         footer="%s's Hand: %d (Session #%s)" % (source_user.name,
                                                                                                 len(source_hand),
                                                                                                 session_id))
-            success_scraps = random.sample(source_hand, num_pass)
-            [source_hand.remove(scrap) for scrap in success_scraps]
-            dest_hand += success_scraps
+            success_scraps = source_hand.draw(num_pass, session.rng)
             fail_scraps = []
             word_scrap = False
         except ValueError:
             pass
 
-    footer_msg = "%s's Hand: %d, %s's Hand: %d (Session #%s)" % (source_user.name, len(source_hand),
-                                                                 dest_user.name, len(dest_hand), session_id)
-
     if fail_scraps:
         not_found_list = cut_off_list(char_limit=EMBED_FOOTER_LIMIT,  entries=fail_scraps, end_part=", etc.")
         embed_footer = "\nNote: Couldn't find %s" % not_found_list
     else:
         embed_footer = ""
+    embed_footer += ambiguous_note(ambiguous_scraps)
 
     if success_scraps:
         if ctx.message.channel.type is discord.ChannelType.private:
             confirm_ctx = target_user
             confirm_msg = "%s is trying to %s %d scrap(s) %s you" % (ctx.author.mention, keyword2[0], len(success_scraps),
                                                                      keyword2[1])
-            descript = ""
         else:
             confirm_ctx = ctx
             confirm_msg = "%s is trying to %s %d scrap(s) %s %s" % (ctx.author.mention, keyword2[0], len(success_scraps),
                                                                     keyword2[1], target_user.mention)
-
-            if word_scrap:
-                # public message???
-                descript = "%s %s %d scrap(s) %s %s:" % (source_user.mention,  # User1
-                                                           keyword1[0],  # passed/took
-                                                           len(success_scraps),
-                                                           keyword1[1],  # to/from
-                                                           dest_user.mention)  # User2)
-            else:
-                descript = "%s %s %d scrap(s) %s %s!" % (source_user.mention,  # User1
-                                                           keyword1[0],  # passed/took
-                                                           len(success_scraps),
-                                                           keyword1[1],  # to/from
-                                                           dest_user.mention)  # User2)
         if word_scrap:
-            cut_list = cut_off_list(EMBED_DESCRIPTION_LIMIT, entries=success_scraps, end_part=", etc.")
-            confirm_msg += ":\n`%s`\n" % cut_list
-            descript += ":\n`%s`\n" % cut_list
+            confirm_msg += ":\n`%s`\n" % cut_off_list(EMBED_DESCRIPTION_LIMIT, entries=success_scraps, end_part=", etc.")
         else:
             confirm_msg += "! "
 
@@ -1214,29 +1514,73 @@ async def pass_take(ctx, dest, scraps, pass_flag=True):
         if not req_confirmed:
             return
 
+        def apply_pass():
+            # anything could have happened to either hand while we waited for the reaction
+            if not still_playing(session, source_user.id) or dest_user.id not in session.players:
+                return None
+            source = session.players[source_user.id]
+            moved_scraps = []
+            for scrap in success_scraps:
+                if scrap in source:
+                    source.remove(scrap)
+                    session.players[dest_user.id].append(scrap)
+                    moved_scraps.append(scrap)
+            store.move_scraps(session_id, SessionStore.hand(source_user.id), SessionStore.hand(dest_user.id), moved_scraps)
+            return moved_scraps
+
+        moved_scraps = apply_pass()
+        if moved_scraps is None:
+            return await FishbowlBackend.send_error(ctx, "Couldn't finish the %s: one of you left Session #%s!" % (keyword2[0], session_id))
+        if len(moved_scraps) < len(success_scraps):
+            embed_footer += "\nNote: %d scrap(s) left %s's hand before the request was accepted" % (
+                len(success_scraps) - len(moved_scraps), source_user.name)
+        success_scraps = moved_scraps
+
+    footer_msg = "%s's Hand: %d, %s's Hand: %d (Session #%s)" % (source_user.name, len(session.players[source_user.id]),
+                                                                 dest_user.name, len(session.players[dest_user.id]), session_id)
+
+    if success_scraps:
+        if ctx.message.channel.type is discord.ChannelType.private:
+            descript = ""
+        elif word_scrap:
+            # public message???
+            descript = "%s %s %d scrap(s) %s %s" % (source_user.mention,  # User1
+                                                       keyword1[0],  # passed/took
+                                                       len(success_scraps),
+                                                       keyword1[1],  # to/from
+                                                       dest_user.mention)  # User2)
+            descript += ":\n`%s`\n" % cut_off_list(EMBED_DESCRIPTION_LIMIT, entries=success_scraps, end_part=", etc.")
+        else:
+            descript = "%s %s %d scrap(s) %s %s!" % (source_user.mention,  # User1
+                                                       keyword1[0],  # passed/took
+                                                       len(success_scraps),
+                                                       keyword1[1],  # to/from
+                                                       dest_user.mention)  # User2)
+
         # DM people if DMs OR if people are passing random scraps in public
         if ctx.message.channel.type is discord.ChannelType.private or not word_scrap:
             if pass_flag:
-                await list_send(dest_user,
-                                description="%s passed you %d scrap(s)" % (source_user.mention, len(success_scraps)),
-                                entries=success_scraps,
-                                footer=footer_msg)
-                await list_send(source_user,
-                                description="You passed %s %d scrap(s)" % (dest_user.mention, len(success_scraps)),
-                                entries=success_scraps,
-                                footer=footer_msg,
-                                end_description=embed_footer)
+                await FishbowlBackend.fan_out([
+                    list_send(dest_user,
+                              description="%s passed you %d scrap(s)" % (source_user.mention, len(success_scraps)),
+                              entries=success_scraps,
+                              footer=footer_msg),
+                    list_send(source_user,
+                              description="You passed %s %d scrap(s)" % (dest_user.mention, len(success_scraps)),
+                              entries=success_scraps,
+                              footer=footer_msg,
+                              end_description=embed_footer)])
             else:
-                await list_send(dest_user,
-                                description="You took %d scrap(s) from %s" % (len(success_scraps), source_user.mention),
-                                entries=success_scraps,
-                                footer=footer_msg,
-                                end_description=embed_footer)
-
-                await list_send(source_user,
-                                description="%s took %d scrap(s) from you" % (dest_user.mention, len(success_scraps)),
-                                entries=success_scraps,
-                                footer=footer_msg)
+                await FishbowlBackend.fan_out([
+                    list_send(dest_user,
+                              description="You took %d scrap(s) from %s" % (len(success_scraps), source_user.mention),
+                              entries=success_scraps,
+                              footer=footer_msg,
+                              end_description=embed_footer),
+                    list_send(source_user,
+                              description="%s took %d scrap(s) from you" % (dest_user.mention, len(success_scraps)),
+                              entries=success_scraps,
+                              footer=footer_msg)])
 
     else:
         descript = "%s %s... 0 scraps %s %s! Huh?" % (source_user.mention,
@@ -1244,21 +1588,18 @@ async def pass_take(ctx, dest, scraps, pass_flag=True):
                                                       keyword1[1],
                                                       dest_user.mention)
 
-    sessions[session_id]['players'][source_user.id] = source_hand
-    sessions[session_id]['players'][dest_user.id] = dest_hand
-
     # Pastes a notification message in the home channel if needed
-    if ctx.channel.id != sessions[session_id]['home_channel'].id and (sessions[session_id]['home_channel'].id != dest_user.dm_channel.id):
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                         description="%s %s %d scrap(s) %s %s!" % (source_user.mention,  # User1
-                                                                          keyword1[0],  # passed/took
-                                                                          len(success_scraps),
-                                                                          keyword1[1],  # to/from
-                                                                          dest_user.mention),  # User2,
-                                         footer=footer_msg)
+    if ctx.channel.id != session.home_channel.id and (session.home_channel != dest_user.dm_channel):
+        FishbowlBackend.announce(session.home_channel,
+                                 description="%s %s %d scrap(s) %s %s!" % (source_user.mention,  # User1
+                                                                  keyword1[0],  # passed/took
+                                                                  len(success_scraps),
+                                                                  keyword1[1],  # to/from
+                                                                  dest_user.mention),  # User2,
+                                 footer=footer_msg)
 
     # notify sender of status
-    if descript and (ctx.channel.id != source_user.dm_channel.id) or not success_scraps:
+    if descript and (ctx.channel != source_user.dm_channel) or not success_scraps:
         await FishbowlBackend.send_embed(ctx, description=descript+embed_footer, footer=footer_msg)
 
     return
@@ -1302,18 +1643,23 @@ async def recall_hands(ctx, *args):
     session_id = users[user_id]
     session_update_time(session_id)
 
-    session_players = sessions[session_id]['players']
-    [sessions[session_id]['bowl'].extend(session_players[k]) for k in session_players]
-    sessions[session_id]['players'] = {k: [] for k in session_players}
+    def apply_recall():
+        session_players = sessions[session_id].recall()
+        [store.move_all(session_id, SessionStore.hand(k), SessionStore.BOWL) for k in session_players]
+        sessions[session_id].history.push("recall", user_id,
+                                          [(MOVED, SessionStore.hand(k), SessionStore.BOWL, session_players[k].scraps)
+                                           for k in session_players])
+
+    apply_recall()
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                         description="%s recalled all hands back to the bowl!" % ctx.author.mention,
-                                         footer="Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id))
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel,
+                                 description="%s recalled all hands back to the bowl!" % ctx.author.mention,
+                                 footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id))
 
     return await FishbowlBackend.send_embed(ctx,
                                             description="Recalling all hands back to the bowl!",
-                                            footer="Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id))
+                                            footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id))
 
 
 @commands.command()
@@ -1324,17 +1670,22 @@ async def shuffle(ctx, *args):
     session_id = users[user_id]
     session_update_time(session_id)
 
-    sessions[session_id]['bowl'].extend(sessions[session_id]['discard'])
-    sessions[session_id]['discard'] = []
+    def apply_shuffle():
+        old_discard = sessions[session_id].shuffle()
+        store.move_all(session_id, SessionStore.DISCARD, SessionStore.BOWL)
+        sessions[session_id].history.push("shuffle", user_id,
+                                          [(MOVED, SessionStore.DISCARD, SessionStore.BOWL, old_discard.scraps)])
+
+    apply_shuffle()
 
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                         description="%s shuffled the discard pile back into the bowl!" % ctx.author.mention,
-                                         footer="Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id))
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel,
+                                 description="%s shuffled the discard pile back into the bowl!" % ctx.author.mention,
+                                 footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id))
 
     return await FishbowlBackend.send_embed(ctx,
                                             description="Shuffling the discard pile back into the bowl!",
-                                            footer="Bowl: %d (Session #%s)" % (len(sessions[session_id]['bowl']), session_id))
+                                            footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id))
 
 
 @shuffle.error
@@ -1351,30 +1702,37 @@ async def empty_reset(ctx, arg: clean_arg):
     session_id = users[user_id]
     session_update_time(session_id)
 
-    discard_all = arg in ['all', 'session']
-    descripts = []
-    if discard_all or arg in ['bowl', 'deck']:
-        descripts.append("bowl")
-        sessions[session_id]['bowl'] = []
-    if discard_all or arg in ['discard', 'graveyard', 'trash']:
-        descripts.append("discard pile")
-        sessions[session_id]['discard'] = []
-    if discard_all or arg in ['hands']:
-        descripts.append("player hands")
-        sessions[session_id]['players'] = {k: [] for k in sessions[session_id]['players']}
-    sessions[session_id]['total_scraps'] = len(sessions[session_id]['bowl']) + \
-                                           len(sessions[session_id]['discard']) + \
-                                           sum(len(sessions[session_id]['players'][p_id]) for p_id in sessions[session_id]['players'])
+    def apply_reset():
+        discard_all = arg in ['all', 'session']
+        descripts = []
+        changes = []
+        if discard_all or arg in ['bowl', 'deck']:
+            descripts.append("bowl")
+            changes.append((REMOVED, SessionStore.BOWL, None, sessions[session_id].empty_bowl().scraps))
+            store.clear(session_id, SessionStore.BOWL)
+        if discard_all or arg in ['discard', 'graveyard', 'trash']:
+            descripts.append("discard pile")
+            changes.append((REMOVED, SessionStore.DISCARD, None, sessions[session_id].empty_discard().scraps))
+            store.clear(session_id, SessionStore.DISCARD)
+        if discard_all or arg in ['hands']:
+            descripts.append("player hands")
+            changes += [(REMOVED, SessionStore.hand(k), None, pile.scraps)
+                        for k, pile in sessions[session_id].empty_hands().items()]
+            [store.clear(session_id, SessionStore.hand(k)) for k in sessions[session_id].players]
+        sessions[session_id].history.push("empty %s" % arg, user_id, changes)
+        return descripts
+
+    descripts = apply_reset()
 
     if len(descripts) <= 2:
         descriptions = "and ".join(descripts)
     else:
         descriptions = ", ".join(descripts[:-1])
         descriptions += (", and " + descripts[-1])
-    if ctx.channel.id != sessions[session_id]['home_channel'].id:
-        await FishbowlBackend.send_embed(sessions[session_id]['home_channel'],
-                                         description="%s emptied the %s!" % (ctx.author.mention, descriptions),
-                                         footer="(Session #%s)" % session_id)
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel,
+                                 description="%s emptied the %s!" % (ctx.author.mention, descriptions),
+                                 footer="(Session #%s)" % session_id)
 
     return await FishbowlBackend.send_embed(ctx,
                                             description="Emptying the %s!" % descriptions,
@@ -1389,6 +1747,79 @@ async def empty_error(ctx, error):
         return await general_errors(ctx, error)
 
 
+def undo_location(session_id, location):
+    # the pile an undo puts scraps back into; a hand whose player has left gives None
+    try:
+        return location, SessionStore.pile_at(sessions[session_id], location)
+    except KeyError:
+        return location, None
+
+
+def undo_changes(session_id, changes):
+    # puts back what's still around: scraps moved by the action and since drawn elsewhere stay put,
+    # and destroyed scraps from the hand of a player who has left go to the bowl
+    restored = 0
+    for kind, location, other_location, scraps in reversed(changes):
+        location, pile = undo_location(session_id, location)
+        if kind == REMOVED:
+            if pile is None:
+                location, pile = SessionStore.BOWL, sessions[session_id].bowl
+            sessions[session_id].add_scraps(pile, scraps)
+            store.add_scraps(session_id, location, scraps)
+            restored += len(scraps)
+        elif pile is not None:
+            other_location, other_pile = undo_location(session_id, other_location)
+            moved = []
+            for scrap in scraps:
+                if scrap in other_pile:
+                    other_pile.remove(scrap)
+                    moved.append(scrap)
+            pile += moved
+            store.move_scraps(session_id, other_location, location, moved)
+            restored += len(moved)
+    return restored
+
+
+@commands.command()
+@check_user_in_session()
+@check_creator()
+async def undo(ctx, *args):
+    user_id = ctx.author.id
+    session_id = users[user_id]
+    session_update_time(session_id)
+
+    def apply_undo():
+        history = sessions[session_id].history
+        if not history:
+            return None, "Nothing to undo! (Only `recall`, `shuffle` and `empty` can be undone)"
+        label, actor_id, changes = history.peek()
+        added = sum(len(scraps) for kind, location, other_location, scraps in changes if kind == REMOVED)
+        if sessions[session_id].total_scraps + added > MAX_BOWL_SIZE:
+            return None, "Undoing `%s` would put too many scraps in the session! (Max: %d)" % (label, MAX_BOWL_SIZE)
+        history.pop()
+        return label, undo_changes(session_id, changes)
+
+    label, result = apply_undo()
+    if label is None:
+        return await FishbowlBackend.send_error(ctx, result)
+
+    if ctx.channel.id != sessions[session_id].home_channel.id:
+        FishbowlBackend.announce(sessions[session_id].home_channel,
+                                 description="%s undid `%s`, putting back %d scrap(s)!" % (ctx.author.mention, label, result),
+                                 footer="Bowl: %d (Session #%s)" % (len(sessions[session_id].bowl), session_id))
+
+    return await FishbowlBackend.send_embed(ctx,
+                                            description="Undid `%s`, putting back %d scrap(s)!" % (label, result),
+                                            footer="Bowl: %d | Undo history: %d (Session #%s)"
+                                                   % (len(sessions[session_id].bowl),
+                                                      len(sessions[session_id].history), session_id))
+
+
+@undo.error
+async def undo_error(ctx, error):
+    return await general_errors(ctx, error)
+
+
 @commands.command()
 @check_user_in_session()
 @check_creator()
@@ -1401,16 +1832,19 @@ async def ban(ctx, *args):
         return await FishbowlBackend.send_error(ctx,
                                                 "Please tell me which user(s) you want to unban!")
 
+    session = sessions[session_id]
+    targets = await resolve_members(ctx, session_id, args, fallback=True)
+    missing = [arg for arg in args if targets[arg] is None]
+    if missing:
+        return await FishbowlBackend.send_error(ctx,
+                                                "Can't find %s! Names are case sensitive; you can also mention them!" % ", ".join(missing))
+
     for arg in args:
-        try:
-            target_user = await commands.MemberConverter().convert(ctx, arg)
-        except commands.BadArgument:
-            target_user = await username_session_lookup(session_id, arg)
-            if target_user is None:
-                return await FishbowlBackend.send_error(ctx,
-                                                        "Can't find %s! Names are case sensitive; you can also mention them!" % arg)
-
-        if target_user.id in sessions[session_id]['ban_list']:
+        # the lookups and messages above awaited; stop if the session ended or changed hands
+        if sessions.get(session_id) is not session or session.creator != user_id:
+            return
+        target_user = targets[arg]
+        if target_user.id in sessions[session_id].bans:
             await FishbowlBackend.send_error(ctx, "%s is already banned from Session #%s!" % (target_user.mention, session_id))
             continue
         if target_user.id == ctx.author.id:
@@ -1419,11 +1853,14 @@ async def ban(ctx, *args):
         if target_user.id == FishbowlBackend.bot.user.id:
             await FishbowlBackend.send_error(ctx, "Sorry, can't ban me!")
             continue
-        sessions[session_id]['ban_list'].append(target_user.id)
-        if target_user.id in sessions[session_id]['players']:
-            sessions[session_id]['total_scraps'] -= len(sessions[session_id]['players'][target_user.id])
-            del sessions[session_id]['players'][target_user.id]
+        sessions[session_id].bans.add(target_user.id)
+        # banned users stay indexed so unban can find them by name
+        sessions[session_id].members.add(target_user)
+        store.ban(session_id, target_user.id)
+        if target_user.id in sessions[session_id].players:
+            sessions[session_id].remove_player(target_user.id)
             del users[target_user.id]
+            store.remove_player(session_id, target_user.id)
         await FishbowlBackend.send_message(ctx, "%s banned %s from Session #%s!" % (ctx.author.mention,
                                                                                     target_user.mention,
                                                                                     session_id))
@@ -1442,24 +1879,30 @@ async def unban(ctx, *args):
         return await FishbowlBackend.send_error(ctx,
                                                 "Please tell me which user(s) you want to unban!")
 
+    session = sessions[session_id]
+    targets = await resolve_members(ctx, session_id, args, fallback=True)
+    missing = [arg for arg in args if targets[arg] is None]
+    if missing:
+        return await FishbowlBackend.send_error(ctx,
+                                                "Can't find %s! Names are case sensitive; you can also mention them!" % ", ".join(missing))
+
     for arg in args:
-        try:
-            target_user = await commands.MemberConverter().convert(ctx, arg)
-        except commands.BadArgument:
-            target_user = await username_session_lookup(session_id, arg)
-            if target_user is None:
-                return await FishbowlBackend.send_error(ctx,
-                                                        "Can't find %s! Names are case sensitive; you can also mention them!" % arg)
+        if sessions.get(session_id) is not session or session.creator != user_id:
+            return
+        target_user = targets[arg]
         if target_user.id == ctx.author.id:
             await FishbowlBackend.send_error(ctx, "Can't unban yourself!")
             continue
         if target_user.id == FishbowlBackend.bot.user.id:
             await FishbowlBackend.send_error(ctx, "Sorry, can't unban me!")
             continue
-        if target_user.id not in sessions[session_id]['ban_list']:
+        if target_user.id not in sessions[session_id].bans:
             await FishbowlBackend.send_error(ctx, "Can't find %s in the banlist!" % target_user.mention)
             continue
-        sessions[session_id]['ban_list'].remove(target_user.id)
+        sessions[session_id].bans.discard(target_user.id)
+        if target_user.id not in sessions[session_id].players:
+            sessions[session_id].members.remove(target_user.id)
+        store.unban(session_id, target_user.id)
         await FishbowlBackend.send_message(ctx, "%s has unbanned %s from Session #%s!" % (ctx.author.mention,
                                                                                      target_user.mention,
                                                                                      session_id))
@@ -1477,15 +1920,36 @@ async def ban_error(ctx, error):
 
 @commands.command(name="commands", aliases=["command"])
 async def list_commands(ctx, *args):
-    grouped_df = help_df.sort_values(['Command'], ascending=True).groupby("Category")
-    for groupname, groupdf in grouped_df:
-        bot_command_dict = {cmd: cmd_help for cmd, cmd_help in zip(groupdf["CommandExample"], groupdf["Help"])}
-        await FishbowlBackend.send_embed(ctx, "",
-                                         fields=bot_command_dict,
-                                         title="%s Commands:" % groupname)
+    for command_embed in command_list_embeds():
+        await FishbowlBackend.send_built_embed(ctx, command_embed)
     return
 
 
+# help embeds never change, so each one is built the first time it's asked for and reused
+def command_list_embeds():
+    if "commands" not in help_embeds:
+        categories = {}
+        for row in help_table.values():
+            categories.setdefault(row["Category"], {})[row["CommandExample"]] = row["Help"]
+        help_embeds["commands"] = [FishbowlBackend.build_embed("",
+                                                               fields=categories[category],
+                                                               title="%s Commands:" % category)
+                                   for category in sorted(categories)]
+    return help_embeds["commands"]
+
+
+def command_help_embed(keyword):
+    if keyword not in help_embeds:
+        row = help_table[keyword]
+        if row["Aliases"]:
+            footer = "Can also be invoked with: " + row["Aliases"]
+        else:
+            footer = ""
+        help_embeds[keyword] = FishbowlBackend.build_embed("**%s**:\n" % row["CommandExample"] + row["DetailedHelp"],
+                                                           footer=footer)
+    return help_embeds[keyword]
+
+
 @commands.command(name="help")
 async def help_bot(ctx, keyword: clean_arg = ""):
     if not keyword:
@@ -1495,14 +1959,8 @@ async def help_bot(ctx, keyword: clean_arg = ""):
                                                   "For a list of all commands, do `help commands`. You can also ask me for detailed help with a specific command. (i.e. `help start`)")
     if keyword in ["all", "commands", "command", "list"]:
         return await list_commands(ctx, [])
-    if keyword in help_df.index:
-        if help_df.loc[keyword]["Aliases"]:
-            footer = "Can also be invoked with: " + help_df.loc[keyword]["Aliases"]
-        else:
-            footer = ""
-        return await FishbowlBackend.send_embed(ctx,
-                                                "**%s**:\n" % help_df.loc[keyword]["CommandExample"] + help_df.loc[keyword]["DetailedHelp"],
-                                                footer=footer)
+    if keyword in help_table:
+        return await FishbowlBackend.send_built_embed(ctx, command_help_embed(keyword))
     else:
         return await FishbowlBackend.send_error(ctx, "Don't recognize that help query! Try `help commands` for a list of all commands, or ask me for a specific command! (i.e. `help start`)")
 
@@ -1531,19 +1989,71 @@ async def bugreport_error(ctx, error):
         return await general_errors(ctx, error)
 
 
+async def startup_ready():
+    # on_ready fires again after reconnects; only the first one restores sessions
+    if restore_task is None:
+        profiler.mark("gateway connect")
+        await accept_commands()
+        profiler.mark_ready("session restore")
+        print(profiler.report())
+        # started here rather than in setup: 2.0 has no event loop until login
+        clean_inactive_sessions.start()
+        if SLASH_COMMANDS and SYNC_SLASH_COMMANDS:
+            await SlashCommands.sync(FishbowlBackend.bot)
+        if METRICS_PORT:
+            await FishbowlBackend.metrics.serve(METRICS_HOST, METRICS_PORT)
+            print('Serving metrics on %s:%d' % (METRICS_HOST, METRICS_PORT))
+
+
 def setup():
-    bot_commands = [globals()[cmd] for cmd in help_df["Function"]]
-    for bot_command in bot_commands:
-        FishbowlBackend.bot.add_command(bot_command)
-    #FishbowlBackend.bot.add_command(help_bot)
-    clean_inactive_sessions.start()
+    with profiler.phase("prefix load"):
+        FishbowlBackend.load_prefixes()
+    with profiler.phase("setup"):
+        bot_commands = [globals()[row["Function"]] for row in help_table.values()]
+        for bot_command in bot_commands:
+            FishbowlBackend.bot.add_command(bot_command)
+        #FishbowlBackend.bot.add_command(help_bot)
+        if SLASH_COMMANDS:
+            SlashCommands.register(FishbowlBackend.bot, help_table,
+                                   scrap_commands=HAND_SCRAP_COMMANDS, scrap_source=hand_scraps)
+        FishbowlBackend.bot.add_check(wait_for_restore)
+        FishbowlBackend.bot.add_listener(startup_ready, 'on_ready')
+        if RECORD_COMMANDS:
+            FishbowlBackend.recorder = CommandRecorder(RECORD_COMMANDS, session_of=users.get,
+                                                       resolve_user=recorded_user_id,
+                                                       user_arguments=USER_ARGUMENTS, keywords=SHOW_KEYWORDS)
+
+
+def check_startup():
+    # runs startup offline against a stubbed gateway; fails if it takes longer than STARTUP_BUDGET
+    setup()
+    loop = StartupProfiler.offline_loop(FishbowlBackend.bot)
+    loop.run_until_complete(StartupProfiler.stub_gateway(FishbowlBackend.bot, profiler))
+    clean_inactive_sessions.cancel()
+    if profiler.total() > STARTUP_BUDGET:
+        print("Startup took %.3fs, over the %.3fs budget!" % (profiler.total(), STARTUP_BUDGET))
+        print(StartupProfiler.import_breakdown(["FishbowlBackend", "SessionStore", "dotenv"]))
+        return False
+    return True
 
 
 def get_user_alt_prefix(user_id):
     if user_id in users:
-        return sessions[users[user_id]]["home_channel"]
+        return sessions[users[user_id]].home_channel
     return None
 
 
-setup()
-FishbowlBackend.bot.run(token)
+if __name__ == "__main__":
+    if "--check-startup" in sys.argv:
+        sys.exit(0 if check_startup() else 1)
+    if "--import-times" in sys.argv:
+        print(StartupProfiler.import_breakdown(["FishbowlBackend", "SessionStore", "dotenv"]))
+        sys.exit(0)
+    setup()
+    try:
+        FishbowlBackend.bot.run(token)
+    finally:
+        FishbowlBackend.write_prefixes(FishbowlBackend.prefixes)
+        if FishbowlBackend.recorder is not None:
+            FishbowlBackend.recorder.close()
+        store.close()
@@ -0,0 +1,63 @@
+import re
+
+MENTION_RE = re.compile(r'<@!?([0-9]+)>$')
+
+
+class MemberIndex:
+    # The users a session knows about (players and banned users), keyed every way a command
+    # argument can name them: ID, mention, name#discrim, name and display name.
+    # Names shared by two users map to None so they never resolve to the wrong one.
+    def __init__(self):
+        self.members = {}
+        self.names = {}
+
+    @staticmethod
+    def name_keys(user):
+        keys = {"%s#%s" % (user.name, user.discriminator), user.name}
+        display_name = getattr(user, 'display_name', None)
+        if display_name:
+            keys.add(display_name)
+        return keys
+
+    def add(self, user):
+        if user.id in self.members:
+            self.remove(user.id)
+        self.members[user.id] = user
+        for key in self.name_keys(user):
+            self.names[key] = user.id if key not in self.names else None
+
+    def remove(self, user_id):
+        user = self.members.pop(user_id, None)
+        if user is None:
+            return
+        for key in self.name_keys(user):
+            if self.names.get(key) == user_id:
+                del self.names[key]
+            elif key in self.names:
+                # was ambiguous; it may name a single user again
+                owners = [m.id for m in self.members.values() if key in self.name_keys(m)]
+                if len(owners) == 1:
+                    self.names[key] = owners[0]
+                elif not owners:
+                    del self.names[key]
+
+    @staticmethod
+    def parse_id(arg):
+        match = MENTION_RE.match(arg)
+        if match:
+            return int(match.group(1))
+        if arg.isdigit():
+            return int(arg)
+        return None
+
+    def resolve(self, arg):
+        user_id = self.parse_id(arg)
+        if user_id is None:
+            user_id = self.names.get(arg)
+        return self.members.get(user_id)
+
+    def __contains__(self, user_id):
+        return user_id in self.members
+
+    def __len__(self):
+        return len(self.members)
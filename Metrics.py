@@ -0,0 +1,128 @@
+import asyncio
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                             for name, value in zip(names, values))
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def exposition(self):
+        lines = ["# HELP %s %s" % (self.name, self.help_text), "# TYPE %s counter" % self.name]
+        for label_values, value in sorted(self.values.items()):
+            lines.append("%s%s %s" % (self.name, format_labels(self.labels, label_values), format_value(value)))
+        return lines
+
+
+class Histogram:
+    # Cumulative buckets are only summed up when scraped; observe() is one bisect and three adds.
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def exposition(self):
+        lines = ["# HELP %s %s" % (self.name, self.help_text), "# TYPE %s histogram" % self.name]
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append("%s_bucket%s %d" % (self.name,
+                                                 format_labels(self.labels + ("le",), label_values + (format_value(bound),)),
+                                                 cumulative))
+            labels = format_labels(self.labels, label_values)
+            lines.append("%s_sum%s %s" % (self.name, labels, repr(total)))
+            lines.append("%s_count%s %d" % (self.name, labels, count))
+        return lines
+
+
+class Gauge:
+    # read from a callback at scrape time, so nothing has to keep it up to date;
+    # kind="counter" is for running totals other objects already keep
+    def __init__(self, name, help_text, read, kind="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.kind = kind
+
+    def exposition(self):
+        return ["# HELP %s %s" % (self.name, self.help_text), "# TYPE %s %s" % (self.name, self.kind),
+                "%s %s" % (self.name, format_value(self.read()))]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.server = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read, kind="gauge"):
+        return self.register(Gauge(name, help_text, read, kind))
+
+    def exposition(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.exposition())
+            except Exception as e:
+                print('Metric %s failed: %r' % (metric.name, e))
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+                status, body = "200 OK", self.exposition().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(("HTTP/1.0 %s\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: %d\r\n\r\n"
+                          % (status, len(body))).encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+
+class RouteBucket:
+    # Token bucket plus an in-flight cap for one destination (channel or DM).
+    def __init__(self, rate, period, concurrency):
+        self.rate = rate
+        self.period = period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def refill(self, now):
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.period)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self.refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.period / self.rate)
+
+    def idle(self):
+        self.refill(time.monotonic())
+        return self.tokens >= self.rate and not self.semaphore.locked()
+
+
+class NotificationDispatcher:
+    def __init__(self, concurrency=16, route_concurrency=1, route_rate=5, route_period=5.0, max_routes=10000):
+        self.concurrency = concurrency
+        self.route_concurrency = route_concurrency
+        self.route_rate = route_rate
+        self.route_period = route_period
+        self.max_routes = max_routes
+        self.semaphore = None
+        self.buckets = {}
+        self.sent = 0
+        self.failed = 0
+
+    @staticmethod
+    def route_key(destination):
+        # commands.Context sends to its channel; a DM channel is keyed by its recipient so it shares
+        # a bucket with sends to that user directly, and anything else by its own ID
+        destination = getattr(destination, 'channel', destination)
+        recipient = getattr(destination, 'recipient', None)
+        return (recipient or destination).id
+
+    def bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            if len(self.buckets) >= self.max_routes:
+                self.buckets = {key: b for key, b in self.buckets.items() if not b.idle()}
+            bucket = self.buckets[route] = RouteBucket(self.route_rate, self.route_period, self.route_concurrency)
+        return bucket
+
+    async def send(self, destination, **kwargs):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = self.bucket(self.route_key(destination))
+        async with bucket.semaphore:
+            await bucket.acquire()
+            async with self.semaphore:
+                try:
+                    message = await destination.send(**kwargs)
+                except Exception:
+                    self.failed += 1
+                    raise
+                self.sent += 1
+                return message
+
+    async def fan_out(self, sends):
+        # runs every send even if some fail; returns the exceptions (None for each success)
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        return [result if isinstance(result, Exception) else None for result in results]
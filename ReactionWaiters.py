@@ -0,0 +1,39 @@
+import asyncio
+
+
+class ReactionWaiters:
+    # Routes raw reaction events straight to the confirmation waiting on that message,
+    # instead of running every pending wait_for check against every reaction the bot sees.
+    def __init__(self):
+        self.waiters = {}
+        self.pairs = set()
+        self.routed = 0
+        self.ignored = 0
+
+    def is_waiting(self, sender_id, receiver_id):
+        return (sender_id, receiver_id) in self.pairs
+
+    async def wait(self, message_id, sender_id, receiver_id, emoji, timeout):
+        future = asyncio.get_event_loop().create_future()
+        self.waiters[message_id] = (future, receiver_id, emoji)
+        self.pairs.add((sender_id, receiver_id))
+        try:
+            # wait_for cancels the future on timeout, and the finally drops it either way,
+            # so neither a timeout nor a cancelled command leaves anything behind
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if self.waiters.get(message_id, (None,))[0] is future:
+                del self.waiters[message_id]
+            self.pairs.discard((sender_id, receiver_id))
+
+    def dispatch(self, payload):
+        waiter = self.waiters.get(payload.message_id)
+        if waiter is None:
+            self.ignored += 1
+            return
+        future, receiver_id, emoji = waiter
+        if payload.user_id != receiver_id or str(payload.emoji) not in emoji or future.done():
+            self.ignored += 1
+            return
+        self.routed += 1
+        future.set_result(str(payload.emoji))
@@ -0,0 +1,260 @@
+import random
+import sys
+import time
+from bisect import bisect_left, insort
+from collections.abc import Sequence
+from difflib import SequenceMatcher
+
+# per-scrap cost of the list slot and index entries, on top of the string itself (measured ~113 B with
+# tracemalloc on CPython 3.11); the prefix and trigram indexes, built on first use, come on top
+SCRAP_OVERHEAD = 120
+MATCH_CANDIDATES = 5
+FUZZY_CUTOFF = 0.6
+FUZZY_SHORTLIST = 20  # scraps sharing the most trigrams that get a full similarity score
+FUZZY_BUDGET = 0.002  # seconds; posting lists left unread after this are skipped
+
+
+def scrap_bytes(scrap):
+    return sys.getsizeof(scrap) + SCRAP_OVERHEAD
+
+
+def trigrams(folded_scrap):
+    padded = "  %s " % folded_scrap
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ScrapPile(Sequence):
+    # A bag of scraps (duplicates allowed) with O(1) exact and case-insensitive lookup.
+    # Order isn't meaningful: removing a scrap moves the last scrap into its slot.
+    # Most scraps are unique, so the indexes hold a bare int/str and only switch
+    # to a set/dict once a second copy or case variant shows up.
+    # The sorted prefix index over the casefolded names is only built on the first prefix
+    # lookup, then kept up to date as scraps come and go. The trigram index behind suggest()
+    # works the same way, starting with the first fuzzy lookup.
+    __slots__ = ('scraps', 'positions', 'folded', 'prefix_index', 'trigram_index', 'nbytes')
+
+    def __init__(self, scraps=()):
+        self.scraps = []
+        self.positions = {}
+        self.folded = {}
+        self.prefix_index = None
+        self.trigram_index = None
+        self.nbytes = 0
+        self.extend(scraps)
+
+    def __len__(self):
+        return len(self.scraps)
+
+    def __getitem__(self, i):
+        return self.scraps[i]
+
+    def __iter__(self):
+        return iter(self.scraps)
+
+    def __contains__(self, scrap):
+        return scrap in self.positions
+
+    def __iadd__(self, scraps):
+        self.extend(scraps)
+        return self
+
+    def __repr__(self):
+        return "ScrapPile(%r)" % self.scraps
+
+    def add_variant(self, scrap):
+        folded_scrap = scrap.casefold()
+        if folded_scrap == scrap:
+            folded_scrap = scrap
+        variants = self.folded.get(folded_scrap)
+        if variants is None:
+            self.folded[folded_scrap] = scrap
+            if self.prefix_index is not None:
+                insort(self.prefix_index, folded_scrap)
+            if self.trigram_index is not None:
+                self.index_trigrams(folded_scrap)
+        elif type(variants) is str:
+            self.folded[folded_scrap] = {variants: None, scrap: None}
+        else:
+            variants[scrap] = None
+
+    def drop_variant(self, scrap):
+        folded_scrap = scrap.casefold()
+        variants = self.folded[folded_scrap]
+        if type(variants) is str:
+            del self.folded[folded_scrap]
+            if self.prefix_index is not None:
+                del self.prefix_index[bisect_left(self.prefix_index, folded_scrap)]
+            if self.trigram_index is not None:
+                self.unindex_trigrams(folded_scrap)
+        else:
+            del variants[scrap]
+            if len(variants) == 1:
+                self.folded[folded_scrap] = next(iter(variants))
+
+    def move_position(self, scrap, old_i, new_i):
+        scrap_positions = self.positions[scrap]
+        if type(scrap_positions) is int:
+            self.positions[scrap] = new_i
+        else:
+            scrap_positions.discard(old_i)
+            scrap_positions.add(new_i)
+
+    def drop_position(self, scrap, i):
+        scrap_positions = self.positions[scrap]
+        if type(scrap_positions) is int:
+            del self.positions[scrap]
+            self.drop_variant(scrap)
+        else:
+            scrap_positions.discard(i)
+            if len(scrap_positions) == 1:
+                self.positions[scrap] = scrap_positions.pop()
+
+    def append(self, scrap):
+        i = len(self.scraps)
+        scrap_positions = self.positions.get(scrap)
+        if scrap_positions is None:
+            self.positions[scrap] = i
+            self.add_variant(scrap)
+        elif type(scrap_positions) is int:
+            self.positions[scrap] = {scrap_positions, i}
+        else:
+            scrap_positions.add(i)
+        self.scraps.append(scrap)
+        self.nbytes += scrap_bytes(scrap)
+
+    def extend(self, scraps):
+        for scrap in scraps:
+            self.append(scrap)
+
+    def copy(self):
+        return ScrapPile(self.scraps)
+
+    def clear(self):
+        self.scraps.clear()
+        self.positions.clear()
+        self.folded.clear()
+        self.prefix_index = None
+        self.trigram_index = None
+        self.nbytes = 0
+
+    def find(self, scrap):
+        # case-sensitive match first, then case-insensitive match
+        if scrap in self.positions:
+            return scrap
+        return self.variant(scrap.casefold())
+
+    def variant(self, folded_scrap):
+        variants = self.folded.get(folded_scrap)
+        if variants is None or type(variants) is str:
+            return variants
+        return next(iter(variants))
+
+    def complete(self, prefix, limit=MATCH_CANDIDATES):
+        # up to limit scraps whose name starts with prefix, ignoring case, in alphabetical order
+        if self.prefix_index is None:
+            self.prefix_index = sorted(self.folded)
+        folded_prefix = prefix.casefold()
+        i = bisect_left(self.prefix_index, folded_prefix)
+        matches = []
+        while i < len(self.prefix_index) and len(matches) < limit and self.prefix_index[i].startswith(folded_prefix):
+            matches.append(self.variant(self.prefix_index[i]))
+            i += 1
+        return matches
+
+    def match(self, scrap, limit=MATCH_CANDIDATES):
+        # exact match, then case-insensitive, then the only scrap starting with it;
+        # an ambiguous prefix gives no match and up to limit candidates instead
+        match_scrap = self.find(scrap)
+        if match_scrap is not None or not scrap:
+            return match_scrap, []
+        candidates = self.complete(scrap, limit + 1)
+        if len(candidates) == 1:
+            return candidates[0], []
+        return None, candidates[:limit]
+
+    def index_trigrams(self, folded_scrap):
+        for trigram in trigrams(folded_scrap):
+            posting = self.trigram_index.get(trigram)
+            if posting is None:
+                self.trigram_index[trigram] = {folded_scrap}
+            else:
+                posting.add(folded_scrap)
+
+    def unindex_trigrams(self, folded_scrap):
+        for trigram in trigrams(folded_scrap):
+            posting = self.trigram_index[trigram]
+            posting.discard(folded_scrap)
+            if not posting:
+                del self.trigram_index[trigram]
+
+    def suggest(self, scrap, limit=MATCH_CANDIDATES, cutoff=FUZZY_CUTOFF, budget=FUZZY_BUDGET):
+        # closest scraps by similarity ratio (0-1), best first; only scraps sharing a trigram are
+        # considered, rarest trigrams first, so the work tracks the query rather than the pile size
+        if self.trigram_index is None:
+            self.trigram_index = {}
+            for folded_scrap in self.folded:
+                self.index_trigrams(folded_scrap)
+        folded_query = scrap.casefold()
+        deadline = time.perf_counter() + budget
+        postings = sorted((self.trigram_index[t] for t in trigrams(folded_query) if t in self.trigram_index), key=len)
+        shared = {}
+        for posting in postings:
+            for folded_scrap in posting:
+                shared[folded_scrap] = shared.get(folded_scrap, 0) + 1
+            if time.perf_counter() > deadline:
+                break
+        shortlist = sorted(shared, key=shared.get, reverse=True)[:FUZZY_SHORTLIST]
+        scored = []
+        for folded_scrap in shortlist:
+            ratio = SequenceMatcher(None, folded_query, folded_scrap).ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, self.variant(folded_scrap)))
+        scored.sort(key=lambda s: -s[0])
+        return scored[:limit]
+
+    def pop_index(self, i):
+        scrap = self.scraps[i]
+        last_i = len(self.scraps) - 1
+        last_scrap = self.scraps.pop()
+        if i == last_i:
+            self.drop_position(scrap, i)
+        elif last_scrap == scrap:
+            self.scraps[i] = last_scrap
+            self.drop_position(scrap, last_i)
+        else:
+            self.scraps[i] = last_scrap
+            self.move_position(last_scrap, last_i, i)
+            self.drop_position(scrap, i)
+        self.nbytes -= scrap_bytes(scrap)
+        return scrap
+
+    def remove(self, scrap):
+        scrap_positions = self.positions.get(scrap)
+        if scrap_positions is None:
+            raise ValueError("%r is not in the pile" % scrap)
+        if type(scrap_positions) is not int:
+            scrap_positions = next(iter(scrap_positions))
+        self.pop_index(scrap_positions)
+
+    def take(self, scrap):
+        match_scrap = self.find(scrap)
+        if match_scrap is not None:
+            self.remove(match_scrap)
+        return match_scrap
+
+    def take_match(self, scrap):
+        match_scrap, candidates = self.match(scrap)
+        if match_scrap is not None:
+            self.remove(match_scrap)
+        return match_scrap, candidates
+
+    def replace(self, old_scrap, new_scrap):
+        self.remove(old_scrap)
+        self.append(new_scrap)
+
+    def sample(self, k, rng=random):
+        return [self.scraps[i] for i in rng.sample(range(len(self.scraps)), k)]
+
+    def draw(self, k, rng=random):
+        # each pick is uniform over what's left, and removes exactly the copy that was picked
+        return [self.pop_index(rng.randrange(len(self.scraps))) for _ in range(k)]
@@ -0,0 +1,93 @@
+import random
+from ScrapPile import ScrapPile
+from MemberIndex import MemberIndex
+from UndoHistory import UndoHistory
+
+
+class Session:
+    # One fishbowl game. Piles and hands are ScrapPiles and are read straight off the attributes;
+    # anything that changes how many scraps the session holds goes through a method here,
+    # so total_scraps can't drift from the piles.
+    # The RNG (a few KB of Mersenne Twister state) is only created on the first random draw.
+    __slots__ = ('id', 'bowl', 'discard', 'players', 'creator', 'home_channel', 'last_active',
+                 'total_scraps', 'bans', 'members', 'history', 'seed', '_rng')
+
+    def __init__(self, session_id, creator, home_channel, last_active, seed=None, history_bytes=None):
+        self.id = session_id
+        self.bowl = ScrapPile()
+        self.discard = ScrapPile()
+        self.players = {creator: ScrapPile()}
+        self.creator = creator
+        self.home_channel = home_channel
+        self.last_active = last_active
+        self.total_scraps = 0
+        self.bans = set()
+        self.members = MemberIndex()
+        self.history = UndoHistory(max_bytes=history_bytes)
+        self.seed = seed
+        self._rng = None
+
+    @property
+    def rng(self):
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        return self._rng
+
+    @property
+    def nbytes(self):
+        return self.bowl.nbytes + self.discard.nbytes + sum(hand.nbytes for hand in self.players.values())
+
+    def add_player(self, user_id):
+        return self.players.setdefault(user_id, ScrapPile())
+
+    def remove_player(self, user_id):
+        hand = self.players.pop(user_id)
+        self.total_scraps -= len(hand)
+        return hand
+
+    def take_hand(self, user_id):
+        # swaps the player's hand for an empty one; the caller decides where the old one goes
+        hand = self.players[user_id]
+        self.players[user_id] = ScrapPile()
+        return hand
+
+    def add_scraps(self, pile, scraps):
+        pile += scraps
+        self.total_scraps += len(scraps)
+
+    def destroyed(self, scraps):
+        # for scraps a command has already taken out of a pile and isn't putting anywhere
+        self.total_scraps -= len(scraps)
+
+    def recall(self):
+        # moves every hand into the bowl; returns the old hands
+        hands = self.players
+        for hand in hands.values():
+            self.bowl += hand
+        self.players = {user_id: ScrapPile() for user_id in hands}
+        return hands
+
+    def shuffle(self):
+        # moves the discard pile into the bowl; returns the old discard pile
+        discard = self.discard
+        self.bowl += discard
+        self.discard = ScrapPile()
+        return discard
+
+    def empty_bowl(self):
+        bowl = self.bowl
+        self.bowl = ScrapPile()
+        self.total_scraps -= len(bowl)
+        return bowl
+
+    def empty_discard(self):
+        discard = self.discard
+        self.discard = ScrapPile()
+        self.total_scraps -= len(discard)
+        return discard
+
+    def empty_hands(self):
+        hands = self.players
+        self.players = {user_id: ScrapPile() for user_id in hands}
+        self.total_scraps -= sum(len(hand) for hand in hands.values())
+        return hands
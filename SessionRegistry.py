@@ -0,0 +1,98 @@
+import heapq
+import itertools
+
+TOTAL_BYTES_MAX_AGE = 1.0  # seconds between full recounts of the memory held by all sessions
+
+
+class SessionRegistry:
+    # Owns the sessions/users tables and hands out session IDs from a free-list,
+    # so starting a session is O(1) no matter how many are running.
+    def __init__(self, max_sessions, timeout):
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+        self.sessions = {}
+        self.users = {}
+        self.free_ids = []
+        self.next_id = 0
+        self.expiry_heap = []
+        self.expiry_counter = itertools.count()
+        # bumped each time an ID is handed out, so heap entries left by an ended session are
+        # recognized without the heap holding on to the session itself
+        self.generations = {}
+        self.generation_counter = itertools.count()
+        self.budget_bytes = 0
+        self.budget_counted_at = None
+
+    def allocate_id(self):
+        if len(self.sessions) >= self.max_sessions:
+            return None
+        if self.free_ids:
+            session_id = self.free_ids.pop()
+        else:
+            session_id = self.next_id
+            self.next_id += 1
+        self.generations[session_id] = next(self.generation_counter)
+        return session_id
+
+    def release_id(self, session_id):
+        self.generations.pop(session_id, None)
+        self.free_ids.append(session_id)
+
+    def claim_id(self, session_id):
+        # used when restoring sessions, which keep the IDs they were started with;
+        # False if the ID is already in use, so a second claim changes nothing
+        if session_id in self.sessions:
+            return False
+        if session_id >= self.next_id:
+            self.free_ids.extend(range(self.next_id, session_id))
+            self.next_id = session_id + 1
+        elif session_id in self.free_ids:
+            self.free_ids.remove(session_id)
+        else:
+            # handed out by allocate_id but not registered yet
+            return False
+        self.generations[session_id] = next(self.generation_counter)
+        return True
+
+    def session_bytes(self, session_id):
+        return self.sessions[session_id].nbytes
+
+    def total_bytes(self):
+        return sum(self.session_bytes(session_id) for session_id in self.sessions)
+
+    # What counts against the global memory budget: the piles plus each session's undo history.
+    # Recounting every session on each add would make adds O(sessions), so the count is redone at
+    # most every max_age seconds and adds in between are added to it; anything freed in between
+    # only shows up at the next recount, which errs on the side of refusing.
+    def budget_used(self, now, max_age=TOTAL_BYTES_MAX_AGE):
+        if self.budget_counted_at is None or now - self.budget_counted_at > max_age:
+            self.budget_bytes = sum(session.nbytes + session.history.nbytes for session in self.sessions.values())
+            self.budget_counted_at = now
+        return self.budget_bytes
+
+    def charge_budget(self, nbytes):
+        self.budget_bytes += nbytes
+
+    # Each live session has one heap entry. Activity only bumps 'last_active'; a stale
+    # entry is pushed back with the real deadline when it reaches the top of the heap.
+    def track_expiry(self, session_id):
+        heapq.heappush(self.expiry_heap, (self.sessions[session_id].last_active + self.timeout,
+                                          next(self.expiry_counter), session_id, self.generations[session_id]))
+
+    def seconds_until_expiry(self, now):
+        if not self.expiry_heap:
+            return self.timeout
+        return max(self.expiry_heap[0][0] - now, 0.0)
+
+    def pop_expired(self, now):
+        expired = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            _, _, session_id, generation = heapq.heappop(self.expiry_heap)
+            if session_id not in self.sessions or self.generations.get(session_id) != generation:
+                continue
+            deadline = self.sessions[session_id].last_active + self.timeout
+            if deadline > now:
+                heapq.heappush(self.expiry_heap, (deadline, next(self.expiry_counter), session_id, generation))
+                continue
+            expired.append(session_id)
+        return expired
@@ -0,0 +1,437 @@
+import sqlite3
+import json
+import time
+import asyncio
+from ScrapPile import ScrapPile
+from Session import Session
+
+BOWL = "bowl"
+DISCARD = "discard"
+
+
+# sessions get a fresh snapshot (and their log compacted) after this many events
+SNAPSHOT_EVERY = 500
+
+
+def hand(user_id):
+    return "hand:%d" % user_id
+
+
+def pile_at(session, location):
+    if location == BOWL:
+        return session.bowl
+    if location == DISCARD:
+        return session.discard
+    return session.players[int(location[5:])]
+
+
+def session_state(session):
+    home_channel = session.home_channel
+    return {'creator': session.creator,
+            'home_channel': getattr(home_channel, 'id', home_channel),
+            'bans': sorted(session.bans),
+            'bowl': list(session.bowl),
+            'discard': list(session.discard),
+            'players': {str(user_id): list(hand) for user_id, hand in session.players.items()}}
+
+
+def session_from_state(session_id, state, last_active):
+    session = Session(session_id, state['creator'], state['home_channel'], last_active)
+    session.bans.update(state['bans'])
+    session.players = {int(user_id): ScrapPile() for user_id in state['players']}
+    session.add_scraps(session.bowl, state['bowl'])
+    session.add_scraps(session.discard, state['discard'])
+    for user_id, scraps in state['players'].items():
+        session.add_scraps(session.players[int(user_id)], scraps)
+    return session
+
+
+def take_from(pile, scraps):
+    return [scrap for scrap in scraps if pile.take(scrap) is not None]
+
+
+def apply_event(session, kind, args):
+    # the in-memory counterpart of each MemoryStore mutation; scraps missing from their pile are skipped
+    if kind == 'creator':
+        session.creator = args[0]
+    elif kind == 'home':
+        session.home_channel = args[0]
+    elif kind == 'join':
+        session.add_player(args[0])
+    elif kind == 'leave':
+        if args[0] in session.players:
+            session.remove_player(args[0])
+    elif kind == 'ban':
+        session.bans.add(args[0])
+    elif kind == 'unban':
+        session.bans.discard(args[0])
+    elif kind == 'add':
+        session.add_scraps(pile_at(session, args[0]), args[1])
+    elif kind == 'remove':
+        session.destroyed(take_from(pile_at(session, args[0]), args[1]))
+    elif kind == 'move':
+        pile_at(session, args[1]).extend(take_from(pile_at(session, args[0]), args[2]))
+    elif kind == 'move_all':
+        source = pile_at(session, args[0])
+        pile_at(session, args[1]).extend(source)
+        source.clear()
+    elif kind == 'clear':
+        pile = pile_at(session, args[0])
+        session.destroyed(pile)
+        pile.clear()
+    elif kind == 'edit':
+        pile = pile_at(session, args[0])
+        if pile.take(args[1]) is not None:
+            pile.append(args[2])
+    else:
+        raise ValueError("Unknown event %r" % kind)
+
+
+class MemoryStore:
+    # Sessions only live in FishbowlBot's dicts, so there is nothing to journal or recover.
+    def load(self):
+        return {}
+
+    def create_session(self, session_id, creator_id, channel_id, last_active):
+        pass
+
+    def delete_session(self, session_id):
+        pass
+
+    def touch(self, session_id, last_active):
+        pass
+
+    def set_creator(self, session_id, user_id):
+        pass
+
+    def set_home_channel(self, session_id, channel_id):
+        pass
+
+    def add_player(self, session_id, user_id):
+        pass
+
+    def remove_player(self, session_id, user_id):
+        pass
+
+    def ban(self, session_id, user_id):
+        pass
+
+    def unban(self, session_id, user_id):
+        pass
+
+    def add_scraps(self, session_id, location, scraps):
+        pass
+
+    def remove_scraps(self, session_id, location, scraps):
+        pass
+
+    def move_scraps(self, session_id, source, dest, scraps):
+        pass
+
+    def move_all(self, session_id, source, dest):
+        pass
+
+    def clear(self, session_id, location):
+        pass
+
+    def edit_scrap(self, session_id, location, old_scrap, new_scrap):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteStore(MemoryStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        creator INTEGER NOT NULL,
+        home_channel INTEGER NOT NULL,
+        last_active REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS players (
+        session_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (session_id, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS bans (
+        session_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (session_id, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS scraps (
+        id INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        location TEXT NOT NULL,
+        scrap TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS scraps_by_location ON scraps (session_id, location, scrap);
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self.db.commit()
+        self.commit_pending = False
+
+    # every mutation made during one pass of the event loop goes into the same transaction
+    def schedule_commit(self):
+        if self.commit_pending:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.db.commit()
+        self.commit_pending = True
+        loop.call_soon(self.commit)
+
+    def commit(self):
+        self.commit_pending = False
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def load(self):
+        sessions = {}
+        # last_active is stored as wall-clock time; turn it back into the monotonic clock the bot uses
+        clock_offset = time.monotonic() - time.time()
+        # session IDs are stored as text
+        for session_id, creator, home_channel, last_active in self.db.execute(
+                "SELECT session_id, creator, home_channel, last_active FROM sessions"):
+            sessions[int(session_id)] = Session(int(session_id), creator, home_channel, last_active + clock_offset)
+        for session_id, user_id in self.db.execute("SELECT session_id, user_id FROM players"):
+            sessions[int(session_id)].add_player(user_id)
+        for session_id, user_id in self.db.execute("SELECT session_id, user_id FROM bans"):
+            sessions[int(session_id)].bans.add(user_id)
+        for session_id, location, scrap in self.db.execute(
+                "SELECT session_id, location, scrap FROM scraps ORDER BY id"):
+            session = sessions[int(session_id)]
+            session.add_scraps(pile_at(session, location), (scrap,))
+        return sessions
+
+    def create_session(self, session_id, creator_id, channel_id, last_active):
+        self.db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                        (session_id, creator_id, channel_id, last_active))
+        self.db.execute("INSERT OR IGNORE INTO players VALUES (?, ?)", (session_id, creator_id))
+        self.schedule_commit()
+
+    def delete_session(self, session_id):
+        for table in ("sessions", "players", "bans", "scraps"):
+            self.db.execute("DELETE FROM %s WHERE session_id = ?" % table, (session_id,))
+        self.schedule_commit()
+
+    def touch(self, session_id, last_active):
+        self.db.execute("UPDATE sessions SET last_active = ? WHERE session_id = ?", (last_active, session_id))
+        self.schedule_commit()
+
+    def set_creator(self, session_id, user_id):
+        self.db.execute("UPDATE sessions SET creator = ? WHERE session_id = ?", (user_id, session_id))
+        self.schedule_commit()
+
+    def set_home_channel(self, session_id, channel_id):
+        self.db.execute("UPDATE sessions SET home_channel = ? WHERE session_id = ?", (channel_id, session_id))
+        self.schedule_commit()
+
+    def add_player(self, session_id, user_id):
+        self.db.execute("INSERT OR IGNORE INTO players VALUES (?, ?)", (session_id, user_id))
+        self.schedule_commit()
+
+    def remove_player(self, session_id, user_id):
+        self.db.execute("DELETE FROM players WHERE session_id = ? AND user_id = ?", (session_id, user_id))
+        self.db.execute("DELETE FROM scraps WHERE session_id = ? AND location = ?", (session_id, hand(user_id)))
+        self.schedule_commit()
+
+    def ban(self, session_id, user_id):
+        self.db.execute("INSERT OR IGNORE INTO bans VALUES (?, ?)", (session_id, user_id))
+        self.schedule_commit()
+
+    def unban(self, session_id, user_id):
+        self.db.execute("DELETE FROM bans WHERE session_id = ? AND user_id = ?", (session_id, user_id))
+        self.schedule_commit()
+
+    def add_scraps(self, session_id, location, scraps):
+        self.db.executemany("INSERT INTO scraps (session_id, location, scrap) VALUES (?, ?, ?)",
+                            [(session_id, location, scrap) for scrap in scraps])
+        self.schedule_commit()
+
+    # duplicates are allowed, so each statement only touches one matching row
+    def remove_scraps(self, session_id, location, scraps):
+        self.db.executemany("DELETE FROM scraps WHERE id = (SELECT id FROM scraps "
+                            "WHERE session_id = ? AND location = ? AND scrap = ? LIMIT 1)",
+                            [(session_id, location, scrap) for scrap in scraps])
+        self.schedule_commit()
+
+    def move_scraps(self, session_id, source, dest, scraps):
+        self.db.executemany("UPDATE scraps SET location = ? WHERE id = (SELECT id FROM scraps "
+                            "WHERE session_id = ? AND location = ? AND scrap = ? LIMIT 1)",
+                            [(dest, session_id, source, scrap) for scrap in scraps])
+        self.schedule_commit()
+
+    def move_all(self, session_id, source, dest):
+        self.db.execute("UPDATE scraps SET location = ? WHERE session_id = ? AND location = ?",
+                        (dest, session_id, source))
+        self.schedule_commit()
+
+    def clear(self, session_id, location):
+        self.db.execute("DELETE FROM scraps WHERE session_id = ? AND location = ?", (session_id, location))
+        self.schedule_commit()
+
+    def edit_scrap(self, session_id, location, old_scrap, new_scrap):
+        self.db.execute("UPDATE scraps SET scrap = ? WHERE id = (SELECT id FROM scraps "
+                        "WHERE session_id = ? AND location = ? AND scrap = ? LIMIT 1)",
+                        (new_scrap, session_id, location, old_scrap))
+        self.schedule_commit()
+
+
+class JournalStore(SQLiteStore):
+    # Every change to a session is appended to its event log as (kind, JSON args) instead of
+    # being applied to rows. Every SNAPSHOT_EVERY events the session's live state is written
+    # out whole and the events behind it are deleted, so recovery loads the latest snapshot
+    # and replays only the tail. last_active changes on every command and isn't an event;
+    # it's kept in place in journal_sessions, which is also the list of sessions that exist.
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS journal_sessions (
+        session_id TEXT PRIMARY KEY,
+        last_active REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS events (
+        seq INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        args TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS events_by_session ON events (session_id, seq);
+    CREATE TABLE IF NOT EXISTS snapshots (
+        session_id TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        state TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path, state_of=None, snapshot_every=SNAPSHOT_EVERY):
+        super().__init__(path)
+        # state_of(session_id) gives the live session to snapshot; without it the log is never compacted
+        self.state_of = state_of
+        self.snapshot_every = snapshot_every
+        self.unsnapshotted = {}
+        self.last_seq = {}
+        self.snapshot_due = set()
+
+    def append(self, session_id, kind, *args):
+        seq = self.db.execute("INSERT INTO events (session_id, kind, args) VALUES (?, ?, ?)",
+                              (session_id, kind, json.dumps(args, separators=(',', ':')))).lastrowid
+        self.last_seq[session_id] = seq
+        count = self.unsnapshotted.get(session_id, 0) + 1
+        self.unsnapshotted[session_id] = count
+        if count >= self.snapshot_every and self.state_of is not None:
+            # taken at commit time, once the handler that logged this event has finished changing the session
+            self.snapshot_due.add(session_id)
+        self.schedule_commit()
+
+    def snapshot(self, session_id):
+        session = self.state_of(session_id)
+        seq = self.last_seq.get(session_id)
+        if session is None or seq is None:
+            return
+        self.db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                        (session_id, seq, json.dumps(session_state(session), separators=(',', ':'))))
+        self.db.execute("DELETE FROM events WHERE session_id = ? AND seq <= ?", (session_id, seq))
+        self.unsnapshotted[session_id] = 0
+
+    def commit(self):
+        for session_id in self.snapshot_due:
+            self.snapshot(session_id)
+        self.snapshot_due.clear()
+        super().commit()
+
+    def events(self, session_id):
+        # the session's log since its latest snapshot, oldest first
+        for seq, kind, args in self.db.execute(
+                "SELECT seq, kind, args FROM events WHERE session_id = ? ORDER BY seq", (session_id,)):
+            yield seq, kind, json.loads(args)
+
+    def load(self):
+        sessions = {}
+        clock_offset = time.monotonic() - time.time()
+        last_active = {int(session_id): seconds for session_id, seconds
+                       in self.db.execute("SELECT session_id, last_active FROM journal_sessions")}
+        for session_id, seq, state in self.db.execute("SELECT session_id, seq, state FROM snapshots"):
+            session_id = int(session_id)
+            sessions[session_id] = session_from_state(session_id, json.loads(state),
+                                                      last_active.get(session_id, 0.0) + clock_offset)
+            self.last_seq[session_id] = seq
+        for seq, session_id, kind, args in self.db.execute("SELECT seq, session_id, kind, args FROM events ORDER BY seq"):
+            session_id = int(session_id)
+            args = json.loads(args)
+            if kind == 'create':
+                sessions[session_id] = Session(session_id, args[0], args[1], last_active.get(session_id, 0.0) + clock_offset)
+            elif session_id in sessions:
+                apply_event(sessions[session_id], kind, args)
+            self.last_seq[session_id] = seq
+            self.unsnapshotted[session_id] = self.unsnapshotted.get(session_id, 0) + 1
+        for session_id in sessions.keys() - last_active.keys():
+            print('Session #%s has events but no row; dropping it' % session_id)
+            self.delete_session(session_id)
+            del sessions[session_id]
+        return sessions
+
+    def create_session(self, session_id, creator_id, channel_id, last_active):
+        # IDs are reused, so anything left from an earlier session with this ID goes first
+        self.delete_session(session_id)
+        self.db.execute("INSERT INTO journal_sessions VALUES (?, ?)", (session_id, last_active))
+        self.append(session_id, 'create', creator_id, channel_id)
+
+    def delete_session(self, session_id):
+        for table in ("journal_sessions", "events", "snapshots"):
+            self.db.execute("DELETE FROM %s WHERE session_id = ?" % table, (session_id,))
+        self.unsnapshotted.pop(session_id, None)
+        self.last_seq.pop(session_id, None)
+        self.snapshot_due.discard(session_id)
+        self.schedule_commit()
+
+    def touch(self, session_id, last_active):
+        self.db.execute("UPDATE journal_sessions SET last_active = ? WHERE session_id = ?", (last_active, session_id))
+        self.schedule_commit()
+
+    def set_creator(self, session_id, user_id):
+        self.append(session_id, 'creator', user_id)
+
+    def set_home_channel(self, session_id, channel_id):
+        self.append(session_id, 'home', channel_id)
+
+    def add_player(self, session_id, user_id):
+        self.append(session_id, 'join', user_id)
+
+    def remove_player(self, session_id, user_id):
+        self.append(session_id, 'leave', user_id)
+
+    def ban(self, session_id, user_id):
+        self.append(session_id, 'ban', user_id)
+
+    def unban(self, session_id, user_id):
+        self.append(session_id, 'unban', user_id)
+
+    def add_scraps(self, session_id, location, scraps):
+        self.append(session_id, 'add', location, list(scraps))
+
+    def remove_scraps(self, session_id, location, scraps):
+        self.append(session_id, 'remove', location, list(scraps))
+
+    def move_scraps(self, session_id, source, dest, scraps):
+        self.append(session_id, 'move', source, dest, list(scraps))
+
+    def move_all(self, session_id, source, dest):
+        self.append(session_id, 'move_all', source, dest)
+
+    def clear(self, session_id, location):
+        self.append(session_id, 'clear', location)
+
+    def edit_scrap(self, session_id, location, old_scrap, new_scrap):
+        self.append(session_id, 'edit', location, old_scrap, new_scrap)
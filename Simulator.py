@@ -0,0 +1,444 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import random
+import re
+import resource
+import time
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+import FishbowlBackend
+import FishbowlBot
+import StartupProfiler
+from CommandRecorder import read_recording
+
+ANONYMIZED_MENTION_RE = re.compile(r'<@!?([0-9a-f]+)>')
+
+# relative weights of what players type once their session is set up
+DEFAULT_MIX = {'draw': 30, 'play': 20, 'add': 10, 'pass': 10, 'hand': 10, 'check': 5, 'see': 5, 'return': 5,
+               'shuffle': 3, 'recall': 2}
+
+
+class FakeMessage:
+    ids = itertools.count(1)
+
+    def __init__(self, sim, channel):
+        self.sim = sim
+        self.id = next(FakeMessage.ids)
+        self.channel = channel
+
+    async def add_reaction(self, emoji):
+        await self.sim.api_call()
+        # confirm_req adds the "no" reaction last, then starts waiting
+        if emoji == FishbowlBot.EMOJI_N:
+            self.sim.schedule_answer(self)
+
+    async def remove_reaction(self, emoji, member):
+        await self.sim.api_call()
+
+    async def edit(self, **kwargs):
+        await self.sim.api_call()
+
+
+class FakeChannel:
+    ids = itertools.count(10 ** 12)
+
+    def __init__(self, sim, guild=None, recipient=None):
+        self.sim = sim
+        self.id = next(FakeChannel.ids)
+        self.guild = guild
+        self.recipient = recipient
+        self.type = discord.ChannelType.private if recipient is not None else discord.ChannelType.text
+
+    async def send(self, content=None, **kwargs):
+        await self.sim.api_call()
+        # slash command replies pass view=MISSING when there's no view
+        if hasattr(kwargs.get('view'), 'receiver_id'):
+            self.sim.schedule_answer(kwargs['view'])
+        return FakeMessage(self.sim, self)
+
+
+class FakeInteraction:
+    # what a button press hands the view: who pressed it, and the response used to edit the message
+    def __init__(self, sim, user_id):
+        self.sim = sim
+        self.user = SimpleNamespace(id=user_id)
+        self.response = self
+
+    async def edit_message(self, **kwargs):
+        await self.sim.api_call()
+
+    async def send_message(self, content=None, **kwargs):
+        await self.sim.api_call()
+
+
+class FakeInteractionResponse:
+    # a slash command's first reply goes out as the interaction response, later ones as follow-ups
+    def __init__(self, channel):
+        self.channel = channel
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+        await self.channel.send(content, **kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, content=None, wait=False, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+if hasattr(discord, 'app_commands'):
+    class FakeSlashInteraction(discord.Interaction):
+        # a real Interaction built from a gateway payload; only its replies are faked, and fetching the
+        # original response after the first reply is one more call, as it is on Discord
+        async def original_response(self):
+            await self.channel.sim.api_call()
+            return FakeMessage(self.channel.sim, self.channel)
+
+
+class FakeUser:
+    def __init__(self, sim, user_id):
+        self.id = user_id
+        self.name = "player%d" % user_id
+        self.discriminator = "%04d" % (user_id % 10000)
+        self.display_name = self.name
+        self.mention = "<@%d>" % user_id
+        self.bot = False
+        self.dm_channel = FakeChannel(sim, recipient=self)
+
+    def __str__(self):
+        return "%s#%s" % (self.name, self.discriminator)
+
+    async def send(self, content=None, **kwargs):
+        return await self.dm_channel.send(content, **kwargs)
+
+    async def create_dm(self):
+        return self.dm_channel
+
+
+class FakeContext(commands.Context):
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class Simulator:
+    # Drives the registered commands with fake users, channels and messages, the same way
+    # bot.invoke would for real messages. Every send or reaction counts as one API call and
+    # takes api_latency seconds; confirmations are answered after answer_delay seconds.
+    # With think_time 0 every player fires commands back to back, which finds the ceiling;
+    # a think time (mean seconds between a player's commands) models a given offered load.
+    def __init__(self, sessions=1000, players=4, commands_per_player=20, scraps=20, mix=DEFAULT_MIX,
+                 api_latency=0.0, answer_delay=0.0, accept_rate=0.9, dm_rate=0.1, think_time=0.0, seed=None):
+        self.sessions = sessions
+        self.players = players
+        self.commands_per_player = commands_per_player
+        self.scraps = scraps
+        self.mix = mix
+        self.api_latency = api_latency
+        self.answer_delay = answer_delay
+        self.accept_rate = accept_rate
+        self.dm_rate = dm_rate
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.user_ids = itertools.count(10 ** 6)
+        self.bot = FishbowlBackend.bot
+        self.latencies = {}
+        self.api_calls = 0
+        self.failed_sessions = 0
+        self.peak_session_bytes = 0
+
+    def make_user(self):
+        user = FakeUser(self, next(self.user_ids))
+        FishbowlBackend.user_cache.remember(FishbowlBackend.user_cache.users, user.id, user)
+        return user
+
+    async def api_call(self):
+        self.api_calls += 1
+        await asyncio.sleep(self.api_latency)
+
+    def schedule_answer(self, message):
+        asyncio.get_event_loop().call_later(self.answer_delay, self.answer, message)
+
+    def answer(self, message):
+        accepted = self.rng.random() < self.accept_rate
+        if hasattr(message, 'receiver_id'):
+            # a confirmation view (buttons): the receiver presses one
+            asyncio.ensure_future(self.press(message, message.yes_button if accepted else message.no_button,
+                                             message.receiver_id))
+            return
+        waiter = FishbowlBackend.reaction_waiters.waiters.get(message.id)
+        if waiter is None:
+            return
+        future, receiver_id, emoji = waiter
+        FishbowlBackend.reaction_waiters.dispatch(SimpleNamespace(message_id=message.id, user_id=receiver_id,
+                                                                  emoji=emoji[0] if accepted else emoji[1]))
+
+    async def press(self, view, button, user_id):
+        # goes through the view's own check and button callback, as discord.py does for a real press
+        interaction = FakeInteraction(self, user_id)
+        if await view.interaction_check(interaction):
+            await button.callback(interaction)
+
+    def message(self, user, channel, text):
+        return SimpleNamespace(id=next(FakeMessage.ids), author=user, channel=channel, guild=channel.guild,
+                               content="!" + text, attachments=[], _state=self.bot._connection)
+
+    async def invoke(self, user, channel, text):
+        name, _, args = text.partition(" ")
+        message = self.message(user, channel, text)
+        ctx = FakeContext(message=message, bot=self.bot, view=StringView(args), prefix="!",
+                          command=self.bot.get_command(name), invoked_with=name)
+        started = time.perf_counter()
+        await self.bot.invoke(ctx)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    def slash_interaction(self, user, channel, name, arguments):
+        options = [{'name': 'arguments', 'type': 3, 'value': arguments}] if arguments else []
+        data = {'id': discord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc)), 'application_id': 1,
+                'type': 2, 'token': 'token', 'version': 1,
+                'data': {'id': 1, 'name': name, 'type': 1, 'options': options}}
+        interaction = FakeSlashInteraction(data=data, state=self.bot._connection)
+        interaction.channel = channel
+        interaction.user = user
+        interaction._cs_response = FakeInteractionResponse(channel)
+        interaction._cs_followup = FakeFollowup(channel)
+        return interaction
+
+    async def slash(self, user, channel, text):
+        # the same command typed as a slash command, dispatched by the command tree like a real interaction
+        name, _, args = text.partition(" ")
+        started = time.perf_counter()
+        await self.bot.tree._call(self.slash_interaction(user, channel, name, args))
+        self.latencies.setdefault("/" + name, []).append(time.perf_counter() - started)
+
+    def next_command(self, user, players):
+        command = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        hand = FishbowlBot.hand_scraps(user.id)
+        if command in ('play', 'return', 'pass') and not hand:
+            command = 'draw'
+        if command == 'draw':
+            return "draw 1"
+        if command == 'add':
+            return "add scrap%d" % self.rng.randrange(10 ** 6)
+        if command in ('play', 'return'):
+            return '%s "%s"' % (command, self.rng.choice(hand))
+        if command == 'pass':
+            target = self.rng.choice([player for player in players if player is not user])
+            return 'pass %s "%s"' % (target.mention, self.rng.choice(hand))
+        if command == 'see':
+            return "see bowl"
+        return command
+
+    async def play(self, user, channel, players):
+        for _ in range(self.commands_per_player):
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+            from_dm = self.rng.random() < self.dm_rate
+            await self.invoke(user, user.dm_channel if from_dm else channel, self.next_command(user, players))
+
+    async def open_session(self, players, scraps):
+        # starts a session in a fresh guild channel, has everyone join and fills the bowl;
+        # returns None for the session ID if the bot refused to start it
+        guild = SimpleNamespace(id=next(FakeChannel.ids), owner_id=0)
+        channel = FakeChannel(self, guild=guild)
+        players = [self.make_user() for _ in range(players)]
+        creator = players[0]
+        await self.invoke(creator, channel, "start")
+        session_id = FishbowlBot.users.get(creator.id)
+        if session_id is None:
+            return None, channel, players
+        for player in players[1:]:
+            await self.invoke(player, channel, "join %s" % session_id)
+        await self.invoke(creator, channel, "add " + " ".join("scrap%d" % i for i in range(scraps)))
+        return session_id, channel, players
+
+    async def run_session(self):
+        session_id, channel, players = await self.open_session(self.players, self.scraps)
+        if session_id is None:
+            self.failed_sessions += 1
+            return
+        creator = players[0]
+        if len(players) > 1:
+            await asyncio.gather(*[self.play(player, channel, players) for player in players])
+        await self.invoke(creator, channel, "end")
+
+    async def run(self):
+        self.bot._connection.user = FakeUser(self, 1)
+        await FishbowlBot.accept_commands()
+        sampler = asyncio.ensure_future(self.sample_memory())
+        started = time.perf_counter()
+        await asyncio.gather(*[self.run_session() for _ in range(self.sessions)])
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        return elapsed
+
+    async def sample_memory(self, interval=1.0):
+        while True:
+            self.peak_session_bytes = max(self.peak_session_bytes, FishbowlBot.registry.total_bytes())
+            await asyncio.sleep(interval)
+
+    def report(self, elapsed):
+        all_latencies = sorted(itertools.chain.from_iterable(self.latencies.values()))
+        lines = ["%d sessions x %d players: %d commands in %.2fs (%.0f commands/s), %d API calls" % (
+            self.sessions, self.players, len(all_latencies), elapsed, len(all_latencies) / elapsed, self.api_calls)]
+        lines.append("%-10s %8s %10s %10s" % ("command", "count", "p50 [ms]", "p99 [ms]"))
+        for name, latencies in sorted(self.latencies.items()) + [("all", all_latencies)]:
+            latencies = sorted(latencies)
+            lines.append("%-10s %8d %10.3f %10.3f" % (name, len(latencies), percentile(latencies, 0.5) * 1e3,
+                                                      percentile(latencies, 0.99) * 1e3))
+        errors = FishbowlBackend.command_errors.values
+        lines.append("Command errors: %d, failed sessions: %d" % (sum(errors.values()), self.failed_sessions))
+        for (name, error), count in sorted(errors.items()):
+            lines.append("  %s %s: %d" % (name, error, count))
+        lines.append("Peak RSS: %.1f MB, peak session memory: %.1f MB" % (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, self.peak_session_bytes / 1e6))
+        return "\n".join(lines)
+
+
+class Replayer(Simulator):
+    # Feeds a CommandRecorder log back through the same fakes. Each recorded user's commands run
+    # in their recorded order; speed scales the recorded gaps between commands, and speed 0 runs
+    # the whole log one command at a time as fast as possible.
+    def __init__(self, entries, speed=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.entries = entries
+        self.speed = speed
+        self.fake_users = {}
+        self.channels = {}
+        self.session_ids = {}
+        self.starts = {}
+        self.recorded = {}
+        self.sessions = len({entry['s'] for entry in entries if entry['c'] == 'start' and entry.get('s') is not None})
+
+    def user(self, anonymized_id):
+        user = self.fake_users.get(anonymized_id)
+        if user is None:
+            user = self.fake_users[anonymized_id] = self.make_user()
+        return user
+
+    def channel(self, entry):
+        if entry['dm']:
+            return self.user(entry['u']).dm_channel
+        channel = self.channels.get(entry['ch'])
+        if channel is None:
+            guild = SimpleNamespace(id=next(FakeChannel.ids), owner_id=0)
+            channel = self.channels[entry['ch']] = FakeChannel(self, guild=guild)
+        return channel
+
+    def command_text(self, entry):
+        arguments = ANONYMIZED_MENTION_RE.sub(lambda m: self.user(m.group(1)).mention, entry['a'])
+        if entry['c'] == 'join' and arguments:
+            # sessions get new IDs in the replay
+            session_id, _, rest = arguments.partition(" ")
+            arguments = ("%s %s" % (self.session_ids.get(session_id, session_id), rest)).strip()
+        return ("%s %s" % (entry['c'], arguments)).strip()
+
+    async def replay_entry(self, entry, previous):
+        if previous is not None:
+            await previous
+        if entry['c'] == 'join' and entry['a']:
+            # a join can't overtake the start of the session it names
+            start = self.starts.get(entry['a'].partition(" ")[0])
+            if start is not None:
+                await start
+        user = self.user(entry['u'])
+        await self.invoke(user, self.channel(entry), self.command_text(entry))
+        if entry['c'] == 'start' and entry.get('s') is not None:
+            self.session_ids[str(entry['s'])] = FishbowlBot.users.get(user.id)
+        self.recorded.setdefault(entry['c'], []).append(entry['d'])
+
+    async def run(self):
+        self.bot._connection.user = FakeUser(self, 1)
+        await FishbowlBot.accept_commands()
+        sampler = asyncio.ensure_future(self.sample_memory())
+        started = time.perf_counter()
+        if not self.speed:
+            for entry in self.entries:
+                await self.replay_entry(entry, None)
+        elif self.entries:
+            chains = {}
+            first = self.entries[0]['t']
+            for entry in self.entries:
+                delay = (entry['t'] - first) / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                previous = chains.get(entry['u'])
+                if entry['c'] == 'end':
+                    # commands that started before the end was recorded finish before it's replayed
+                    previous = asyncio.gather(*chains.values())
+                chains[entry['u']] = asyncio.ensure_future(self.replay_entry(entry, previous))
+                if entry['c'] == 'start' and entry.get('s') is not None:
+                    self.starts[str(entry['s'])] = chains[entry['u']]
+            await asyncio.gather(*chains.values())
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        return elapsed
+
+    def report(self, elapsed):
+        lines = [super().report(elapsed), "",
+                 "%-10s %14s %14s %8s" % ("command", "recorded p50", "replayed p50", "ratio")]
+        for name, recorded in sorted(self.recorded.items()):
+            recorded_p50 = percentile(sorted(recorded), 0.5)
+            replayed_p50 = percentile(sorted(self.latencies.get(name, [])), 0.5)
+            ratio = replayed_p50 / recorded_p50 if recorded_p50 else 0.0
+            lines.append("%-10s %11.3fms %11.3fms %7.2fx" % (name, recorded_p50 * 1e3, replayed_p50 * 1e3, ratio))
+        return "\n".join(lines)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run FishbowlBot against simulated players, without Discord.")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--commands", type=int, default=20, help="commands per player")
+    parser.add_argument("--scraps", type=int, default=20, help="scraps the creator adds to start")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds per simulated API call")
+    parser.add_argument("--answer-delay", type=float, default=0.0, help="seconds before a confirmation is answered")
+    parser.add_argument("--accept-rate", type=float, default=0.9)
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a player's commands")
+    parser.add_argument("--dm-rate", type=float, default=0.1, help="share of commands sent from DMs")
+    parser.add_argument("--mix", help="command weights, e.g. draw=3,play=2,pass=1")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--rate-limits", action="store_true", help="keep the per-channel send rate limits")
+    parser.add_argument("--replay", help="replay a RECORD_COMMANDS log instead of generating traffic")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up; 0 replays back to back")
+    args = parser.parse_args()
+
+    mix = DEFAULT_MIX
+    if args.mix:
+        mix = {name: float(weight) for name, weight in (entry.split("=") for entry in args.mix.split(","))}
+    if not args.rate_limits:
+        FishbowlBackend.dispatcher.route_rate = float("inf")
+    FishbowlBot.setup()
+    if args.replay:
+        sim = Replayer(list(read_recording(args.replay)), speed=args.speed, api_latency=args.api_latency,
+                       answer_delay=args.answer_delay, accept_rate=args.accept_rate, seed=args.seed)
+    else:
+        sim = Simulator(sessions=args.sessions, players=args.players, commands_per_player=args.commands,
+                        scraps=args.scraps, mix=mix, api_latency=args.api_latency, answer_delay=args.answer_delay,
+                        accept_rate=args.accept_rate, dm_rate=args.dm_rate, think_time=args.think_time,
+                        seed=args.seed)
+    elapsed = StartupProfiler.offline_loop(FishbowlBackend.bot).run_until_complete(sim.run())
+    FishbowlBot.clean_inactive_sessions.cancel()
+    print(sim.report(elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import discord
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+# application commands arrived with discord.py 2.0; on 1.x the bot stays prefix-only
+SLASH_SUPPORTED = hasattr(discord, 'app_commands')
+DESCRIPTION_LIMIT = 100
+AUTOCOMPLETE_LIMIT = 25
+
+
+def quote_scrap(scrap):
+    return '"%s"' % scrap if " " in scrap else scrap
+
+
+def split_last_token(text):
+    # "pass @bob apple "gree" -> ('pass @bob apple ', 'gree'); an open quote starts the last token
+    if text.count('"') % 2:
+        start = text.rindex('"')
+    else:
+        start = text.rfind(" ") + 1
+    return text[:start], text[start:].strip('"')
+
+
+def make_slash_command(bot, name, description, scrap_source=None):
+    # Runs the registered prefix command with the option text as its argument string, so both
+    # front ends share the same handler, converters, checks and error handlers.
+    async def callback(interaction: discord.Interaction, arguments: str = ""):
+        ctx = await commands.Context.from_interaction(interaction)
+        ctx.command = bot.get_command(name)
+        ctx.invoked_with = name
+        ctx.view = StringView(arguments)
+        await bot.invoke(ctx)
+
+    command = discord.app_commands.Command(name=name, description=description[:DESCRIPTION_LIMIT], callback=callback)
+
+    if scrap_source is not None:
+        # only the invoker's own hand is offered; the bowl and discard pile stay hidden
+        @command.autocomplete('arguments')
+        async def complete_scrap(interaction, current):
+            head, partial = split_last_token(current)
+            pile = scrap_source(interaction.user.id)
+            if pile is None:
+                return []
+            choices = []
+            for scrap in pile.complete(partial, AUTOCOMPLETE_LIMIT):
+                value = head + quote_scrap(scrap)
+                choices.append(discord.app_commands.Choice(name=value[-DESCRIPTION_LIMIT:], value=value))
+            return choices
+
+    return command
+
+
+def register(bot, help_table, scrap_commands=(), scrap_source=None):
+    for name, row in help_table.items():
+        source = scrap_source if name in scrap_commands else None
+        bot.tree.add_command(make_slash_command(bot, name, row["Help"], source))
+
+
+async def sync(bot):
+    # global sync is rate limited by Discord; only run it when the command set changes
+    return await bot.tree.sync()
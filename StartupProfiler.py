@@ -0,0 +1,92 @@
+import asyncio
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# taken when this module is imported, which FishbowlBot does before anything else
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfiler:
+    def __init__(self, started=PROCESS_START):
+        self.started = started
+        self.last = started
+        self.phases = []
+        self.ready = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    @contextmanager
+    def phase(self, phase):
+        self.last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(phase)
+
+    def mark_ready(self, phase="gateway connect"):
+        # on_ready also fires after reconnects; only the first one is startup
+        if self.ready is None:
+            self.mark(phase)
+            self.ready = time.perf_counter() - self.started
+
+    def total(self):
+        if self.ready is not None:
+            return self.ready
+        return self.last - self.started
+
+    def report(self):
+        lines = ["Startup: %.3fs" % self.total()]
+        for phase, seconds in self.phases:
+            lines.append("  %-16s %8.3fs" % (phase, seconds))
+        return "\n".join(lines)
+
+
+def import_breakdown(modules, top=15):
+    # same numbers as `python -X importtime`, sorted by cumulative time
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative_us), int(self_us), name.rstrip()))
+    entries.sort(reverse=True)
+    lines = ["%10s %10s  %s" % ("cumul [us]", "self [us]", "module")]
+    for cumulative_us, self_us, name in entries[:top]:
+        lines.append("%10d %10d  %s" % (cumulative_us, self_us, name))
+    return "\n".join(lines)
+
+
+async def stub_login(bot):
+    # Stands in for login: 2.0 binds the bot to the running loop and runs setup_hook there;
+    # 1.x bound the bot to a loop when it was made
+    if hasattr(bot, 'setup_hook'):
+        await bot._async_setup_hook()
+        await bot.setup_hook()
+
+
+def offline_loop(bot):
+    # the loop to drive the bot on without Discord
+    if isinstance(bot.loop, asyncio.AbstractEventLoop):
+        return bot.loop
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(stub_login(bot))
+    return loop
+
+
+async def stub_gateway(bot, profiler):
+    # Stands in for login/connect: marks the client ready and fires on_ready without touching Discord.
+    async def change_presence(*args, **kwargs):
+        return None
+    bot.change_presence = change_presence
+    bot._ready.set()
+    bot.dispatch('ready')
+    while profiler.ready is None:
+        await asyncio.sleep(0)
@@ -0,0 +1,55 @@
+import sys
+
+UNDO_LIMIT = 50
+
+# what a change did, and so what undoing it has to do
+MOVED = "moved"  # scraps went from location to other_location; they go back
+REMOVED = "removed"  # scraps were destroyed at location; they're added back
+
+
+class UndoHistory:
+    # A bounded stack of session-wide actions (recall, shuffle, empty) and the scraps each one
+    # touched. Those actions swap a whole pile for an empty one, so an entry keeps the replaced
+    # pile's scrap list itself rather than a copy: the strings are shared with wherever the
+    # scraps went, and nothing is kept for the piles an action didn't touch.
+    def __init__(self, limit=UNDO_LIMIT, max_bytes=None):
+        self.entries = []  # at most limit long, so dropping from the front is cheap; smaller than a deque
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+    @staticmethod
+    def entry_bytes(changes):
+        nbytes = 0
+        for kind, location, other_location, scraps in changes:
+            nbytes += sys.getsizeof(scraps)
+            if kind == REMOVED:
+                # nothing else holds on to destroyed scraps
+                nbytes += sum(sys.getsizeof(scrap) for scrap in scraps)
+        return nbytes
+
+    def push(self, label, user_id, changes):
+        changes = [change for change in changes if change[3]]
+        if not changes:
+            return
+        nbytes = self.entry_bytes(changes)
+        self.entries.append((label, user_id, changes, nbytes))
+        self.nbytes += nbytes
+        while len(self.entries) > self.limit or (self.max_bytes is not None and self.nbytes > self.max_bytes
+                                                 and len(self.entries) > 1):
+            self.nbytes -= self.entries.pop(0)[3]
+
+    def pop(self):
+        label, user_id, changes, nbytes = self.entries.pop()
+        self.nbytes -= nbytes
+        return label, user_id, changes
+
+    def peek(self):
+        return self.entries[-1][:3]
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+from NotificationDispatcher import RouteBucket
+
+
+class UserCache:
+    # Bounded LRU of User and DMChannel objects in front of the gateway cache. Misses fall back
+    # to fetch_user, which is rate limited and coalesced per user; users Discord says don't exist
+    # are remembered for negative_ttl seconds so they aren't fetched again on every notification.
+    def __init__(self, bot, max_size=10000, negative_ttl=300.0, fetch_rate=10, fetch_period=1.0,
+                 fetch_concurrency=4):
+        self.bot = bot
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self.users = OrderedDict()
+        self.dm_channels = OrderedDict()
+        self.missing = OrderedDict()
+        self.pending = {}
+        self.fetch_bucket = None
+        self.fetch_args = (fetch_rate, fetch_period, fetch_concurrency)
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.fetches = 0
+        self.fetch_failures = 0
+
+    def remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+    def cached(self, user_id):
+        user = self.users.get(user_id)
+        if user is not None:
+            self.users.move_to_end(user_id)
+            return user
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            self.remember(self.users, user_id, user)
+        return user
+
+    async def get_user(self, user_id):
+        user = self.cached(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+        deadline = self.missing.get(user_id)
+        if deadline is not None:
+            if deadline > time.monotonic():
+                self.negative_hits += 1
+                return None
+            del self.missing[user_id]
+        self.misses += 1
+        fetch = self.pending.get(user_id)
+        if fetch is None:
+            fetch = self.pending[user_id] = asyncio.ensure_future(self.fetch(user_id))
+            fetch.add_done_callback(lambda f: self.pending.pop(user_id, None))
+        return await asyncio.shield(fetch)
+
+    async def fetch(self, user_id):
+        if self.fetch_bucket is None:
+            self.fetch_bucket = RouteBucket(*self.fetch_args)
+        async with self.fetch_bucket.semaphore:
+            await self.fetch_bucket.acquire()
+            self.fetches += 1
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                self.fetch_failures += 1
+                self.remember(self.missing, user_id, time.monotonic() + self.negative_ttl)
+                return None
+            except discord.HTTPException as e:
+                # transient; not worth remembering
+                self.fetch_failures += 1
+                print('Fetching user %s failed: %r' % (user_id, e))
+                return None
+        self.remember(self.users, user_id, user)
+        return user
+
+    async def get_dm(self, user_id):
+        channel = self.dm_channels.get(user_id)
+        if channel is not None:
+            self.dm_channels.move_to_end(user_id)
+            self.hits += 1
+            return channel
+        user = await self.get_user(user_id)
+        if user is None:
+            return None
+        channel = user.dm_channel
+        if channel is None:
+            channel = await user.create_dm()
+        self.remember(self.dm_channels, user_id, channel)
+        return channel
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.negative_hits
+        return {'users': len(self.users),
+                'dm_channels': len(self.dm_channels),
+                'negative': len(self.missing),
+                'hits': self.hits,
+                'misses': self.misses,
+                'negative_hits': self.negative_hits,
+                'fetches': self.fetches,
+                'fetch_failures': self.fetch_failures,
+                'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0.0}
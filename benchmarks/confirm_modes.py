@@ -0,0 +1,68 @@
+# REST calls and latency per pass, take and show for each confirmation mode, against the
+# Simulator's mock HTTP layer: every send, reaction, edit and interaction response is one call
+# taking --api-latency seconds, and the receiver answers right away. Button confirmations need
+# discord.py 2.0 message components and are reported as skipped on 1.x; they are pressed through the
+# view's own interaction check and button callback.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.confirm_modes
+import argparse
+
+import discord
+
+import ConfirmButtons
+import FishbowlBackend
+import FishbowlBot
+import StartupProfiler
+from Simulator import FakeUser, Simulator, percentile
+
+MODES = ("reactions", "buttons")
+
+
+async def measure(sim, rounds):
+    # creator and player pass one scrap back and forth, take it back, and show hands from DMs
+    await FishbowlBot.accept_commands()
+    session_id, channel, (creator, player) = await sim.open_session(2, 0)
+    await sim.invoke(creator, channel, "addtohand apple")
+    results = {}
+    for name, user, target, where in (("pass", creator, player, channel), ("take", creator, player, channel),
+                                      ("show", creator, player, creator.dm_channel)):
+        sim.latencies.pop(name, None)
+        calls = sim.api_calls
+        for _ in range(rounds):
+            if name == "pass":
+                await sim.invoke(user, where, "pass %s apple" % target.mention)
+                await sim.invoke(target, where, "pass %s apple" % user.mention)
+            elif name == "take":
+                await sim.invoke(target, where, "take %s apple" % user.mention)
+                await sim.invoke(user, where, "take %s apple" % target.mention)
+            else:
+                await sim.invoke(user, where, "show %s" % target.mention)
+        latencies = sorted(sim.latencies[name])
+        results[name] = ((sim.api_calls - calls) / len(latencies), percentile(latencies, 0.5))
+    await sim.invoke(creator, channel, "end")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count REST calls per confirmation in each confirm mode.")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds per mock REST call")
+    args = parser.parse_args()
+
+    FishbowlBackend.dispatcher.route_rate = float("inf")
+    FishbowlBot.setup()
+    print("%-10s %-6s %10s %12s" % ("mode", "cmd", "calls/cmd", "p50 [ms]"))
+    for mode in MODES:
+        if mode == "buttons" and not ConfirmButtons.BUTTONS_SUPPORTED:
+            print("%-10s skipped: needs discord.py 2.0 message components (have %s)" % (mode, discord.__version__))
+            continue
+        FishbowlBackend.CONFIRM_BUTTONS = mode == "buttons"
+        sim = Simulator(sessions=0, api_latency=args.api_latency, accept_rate=1.0, seed=1)
+        sim.bot._connection.user = FakeUser(sim, 1)
+        results = StartupProfiler.offline_loop(FishbowlBackend.bot).run_until_complete(measure(sim, args.rounds))
+        for name, (calls, p50) in results.items():
+            print("%-10s %-6s %10.1f %12.1f" % (mode, name, calls, p50 * 1e3))
+    FishbowlBot.clean_inactive_sessions.cancel()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# ScrapPile.suggest (the trigram index behind "did you mean") against scoring every scrap in the
+# pile with difflib, as the bowl grows. Queries are scraps from the pile with one letter changed,
+# as a typo would; "found" is how often the scrap meant comes back among the suggestions. The
+# trigram index is built by the first lookup, timed separately.
+# Run from the repository root: python -m benchmarks.fuzzy_lookup
+import argparse
+import difflib
+import random
+import string
+import time
+
+from ScrapPile import FUZZY_CUTOFF, MATCH_CANDIDATES, ScrapPile
+
+
+def random_scrap(rng):
+    return " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+                    for _ in range(rng.randint(1, 3)))
+
+
+def typo(scrap, rng):
+    i = rng.choice([i for i, letter in enumerate(scrap) if letter != " "])
+    return scrap[:i] + rng.choice(string.ascii_lowercase.replace(scrap[i], "")) + scrap[i + 1:]
+
+
+def linear_suggest(scraps, query):
+    # every scrap scored: the work grows with the pile
+    return difflib.get_close_matches(query, scraps, n=MATCH_CANDIDATES, cutoff=FUZZY_CUTOFF)
+
+
+def sweep(size, queries, rng):
+    scraps = [random_scrap(rng) for _ in range(size)]
+    pile = ScrapPile(scraps)
+    meant = [rng.choice(scraps) for _ in range(queries)]
+    typos = [typo(scrap, rng) for scrap in meant]
+
+    started = time.perf_counter()
+    pile.suggest(typos[0])
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    suggested = [[scrap for ratio, scrap in pile.suggest(query)] for query in typos]
+    indexed = (time.perf_counter() - started) / queries
+    found = sum(scrap in suggestions for scrap, suggestions in zip(meant, suggested)) / queries
+
+    linear_queries = typos[:max(1, queries * 1000 // size)]
+    started = time.perf_counter()
+    for query in linear_queries:
+        linear_suggest(scraps, query)
+    linear = (time.perf_counter() - started) / len(linear_queries)
+    print("%7d %10.1fms %10.1fus %6.0f%% %12.1fus" % (size, build * 1e3, indexed * 1e6, found * 100, linear * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time fuzzy scrap suggestions against bowl size.")
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="bowl sizes, comma separated")
+    parser.add_argument("--queries", type=int, default=200, help="misspelled lookups per bowl size")
+    args = parser.parse_args()
+    rng = random.Random(1)
+    print("%7s %12s %12s %7s %14s" % ("size", "index build", "suggest", "found", "difflib scan"))
+    for size in (int(size) for size in args.sizes.split(",")):
+        sweep(size, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
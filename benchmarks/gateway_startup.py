@@ -0,0 +1,64 @@
+# Time to on_ready and peak RSS with the default and the lean gateway options (LEAN_GATEWAY), each
+# in a fresh process. Startup runs as check_startup does, against StartupProfiler's stub gateway,
+# after --guilds synthetic GUILD_CREATEs of --members members each (see member_memory), so the
+# time counts the imports, setup, the guild payloads and session restore. --runs per mode, median.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.gateway_startup
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+MODES = {"default": "0", "lean": "1"}
+
+
+def measure(guilds, members):
+    # FishbowlBot first, so the profiler's clock starts before anything else is imported
+    import FishbowlBot
+    import resource
+    import discord
+    import FishbowlBackend
+    import StartupProfiler
+    from benchmarks.member_memory import BOT_ID, guild_payload, user_payload
+
+    bot = FishbowlBackend.bot
+    FishbowlBot.setup()
+    loop = StartupProfiler.offline_loop(bot)
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=dict(user_payload(BOT_ID), bot=True))
+    for guild in range(guilds):
+        state.parse_guild_create(guild_payload(10 * (guild + 1), members))
+    loop.run_until_complete(StartupProfiler.stub_gateway(bot, FishbowlBot.profiler))
+    FishbowlBot.clean_inactive_sessions.cancel()
+    print("%f %d" % (FishbowlBot.profiler.total(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run_mode(mode, args):
+    result = subprocess.run([sys.executable, "-m", "benchmarks.gateway_startup", "--mode", mode,
+                             "--guilds", str(args.guilds), "--members", str(args.members)],
+                            capture_output=True, text=True, check=True,
+                            env=dict(os.environ, LEAN_GATEWAY=MODES[mode]))
+    seconds, max_rss = result.stdout.split()[-2:]
+    return float(seconds), int(max_rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to on_ready and peak RSS for each set of gateway options.")
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--members", type=int, default=500, help="members per guild")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return measure(args.guilds, args.members)
+
+    print("%d guilds x %d members, median of %d runs" % (args.guilds, args.members, args.runs))
+    print("%-8s %12s %12s" % ("mode", "on_ready s", "max RSS MiB"))
+    for mode in MODES:
+        results = [run_mode(mode, args) for _ in range(args.runs)]
+        print("%-8s %12.3f %12.1f" % (mode, statistics.median(seconds for seconds, max_rss in results),
+                                      statistics.median(max_rss for seconds, max_rss in results) / 1024))
+
+
+if __name__ == "__main__":
+    main()
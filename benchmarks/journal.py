@@ -0,0 +1,84 @@
+# JournalStore append throughput, and recovery time against log length: the journal with
+# snapshots (the default), the journal replaying its whole log (no snapshots), and the row-based
+# SQLiteStore for the same history. Events are adds and moves between the bowl and hands, spread
+# over --sessions sessions, with one commit per simulated command as in the bot.
+# Run from the repository root: python -m benchmarks.journal
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import SessionStore
+from Session import Session
+
+
+async def fill(store, sessions, events, rng):
+    live = {}
+    for session_id in range(sessions):
+        store.create_session(session_id, 1, 100 + session_id, time.time())
+        live[session_id] = session = Session(session_id, 1, 100 + session_id, 0.0)
+        for user_id in (2, 3):
+            store.add_player(session_id, user_id)
+            session.add_player(user_id)
+    if isinstance(store, SessionStore.JournalStore):
+        store.state_of = live.get if store.snapshot_every else None
+    started = time.perf_counter()
+    for i in range(events):
+        session_id = rng.randrange(sessions)
+        session = live[session_id]
+        user_id = rng.choice((1, 2, 3))
+        hand = session.players[user_id]
+        if len(session.bowl) < 20 or rng.random() < 0.2:
+            scraps = ["scrap %d" % i]
+            store.add_scraps(session_id, SessionStore.BOWL, scraps)
+            session.add_scraps(session.bowl, scraps)
+        elif hand and rng.random() < 0.5:
+            scraps = [hand[rng.randrange(len(hand))]]
+            store.move_scraps(session_id, SessionStore.hand(user_id), SessionStore.BOWL, scraps)
+            session.bowl.extend(SessionStore.take_from(hand, scraps))
+        else:
+            scraps = session.bowl.sample(1, rng)
+            store.move_scraps(session_id, SessionStore.BOWL, SessionStore.hand(user_id), scraps)
+            hand.extend(SessionStore.take_from(session.bowl, scraps))
+        # the bot commits once per pass of the event loop
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    return time.perf_counter() - started, live
+
+
+def run(make_store, path, sessions, events):
+    store = make_store(path)
+    elapsed, live = asyncio.get_event_loop().run_until_complete(fill(store, sessions, events, random.Random(1)))
+    store.close()
+    started = time.perf_counter()
+    store = make_store(path)
+    loaded = store.load()
+    recovery = time.perf_counter() - started
+    store.close()
+    for session_id, session in live.items():
+        assert sorted(loaded[session_id].bowl) == sorted(session.bowl), "recovered a different bowl"
+    return elapsed, recovery
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal append throughput and recovery time against log length.")
+    parser.add_argument("--lengths", default="1000,10000,100000", help="events per run, comma separated")
+    parser.add_argument("--sessions", type=int, default=10)
+    args = parser.parse_args()
+
+    stores = (("journal", lambda path: SessionStore.JournalStore(path)),
+              ("journal, no snapshots", lambda path: SessionStore.JournalStore(path, snapshot_every=0)),
+              ("sqlite rows", SessionStore.SQLiteStore))
+    print("%8s  %-22s %14s %14s" % ("events", "store", "appends/s", "recovery [ms]"))
+    with tempfile.TemporaryDirectory() as directory:
+        for events in (int(length) for length in args.lengths.split(",")):
+            for name, make_store in stores:
+                path = os.path.join(directory, "%s-%d.db" % (name.replace(" ", ""), events))
+                elapsed, recovery = run(make_store, path, args.sessions, events)
+                print("%8d  %-22s %14.0f %14.1f" % (events, name, events / elapsed, recovery * 1e3))
+
+
+if __name__ == "__main__":
+    main()
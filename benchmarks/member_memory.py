@@ -0,0 +1,128 @@
+# What the gateway caches cost in memory under each set of gateway options: --guilds synthetic
+# GUILD_CREATE payloads with --members members each, then --messages MESSAGE_CREATEs from those
+# members, fed straight into the client's ConnectionState as the gateway would deliver them.
+# "members" is the default options plus the members intent (what resolving members from the cache
+# would need); "default" and "lean" are FishbowlBackend.gateway_options with LEAN_GATEWAY off and on.
+# Guild chunking is off in every mode since the payloads already list every member. Each mode runs
+# in its own process, so the RSS growth isn't muddied by what an earlier mode freed. "held" is what
+# tracemalloc (in a second run) still sees allocated once the payloads are collected; RSS also counts
+# the allocator's slack from parsing them.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.member_memory
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import discord
+from discord.ext import commands
+
+MODES = ("members", "default", "lean")
+BOT_ID = 1
+
+
+def user_payload(user_id):
+    return {'id': str(user_id), 'username': 'member%d' % user_id, 'discriminator': '0001', 'avatar': None}
+
+
+def member_payload(user_id):
+    return {'user': user_payload(user_id), 'roles': [], 'joined_at': '2020-01-01T00:00:00+00:00',
+            'deaf': False, 'mute': False, 'flags': 0}
+
+
+def guild_payload(guild_id, members):
+    first = guild_id * 10 ** 6
+    return {'id': str(guild_id), 'name': 'guild%d' % guild_id, 'owner_id': str(first), 'large': members > 250,
+            'member_count': members, 'unavailable': False, 'features': [], 'emojis': [], 'stickers': [],
+            'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0,
+                       'hoist': False, 'managed': False, 'mentionable': False}],
+            'channels': [{'id': str(guild_id + 1), 'type': 0, 'name': 'general', 'position': 0,
+                          'permission_overwrites': []}],
+            'members': [member_payload(first + i) for i in range(members)] + [member_payload(BOT_ID)]}
+
+
+def message_payload(message_id, guild_id, user_id):
+    member = member_payload(user_id)
+    return {'id': str(message_id), 'channel_id': str(guild_id + 1), 'guild_id': str(guild_id),
+            'author': member.pop('user'), 'member': member, 'content': 'draw %d' % (message_id % 5),
+            'timestamp': '2020-01-01T00:00:00+00:00', 'edited_timestamp': None, 'tts': False,
+            'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [], 'embeds': [],
+            'pinned': False, 'type': 0}
+
+
+def make_bot(mode):
+    import FishbowlBackend
+    options = FishbowlBackend.gateway_options(lean=mode == "lean")
+    if mode == "members":
+        options['intents'].members = True
+    options['chunk_guilds_at_startup'] = False
+    return commands.Bot(command_prefix=FishbowlBackend.get_prefix, help_command=None, **options)
+
+
+async def feed(bot, guilds, members, messages):
+    # guild IDs are spaced out so the guild's channel can take the next ID
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=dict(user_payload(BOT_ID), bot=True))
+    for guild in range(guilds):
+        state.parse_guild_create(guild_payload(10 * (guild + 1), members))
+    for message_id in range(messages):
+        guild_id = 10 * (message_id % guilds + 1)
+        state.parse_message_create(message_payload(10 ** 12 + message_id, guild_id,
+                                                   guild_id * 10 ** 6 + message_id % members))
+
+
+def rss():
+    # resident now, not the peak: the payloads are garbage once parsed
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(mode, guilds, members, messages, trace):
+    import StartupProfiler
+    bot = make_bot(mode)
+    loop = StartupProfiler.offline_loop(bot)
+    gc.collect()
+    before = rss()
+    if trace:
+        tracemalloc.start()
+    loop.run_until_complete(feed(bot, guilds, members, messages))
+    gc.collect()
+    if trace:
+        grown = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        grown = rss() - before
+    cached_members = sum(len(guild.members) for guild in bot.guilds)
+    print("%d %d %d %d" % (grown, cached_members, len(bot.users), len(bot.cached_messages)))
+
+
+def run_mode(mode, args, trace):
+    command = [sys.executable, "-m", "benchmarks.member_memory", "--mode", mode, "--guilds", str(args.guilds),
+               "--members", str(args.members), "--messages", str(args.messages)]
+    result = subprocess.run(command + ["--trace"] * trace, capture_output=True, text=True, check=True)
+    return [int(field) for field in result.stdout.split()[-4:]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway cache memory for each set of gateway options.")
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--members", type=int, default=500, help="members per guild")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return measure(args.mode, args.guilds, args.members, args.messages, args.trace)
+
+    print("%d guilds x %d members, %d messages" % (args.guilds, args.members, args.messages))
+    print("%-8s %9s %10s %10s %8s %9s" % ("mode", "RSS MiB", "held MiB", "members", "users", "messages"))
+    for mode in MODES:
+        grown, cached_members, users, messages = run_mode(mode, args, trace=False)
+        held = run_mode(mode, args, trace=True)[0]
+        print("%-8s %9.1f %10.1f %10d %8d %9d" % (mode, grown / 2 ** 20, held / 2 ** 20, cached_members, users,
+                                                  messages))
+
+
+if __name__ == "__main__":
+    main()
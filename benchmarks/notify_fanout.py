@@ -0,0 +1,165 @@
+# Time to DM every player when a session ends, sending one after another (the old `end`) vs the
+# current `end`, which looks DMs up and sends through NotificationDispatcher.fan_out. The bot's own
+# HTTP client talks to a local fake of Discord's REST API that answers every request after
+# --latency seconds: players aren't in the gateway cache's DM channels, so each one costs a
+# create_dm and a send. --fail-rate of the players can't be DMed (create_dm answers 403), which
+# the serial loop has to catch one by one and fan_out reports without stopping the batch.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.notify_fanout
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import time
+
+import discord
+from aiohttp import web
+
+import FishbowlBackend
+import FishbowlBot
+import StartupProfiler
+from Simulator import FakeUser, Simulator
+
+BOT_ID = 1
+
+
+def user_payload(user_id):
+    return {'id': str(user_id), 'username': 'player%d' % user_id, 'discriminator': '0001', 'avatar': None}
+
+
+class FakeDiscord:
+    # just enough of the REST API for logging in, opening DMs and sending messages
+    def __init__(self, latency, unreachable):
+        self.latency = latency
+        self.unreachable = unreachable
+        self.ids = itertools.count(10 ** 15)
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_get('/api/users/@me', self.me)
+        self.app.router.add_post('/api/users/@me/channels', self.create_dm)
+        self.app.router.add_post('/api/channels/{channel_id}/messages', self.send_message)
+
+    async def reply(self, payload, status=200):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        # discord.py only parses JSON sent as exactly "application/json", with no charset
+        return web.Response(body=json.dumps(payload).encode(), status=status, content_type='application/json')
+
+    async def me(self, request):
+        return await self.reply(dict(user_payload(BOT_ID), bot=True))
+
+    async def create_dm(self, request):
+        recipient_id = int((await request.json())['recipient_id'])
+        if recipient_id in self.unreachable:
+            return await self.reply({'message': 'Cannot send messages to this user', 'code': 50007}, status=403)
+        return await self.reply({'id': str(next(self.ids)), 'type': 1, 'last_message_id': None,
+                                 'recipients': [user_payload(recipient_id)]})
+
+    async def send_message(self, request):
+        body = await request.json()
+        return await self.reply({'id': str(next(self.ids)), 'channel_id': request.match_info['channel_id'],
+                                 'author': user_payload(BOT_ID), 'content': body.get('content') or '',
+                                 'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                                 'edited_timestamp': None, 'tts': False, 'mention_everyone': False, 'mentions': [],
+                                 'mention_roles': [], 'attachments': [], 'embeds': body.get('embeds') or [],
+                                 'pinned': False, 'type': 0})
+
+
+async def log_in(bot, port):
+    discord.http.Route.BASE = 'http://127.0.0.1:%d/api' % port
+    await StartupProfiler.stub_login(bot)
+    if hasattr(bot, 'setup_hook'):
+        await bot.http.static_login('token')
+    else:
+        await bot.http.static_login('token', bot=True)
+
+
+def uncached_users(user_ids):
+    # real discord.User objects the gateway would have cached, but with no DM channel open yet
+    for user_id in user_ids:
+        user = discord.User(state=FishbowlBackend.bot._connection, data=user_payload(user_id))
+        FishbowlBackend.user_cache.remember(FishbowlBackend.user_cache.users, user_id, user)
+        FishbowlBackend.user_cache.dm_channels.pop(user_id, None)
+
+
+async def serial_end(sim, players):
+    # what `end` did before the dispatcher: each DM looked up and sent in turn
+    user_ids = [next(sim.user_ids) for _ in range(players)]
+    uncached_users(user_ids)
+    failures = 0
+    for user_id in user_ids:
+        try:
+            dm_ctx = await FishbowlBackend.find_dm(user_id)
+            await FishbowlBackend.send_message(dm_ctx, "Session #0 ended!")
+        except discord.HTTPException:
+            failures += 1
+    return failures
+
+
+async def fanned_out_end(sim, players):
+    creator = sim.make_user()
+    await sim.invoke(creator, creator.dm_channel, "start")
+    session_id = FishbowlBot.users[creator.id]
+    joined = [sim.make_user() for _ in range(players)]
+    for player in joined:
+        await sim.invoke(player, player.dm_channel, "join %s" % session_id)
+    uncached_users([player.id for player in joined])
+    failures = []
+    fan_out = FishbowlBackend.dispatcher.fan_out
+
+    async def counted_fan_out(sends):
+        results = await fan_out(sends)
+        failures.extend(result for result in results if result is not None)
+        return results
+    FishbowlBackend.dispatcher.fan_out = counted_fan_out
+    try:
+        await sim.invoke(creator, creator.dm_channel, "end")
+    finally:
+        FishbowlBackend.dispatcher.fan_out = fan_out
+    return len(failures)
+
+
+async def measure(args):
+    sim = Simulator(sessions=0, seed=1)
+    sim.bot._connection.user = FakeUser(sim, BOT_ID)
+    await FishbowlBot.accept_commands()
+    rng = random.Random(1)
+    # user IDs the Simulator hands out next; the same share of them is unreachable in each mode
+    upcoming = range(10 ** 6, 10 ** 6 + 4 * (args.players + 1))
+    fake = FakeDiscord(args.latency, {user_id for user_id in upcoming if rng.random() < args.fail_rate})
+    runner = web.AppRunner(fake.app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    await log_in(sim.bot, site._server.sockets[0].getsockname()[1])
+    results = []
+    try:
+        for mode, run in (("serial", serial_end), ("fan-out", fanned_out_end)):
+            requests = fake.requests
+            started = time.perf_counter()
+            failures = await run(sim, args.players)
+            results.append((mode, time.perf_counter() - started, fake.requests - requests, failures))
+    finally:
+        await sim.bot.http.close()
+        await runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time ending a session's DMs, serially vs fanned out.")
+    parser.add_argument("--players", type=int, default=99)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake REST request")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="share of players that can't be DMed")
+    args = parser.parse_args()
+
+    FishbowlBot.setup()
+    results = StartupProfiler.offline_loop(FishbowlBackend.bot).run_until_complete(measure(args))
+    print("%d players, %.0f ms per request" % (args.players, args.latency * 1e3))
+    print("%-8s %10s %10s %10s" % ("mode", "seconds", "requests", "failures"))
+    for mode, seconds, requests, failures in results:
+        print("%-8s %10.3f %10d %10d" % (mode, seconds, requests, failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Prefix resolution per message: the old get_prefix, which opened and parsed guild_prefixes.json
+# for every guild message, against the in-memory table; plus how many file writes a burst of
+# changeprefix calls costs now that saves are batched.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.prefix_lookup
+import argparse
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import discord
+
+import FishbowlBackend
+import StartupProfiler
+
+
+def file_get_prefix(bot, message):
+    # get_prefix as it was before the prefix table was kept in memory
+    if message.channel.type is not discord.ChannelType.private:
+        with open(FishbowlBackend.PREFIX_JSON, 'r') as f:
+            prefixes = json.load(f)
+            if str(message.guild.id) not in prefixes:
+                prefixes[str(message.guild.id)] = FishbowlBackend.DEFAULT_PREFIX
+            pf = prefixes[str(message.guild.id)]
+    else:
+        pf = FishbowlBackend.DEFAULT_PREFIX
+    return pf
+
+
+def time_lookups(get_prefix, messages):
+    started = time.perf_counter()
+    for message in messages:
+        get_prefix(None, message)
+    return (time.perf_counter() - started) / len(messages)
+
+
+async def change_prefixes(guilds):
+    for guild_id in guilds:
+        await FishbowlBackend.changeprefix(guild_id, "?")
+    while FishbowlBackend._prefix_save_task is not None:
+        await FishbowlBackend._prefix_save_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-message prefix lookups from the file and from memory.")
+    parser.add_argument("--guilds", type=int, default=1000, help="guilds in guild_prefixes.json")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        FishbowlBackend.PREFIX_JSON = os.path.join(directory, "guild_prefixes.json")
+        with open(FishbowlBackend.PREFIX_JSON, 'w') as f:
+            json.dump({str(guild_id): "!" for guild_id in range(args.guilds)}, f, indent=4)
+        FishbowlBackend.load_prefixes()
+        channel = SimpleNamespace(type=discord.ChannelType.text)
+        messages = [SimpleNamespace(channel=channel, guild=SimpleNamespace(id=i % args.guilds))
+                    for i in range(args.messages)]
+
+        before = time_lookups(file_get_prefix, messages[:max(args.messages // 20, 1)])
+        after = time_lookups(FishbowlBackend.get_prefix, messages)
+        print("%d guilds: %.1fus per lookup from the file, %.3fus from memory (%.0fx)" % (
+            args.guilds, before * 1e6, after * 1e6, before / after))
+
+        writes = []
+        write_prefixes = FishbowlBackend.write_prefixes
+        FishbowlBackend.write_prefixes = lambda snapshot: (writes.append(len(snapshot)), write_prefixes(snapshot))
+        FishbowlBackend.PREFIX_SAVE_DELAY = 0.1
+        started = time.perf_counter()
+        StartupProfiler.offline_loop(FishbowlBackend.bot).run_until_complete(change_prefixes(range(args.guilds)))
+        print("%d changeprefix calls: %d file write(s), %.1fms" % (
+            args.guilds, len(writes), (time.perf_counter() - started) * 1e3))
+
+
+if __name__ == "__main__":
+    main()
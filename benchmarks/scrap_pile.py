@@ -0,0 +1,79 @@
+# ScrapPile against the list code it replaced: drawing named scraps (exact and other-case),
+# drawing random scraps, and membership tests, at a few pile sizes. Each timed operation puts
+# the scraps back afterwards so the pile size stays fixed.
+# Run from the repository root: python -m benchmarks.scrap_pile
+import argparse
+import random
+import time
+
+from ScrapPile import ScrapPile
+
+
+def list_take(pile, arg):
+    # the lookup draw/discard/pass did before ScrapPile
+    match_scrap = next((s for s in pile if arg == s),
+                       next((s for s in pile if arg.lower() == s.lower()), None))
+    if match_scrap is not None:
+        pile.remove(match_scrap)
+    return match_scrap
+
+
+def list_draw(pile, k, rng):
+    drawn_scraps = rng.sample(pile, k)
+    [pile.remove(scrap) for scrap in drawn_scraps]
+    return drawn_scraps
+
+
+def per_call(fn, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds
+
+
+def compare(size, k, rounds, rng):
+    scraps = ["Scrap number %d" % i for i in range(size)]
+    as_list = list(scraps)
+    pile = ScrapPile(scraps)
+    names = rng.sample(scraps, k)
+    other_case = [name.upper() for name in names]
+
+    def take_list(args):
+        taken = [list_take(as_list, arg) for arg in args]
+        as_list.extend(taken)
+
+    def take_pile(args):
+        taken = [pile.take(arg) for arg in args]
+        pile.extend(taken)
+
+    def draw_list():
+        as_list.extend(list_draw(as_list, k, rng))
+
+    def draw_pile():
+        pile.extend(pile.draw(k, rng))
+
+    rows = [("take %d exact" % k, lambda: take_list(names), lambda: take_pile(names)),
+            ("take %d other case" % k, lambda: take_list(other_case), lambda: take_pile(other_case)),
+            ("draw %d random" % k, draw_list, draw_pile),
+            ("%d x in" % k, lambda: [name in as_list for name in names], lambda: [name in pile for name in names])]
+    for name, list_fn, pile_fn in rows:
+        list_seconds = per_call(list_fn, rounds)
+        pile_seconds = per_call(pile_fn, rounds)
+        print("%6d  %-20s %10.1fus %10.1fus %8.1fx" % (size, name, list_seconds * 1e6, pile_seconds * 1e6,
+                                                       list_seconds / pile_seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ScrapPile with the list-based scrap lookups.")
+    parser.add_argument("--sizes", default="100,1000,10000", help="pile sizes, comma separated")
+    parser.add_argument("--k", type=int, default=5, help="scraps per operation")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    print("%6s  %-20s %12s %12s %9s" % ("size", "operation", "list", "ScrapPile", "speedup"))
+    for size in (int(size) for size in args.sizes.split(",")):
+        compare(size, args.k, args.rounds, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Starts --sessions sessions at once and has each try to fill a --bowl scrap bowl, --batch scraps
+# per add, through the real commands. A session stops at its first refused add. Checks that what
+# the sessions hold stays within MAX_TOTAL_BYTES and reports where the memory went.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.session_load
+import argparse
+import asyncio
+import resource
+import time
+
+import FishbowlBackend
+import FishbowlBot
+import StartupProfiler
+from Simulator import FakeUser, Simulator
+
+
+async def fill(sim, bowl, batch, refused):
+    session_id, channel, (creator,) = await sim.open_session(1, 0)
+    if session_id is None:
+        refused['start'] = refused.get('start', 0) + 1
+        return
+    for first in range(0, bowl, batch):
+        before = FishbowlBot.sessions[session_id].total_scraps
+        await sim.invoke(creator, channel, "add " + " ".join(
+            "s%d-%d" % (session_id, i) for i in range(first, min(first + batch, bowl))))
+        if FishbowlBot.sessions[session_id].total_scraps == before:
+            refused['add'] = refused.get('add', 0) + 1
+            return
+
+
+async def run(sim, sessions, bowl, batch, refused):
+    sim.bot._connection.user = FakeUser(sim, 1)
+    await FishbowlBot.accept_commands()
+    started = time.perf_counter()
+    await asyncio.gather(*[fill(sim, bowl, batch, refused) for _ in range(sessions)])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill many session bowls at once and check the memory budget.")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--bowl", type=int, default=10000, help="scraps each session tries to hold")
+    parser.add_argument("--batch", type=int, default=150, help="scraps per add (150 short ones fill a 2000-character message)")
+    args = parser.parse_args()
+
+    FishbowlBackend.dispatcher.route_rate = float("inf")
+    FishbowlBot.MAX_BOWL_SIZE = max(FishbowlBot.MAX_BOWL_SIZE, args.bowl)
+    FishbowlBot.setup()
+    sim = Simulator(sessions=0)
+    refused = {}
+    elapsed = StartupProfiler.offline_loop(FishbowlBackend.bot).run_until_complete(run(sim, args.sessions, args.bowl, args.batch, refused))
+    FishbowlBot.clean_inactive_sessions.cancel()
+
+    sessions = FishbowlBot.sessions.values()
+    used = sum(session.nbytes + session.history.nbytes for session in sessions)
+    scraps = sum(session.total_scraps for session in sessions)
+    print("%d sessions, %d scraps held in %.1fs; refused: %s" % (len(FishbowlBot.sessions), scraps, elapsed,
+                                                                  refused or "none"))
+    print("budget: %.1f MiB of %.1f MiB (%.0f B/scrap); max RSS %.1f MiB" % (
+        used / 2 ** 20, FishbowlBot.MAX_TOTAL_BYTES / 2 ** 20, used / max(scraps, 1),
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+    if used > FishbowlBot.MAX_TOTAL_BYTES:
+        print("Over budget!")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Per-command overhead of prefix vs slash dispatch, against the Simulator's mock HTTP layer with
+# instant REST calls: bot-side time from receiving a command to finishing it, and REST calls per
+# command. A prefix command is parsed out of the message text by bot.get_context; a slash command
+# arrives as an interaction payload for the command tree, and its first reply is an interaction
+# response that ctx.send fetches back. Slash commands need discord.py 2.0 and are reported as
+# skipped on 1.x.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.slash_dispatch
+import argparse
+import time
+
+import discord
+
+import FishbowlBackend
+import FishbowlBot
+import SlashCommands
+import StartupProfiler
+from Simulator import FakeContext, FakeUser, Simulator
+
+COMMANDS = ("hand", "check", "session", "draw 1")
+
+
+async def prefix_dispatch(sim, user, channel, text):
+    # what on_message does for a command, with the Simulator's context so replies stay offline
+    ctx = await sim.bot.get_context(sim.message(user, channel, text), cls=FakeContext)
+    await sim.bot.invoke(ctx)
+
+
+async def slash_dispatch(sim, user, channel, text):
+    await sim.slash(user, channel, text)
+
+
+async def measure(sim, dispatch, rounds):
+    await FishbowlBot.accept_commands()
+    session_id, channel, (creator, player) = await sim.open_session(2, rounds)
+    results = {}
+    for text in COMMANDS:
+        calls = sim.api_calls
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await dispatch(sim, player, channel, text)
+        results[text] = ((sim.api_calls - calls) / rounds, (time.perf_counter() - started) / rounds)
+    await sim.invoke(creator, channel, "end")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-command overhead of prefix and slash dispatch.")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    FishbowlBackend.dispatcher.route_rate = float("inf")
+    FishbowlBot.setup()
+    print("%-7s %-9s %10s %12s" % ("mode", "cmd", "calls/cmd", "us/cmd"))
+    for mode, dispatch in (("prefix", prefix_dispatch), ("slash", slash_dispatch)):
+        if mode == "slash" and not SlashCommands.SLASH_SUPPORTED:
+            print("%-7s skipped: needs discord.py 2.0 application commands (have %s)" % (mode, discord.__version__))
+            continue
+        sim = Simulator(sessions=0, seed=1)
+        sim.bot._connection.user = FakeUser(sim, 1)
+        results = StartupProfiler.offline_loop(FishbowlBackend.bot).run_until_complete(measure(sim, dispatch, args.rounds))
+        for text, (calls, seconds) in results.items():
+            print("%-7s %-9s %10.1f %12.1f" % (mode, text, calls, seconds * 1e6))
+
+
+if __name__ == "__main__":
+    main()
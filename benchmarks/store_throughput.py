@@ -0,0 +1,73 @@
+# Session store commits per second under a simulated load: --sessions concurrent sessions of
+# --players players each, every player firing --commands commands through the real handlers (the
+# Simulator's default mix), with the store the bot would use for SESSION_STORE=sqlite and =journal
+# on a fresh WAL database, and MemoryStore as the baseline. "per mutation" is the SQLite store
+# committing every change on its own instead of once per pass of the event loop.
+# Run from the repository root: DISCORD_TOKEN=x python -m benchmarks.store_throughput
+import argparse
+import os
+import tempfile
+
+import FishbowlBackend
+import FishbowlBot
+import SessionStore
+import StartupProfiler
+from Simulator import Simulator
+
+MODES = ("memory", "sqlite", "per mutation", "journal")
+
+
+def make_store(mode, path):
+    if mode == "memory":
+        return SessionStore.MemoryStore()
+    if mode == "journal":
+        return SessionStore.JournalStore(path, state_of=FishbowlBot.sessions.get)
+    store = SessionStore.SQLiteStore(path)
+    if mode == "per mutation":
+        store.schedule_commit = store.commit
+    return store
+
+
+def measure(mode, args, loop, directory):
+    store = make_store(mode, os.path.join(directory, "%s.db" % mode.replace(" ", "_")))
+    commits = [0]
+    commit = store.commit
+
+    def counted_commit():
+        commits[0] += 1
+        commit()
+    store.commit = counted_commit
+    if mode == "per mutation":
+        store.schedule_commit = counted_commit
+    FishbowlBot.store = store
+    sim = Simulator(sessions=args.sessions, players=args.players, commands_per_player=args.commands, seed=1)
+    try:
+        elapsed = loop.run_until_complete(sim.run())
+    finally:
+        store.close()
+    commands = sum(len(latencies) for latencies in sim.latencies.values())
+    return commands, commits[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session store commits per second under concurrent sessions.")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--commands", type=int, default=20, help="commands per player")
+    args = parser.parse_args()
+
+    FishbowlBackend.dispatcher.route_rate = float("inf")
+    FishbowlBot.setup()
+    loop = StartupProfiler.offline_loop(FishbowlBackend.bot)
+    print("%d sessions x %d players, %d commands each" % (args.sessions, args.players, args.commands))
+    print("%-13s %10s %10s %11s %12s" % ("store", "commands/s", "commits", "commits/s", "cmds/commit"))
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in MODES:
+            commands, commits, elapsed = measure(mode, args, loop, directory)
+            per_commit = "%.1f" % (commands / commits) if commits else "-"
+            print("%-13s %10.0f %10d %11.0f %12s" % (mode, commands / elapsed, commits, commits / elapsed, per_commit))
+    FishbowlBot.clean_inactive_sessions.cancel()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DISCORD_TOKEN', 'test')
+os.environ.pop('SESSION_DB', None)
+os.environ.pop('RECORD_COMMANDS', None)
+
+
+@pytest.fixture(scope="session")
+def bot():
+    import FishbowlBackend
+    import FishbowlBot
+    import StartupProfiler
+    FishbowlBackend.dispatcher.route_rate = float("inf")
+    FishbowlBot.setup()
+    loop = StartupProfiler.offline_loop(FishbowlBackend.bot)
+    loop.run_until_complete(FishbowlBot.accept_commands())
+    yield FishbowlBackend.bot
+    FishbowlBot.clean_inactive_sessions.cancel()
+
+
+@pytest.fixture
+def sim(bot):
+    from Simulator import FakeUser, Simulator
+    sim = Simulator(sessions=0, seed=1)
+    bot._connection.user = FakeUser(sim, 1)
+    yield sim
+    import FishbowlBot
+    for session_id in list(FishbowlBot.sessions):
+        del FishbowlBot.sessions[session_id]
+        FishbowlBot.registry.release_id(session_id)
+    FishbowlBot.users.clear()
+
+
+@pytest.fixture
+def run(bot):
+    import StartupProfiler
+    return StartupProfiler.offline_loop(bot).run_until_complete
+
+
+@pytest.fixture
+def invoke_errors(bot):
+    # commands that raised instead of answering, since the test started
+    import FishbowlBackend
+    before = dict(FishbowlBackend.command_errors.values)
+
+    def new_errors():
+        return {key: count - before.get(key, 0) for key, count in FishbowlBackend.command_errors.values.items()
+                if key[1] == 'CommandInvokeError' and count > before.get(key, 0)}
+    return new_errors
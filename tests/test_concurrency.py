@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+import FishbowlBot
+
+
+def check_consistent(session_id):
+    session = FishbowlBot.sessions[session_id]
+    assert session.total_scraps == len(session.bowl) + len(session.discard) + \
+        sum(len(hand) for hand in session.players.values())
+    assert session.creator in session.players
+    for player in session.players:
+        assert FishbowlBot.users[player] == session_id
+    assert {user for user, joined in FishbowlBot.users.items() if joined == session_id} == set(session.players)
+
+
+def test_concurrent_draw_pass_leave(sim, run, invoke_errors):
+    # every player fires draws, passes, plays, recalls and leave/rejoins at one session at once,
+    # with API calls and confirmations taking long enough for the handlers to interleave
+    sim.api_latency = 0.001
+    sim.answer_delay = 0.002
+    sim.accept_rate = 0.8
+    session_id, channel, players = run(sim.open_session(6, 60))
+    assert session_id is not None
+
+    async def play(user):
+        for _ in range(40):
+            command = sim.rng.choice(['draw', 'draw', 'pass', 'play', 'leave', 'recall'])
+            hand = FishbowlBot.hand_scraps(user.id)
+            if command == 'leave':
+                await sim.invoke(user, channel, "leave")
+                await sim.invoke(user, channel, "join %s" % session_id)
+            elif command in ('pass', 'play') and hand:
+                target = sim.rng.choice([player for player in players if player is not user])
+                scrap = sim.rng.choice(hand)
+                await sim.invoke(user, channel, 'pass %s "%s"' % (target.mention, scrap) if command == 'pass'
+                                 else 'play "%s"' % scrap)
+            elif command == 'recall':
+                await sim.invoke(user, channel, "recall")
+            else:
+                await sim.invoke(user, channel, "draw 2")
+            if session_id in FishbowlBot.sessions:
+                check_consistent(session_id)
+
+    run(asyncio.gather(*[play(player) for player in players]))
+
+    assert invoke_errors() == {}
+    if session_id in FishbowlBot.sessions:
+        check_consistent(session_id)
+        creator = next(player for player in players if player.id == FishbowlBot.sessions[session_id].creator)
+        run(sim.invoke(creator, channel, "end"))
+    assert session_id not in FishbowlBot.sessions
+
+
+def test_show_after_the_shower_left(sim, run, invoke_errors):
+    # the shower leaves while the viewer is still deciding
+    sim.answer_delay = 0.05
+    sim.accept_rate = 1.0
+    session_id, channel, (creator, shower, viewer) = run(sim.open_session(3, 0))
+
+    async def leave_midway():
+        await asyncio.sleep(0.01)
+        await sim.invoke(shower, channel, "leave")
+
+    run(asyncio.gather(sim.invoke(shower, channel, "show %s" % viewer.mention), leave_midway()))
+    assert invoke_errors() == {}
+    assert shower.id not in FishbowlBot.users
+    check_consistent(session_id)
+
+
+@pytest.mark.parametrize("command", ["draw 1", "play apple"])
+def test_command_while_the_session_ends(sim, run, invoke_errors, command):
+    # the creator ends the session while the command's first reply is on its way; sent from DMs,
+    # so the command still has the home channel announcement to make afterwards
+    sim.api_latency = 0.02
+    session_id, channel, (creator, player) = run(sim.open_session(2, 5))
+    run(sim.invoke(player, channel, "addtohand apple"))
+
+    async def end_midway():
+        await asyncio.sleep(0.01)
+        await sim.invoke(creator, channel, "end")
+
+    run(asyncio.gather(sim.invoke(player, player.dm_channel, command), end_midway()))
+    assert invoke_errors() == {}
+    assert session_id not in FishbowlBot.sessions
+    assert player.id not in FishbowlBot.users
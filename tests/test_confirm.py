@@ -0,0 +1,54 @@
+import pytest
+
+import ConfirmButtons
+import FishbowlBackend
+import FishbowlBot
+
+
+def calls_per_pass(sim, run):
+    session_id, channel, (creator, player) = run(sim.open_session(2, 0))
+    run(sim.invoke(creator, channel, "addtohand apple"))
+    calls = sim.api_calls
+    run(sim.invoke(creator, channel, "pass %s apple" % player.mention))
+    assert "apple" in FishbowlBot.sessions[session_id].players[player.id]
+    return sim.api_calls - calls
+
+
+def test_reaction_confirmations(sim, run, monkeypatch):
+    monkeypatch.setattr(FishbowlBackend, "CONFIRM_BUTTONS", False)
+    sim.accept_rate = 1.0
+    # the request, two reactions added and removed, and the pass's own reply
+    assert calls_per_pass(sim, run) == 6
+
+
+@pytest.mark.skipif(not ConfirmButtons.BUTTONS_SUPPORTED, reason="buttons need discord.py 2.0 message components")
+def test_button_confirmations(sim, run, monkeypatch):
+    monkeypatch.setattr(FishbowlBackend, "CONFIRM_BUTTONS", True)
+    sim.accept_rate = 1.0
+    assert calls_per_pass(sim, run) <= 4
+
+
+@pytest.mark.skipif(not ConfirmButtons.BUTTONS_SUPPORTED, reason="buttons need discord.py 2.0 message components")
+def test_button_denial(sim, run, monkeypatch):
+    monkeypatch.setattr(FishbowlBackend, "CONFIRM_BUTTONS", True)
+    sim.accept_rate = 0.0
+    session_id, channel, (creator, player) = run(sim.open_session(2, 0))
+    run(sim.invoke(creator, channel, "addtohand apple"))
+    run(sim.invoke(creator, channel, "pass %s apple" % player.mention))
+    assert "apple" in FishbowlBot.sessions[session_id].players[creator.id]
+    assert not FishbowlBackend.reaction_waiters.pairs
+
+
+@pytest.mark.skipif(not ConfirmButtons.BUTTONS_SUPPORTED, reason="buttons need discord.py 2.0 message components")
+def test_buttons_only_answer_the_receiver(sim, run):
+    async def press_as_both():
+        view = ConfirmButtons.ConfirmView(2, 1.0, yes_label="Accept", no_label="Deny")
+        await sim.press(view, view.yes_button, 3)
+        assert not view.answer.done()
+        await sim.press(view, view.no_button, 2)
+        return await view.answer
+
+    accepted, interaction = run(press_as_both())
+    assert not accepted and interaction.user.id == 2
+    # the refusal is one ephemeral reply
+    assert sim.api_calls == 1
@@ -0,0 +1,47 @@
+import FishbowlBackend
+import FishbowlBot
+
+
+def test_destructive_commands_only_suggest(sim, run, monkeypatch):
+    monkeypatch.setattr(FishbowlBot, "FUZZY_MATCH", True)
+    replies = []
+
+    def recording(send):
+        async def record(ctx, description="", *args, **kwargs):
+            replies.append(description)
+            return await send(ctx, description, *args, **kwargs)
+        return record
+    monkeypatch.setattr(FishbowlBackend, "send_error", recording(FishbowlBackend.send_error))
+    monkeypatch.setattr(FishbowlBackend, "send_embed", recording(FishbowlBackend.send_embed))
+
+    session_id, channel, (player,) = run(sim.open_session(1, 0))
+    run(sim.invoke(player, channel, "add apple pear plum"))
+    run(sim.invoke(player, channel, "draw apple pear plum"))
+    hand = FishbowlBot.sessions[session_id].players[player.id]
+    assert sorted(hand) == ["apple", "pear", "plum"]
+
+    for command in ("destroy apples", "discard apples", "play apples", "edit apples banana"):
+        run(sim.invoke(player, channel, command))
+        assert "apple" in hand
+        assert "Did you mean" in replies[-1] and "`apple`" in replies[-1]
+
+    # moving a scrap back to the bowl can be undone, so a close match is still taken
+    run(sim.invoke(player, channel, "return apples"))
+    assert "apple" not in hand
+    assert "apple" in FishbowlBot.sessions[session_id].bowl
+
+
+def test_destructive_commands_need_full_names(sim, run):
+    session_id, channel, (player,) = run(sim.open_session(1, 0))
+    run(sim.invoke(player, channel, "addtohand apple banana cherry"))
+    hand = FishbowlBot.sessions[session_id].players[player.id]
+
+    # a unique prefix is only suggested by commands that can't be taken back
+    for command in ("destroy app", "play ban"):
+        run(sim.invoke(player, channel, command))
+    assert sorted(hand) == ["apple", "banana", "cherry"]
+
+    run(sim.invoke(player, channel, "destroy APPLE"))
+    run(sim.invoke(player, channel, "return che"))
+    assert list(hand) == ["banana"]
+    assert list(FishbowlBot.sessions[session_id].bowl) == ["cherry"]
@@ -0,0 +1,43 @@
+import asyncio
+
+import FishbowlBot
+import SessionStore
+
+
+def state(session):
+    # piles are bags, so compare them sorted
+    state = SessionStore.session_state(session)
+    for key in ('bowl', 'discard'):
+        state[key] = sorted(state[key])
+    state['players'] = {user_id: sorted(hand) for user_id, hand in state['players'].items()}
+    return state
+
+
+def test_journal_recovers_snapshots_and_tail(sim, run, monkeypatch, tmp_path):
+    path = str(tmp_path / "journal.db")
+    store = SessionStore.JournalStore(path, state_of=FishbowlBot.sessions.get, snapshot_every=25)
+    monkeypatch.setattr(FishbowlBot, "store", store)
+    sim.accept_rate = 1.0
+    sim.commands_per_player = 30
+    opened = [run(sim.open_session(3, 15)) for _ in range(3)]
+    run(asyncio.gather(*[sim.play(player, channel, players)
+                         for session_id, channel, players in opened for player in players]))
+    for session_id, channel, players in opened:
+        run(sim.invoke(players[0], channel, "recall"))
+        run(sim.invoke(players[0], channel, "ban %s" % players[2].mention))
+        run(sim.invoke(players[0], channel, "edit scrap1 renamed"))
+    run(sim.invoke(opened[2][2][0], opened[2][1], "end"))
+    store.commit()
+
+    for session_id, channel, players in opened[:2]:
+        # compacted: a snapshot, and fewer events behind it than snapshot_every
+        assert store.db.execute("SELECT COUNT(*) FROM snapshots WHERE session_id = ?", (session_id,)).fetchone()[0] == 1
+        assert len(list(store.events(session_id))) < 25
+    store.close()
+
+    recovered = SessionStore.JournalStore(path).load()
+    assert set(recovered) == {opened[0][0], opened[1][0]}
+    for session_id in recovered:
+        live = FishbowlBot.sessions[session_id]
+        assert state(recovered[session_id]) == state(live)
+        assert recovered[session_id].total_scraps == live.total_scraps
@@ -0,0 +1,34 @@
+import asyncio
+
+import FishbowlBot
+from ScrapPile import scrap_bytes
+
+
+def test_session_bytes_count_scrap_overhead(sim, run, monkeypatch):
+    scraps = ["scrap%03d" % i for i in range(50)]
+    # room for 40 scraps counting the per-scrap overhead, but for all 50 counting only the strings
+    monkeypatch.setattr(FishbowlBot, "MAX_SESSION_BYTES", 40 * scrap_bytes(scraps[0]))
+    session_id, channel, (creator,) = run(sim.open_session(1, 0))
+    run(sim.invoke(creator, channel, "add " + " ".join(scraps)))
+    assert len(FishbowlBot.sessions[session_id].bowl) == 0
+    run(sim.invoke(creator, channel, "add " + " ".join(scraps[:40])))
+    assert len(FishbowlBot.sessions[session_id].bowl) == 40
+
+
+def test_concurrent_adds_stay_within_budget(sim, run, monkeypatch):
+    # many sessions filling their bowls at once, with sends slow enough for the adds to interleave
+    budget = 300 * 1000
+    monkeypatch.setattr(FishbowlBot, "MAX_TOTAL_BYTES", budget)
+    monkeypatch.setattr(FishbowlBot.registry, "budget_counted_at", None)
+    sim.api_latency = 0.001
+    opened = run(asyncio.gather(*[sim.open_session(2, 0) for _ in range(20)]))
+
+    async def fill(session_id, channel, players):
+        for batch in range(10):
+            await asyncio.gather(*[sim.invoke(player, channel, "add " + " ".join(
+                "s%d-%d-%d-%d" % (session_id, player.id, batch, i) for i in range(50))) for player in players])
+    run(asyncio.gather(*[fill(*session) for session in opened]))
+
+    used = sum(session.nbytes + session.history.nbytes for session in FishbowlBot.sessions.values())
+    assert 0.9 * budget < used <= budget
+    assert sum(session.total_scraps for session in FishbowlBot.sessions.values()) < 20 * 2 * 10 * 50
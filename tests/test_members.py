@@ -0,0 +1,33 @@
+import discord
+
+import FishbowlBackend
+import FishbowlBot
+
+
+def test_gateway_intents():
+    lean = FishbowlBackend.gateway_options(lean=True)
+    assert not lean['intents'].members
+    assert lean['member_cache_flags'] == discord.MemberCacheFlags.none()
+    for options in (lean, FishbowlBackend.gateway_options(lean=False)):
+        assert getattr(options['intents'], 'message_content', True)
+
+
+def test_ban_users_outside_the_session(sim, run, invoke_errors, monkeypatch):
+    # without the members intent, mentions and IDs are fetched and names simply aren't found
+    monkeypatch.setattr(FishbowlBackend.bot._connection, "_intents", discord.Intents.none())
+    session_id, channel, (creator, player) = run(sim.open_session(2, 0))
+    outsider, other = sim.make_user(), sim.make_user()
+    session = FishbowlBot.sessions[session_id]
+
+    run(sim.invoke(creator, channel, "ban %s" % outsider.mention))
+    run(sim.invoke(creator, channel, "ban %d" % other.id))
+    assert {outsider.id, other.id} <= session.bans
+    run(sim.invoke(creator, channel, "unban %d" % outsider.id))
+    assert outsider.id not in session.bans
+
+    stranger = sim.make_user()
+    run(sim.invoke(creator, channel, "ban %s" % stranger.name))
+    assert stranger.id not in session.bans
+    run(sim.invoke(creator, channel, "ban %s" % player.name))
+    assert player.id in session.bans and player.id not in session.players
+    assert invoke_errors() == {}
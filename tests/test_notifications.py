@@ -0,0 +1,112 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+
+import FishbowlBackend
+import FishbowlBot
+from NotificationDispatcher import NotificationDispatcher
+from Simulator import FakeChannel
+
+DM_LOOKUP_SECONDS = 0.05
+
+
+def test_dm_routes_share_the_recipient_key(sim):
+    user = sim.make_user()
+    guild_channel = FakeChannel(sim, guild=SimpleNamespace(id=1))
+    assert NotificationDispatcher.route_key(user) == NotificationDispatcher.route_key(user.dm_channel) == user.id
+    assert NotificationDispatcher.route_key(guild_channel) == guild_channel.id
+
+
+def slow_dm_lookups(monkeypatch):
+    looked_up = []
+    find_dm = FishbowlBackend.find_dm
+
+    async def slow_find_dm(user_id):
+        looked_up.append(user_id)
+        await asyncio.sleep(DM_LOOKUP_SECONDS)
+        return await find_dm(user_id)
+    monkeypatch.setattr(FishbowlBackend, "find_dm", slow_find_dm)
+    return looked_up
+
+
+def test_end_looks_up_dms_together(sim, run, monkeypatch):
+    creator = sim.make_user()
+    run(sim.invoke(creator, creator.dm_channel, "start"))
+    session_id = FishbowlBot.users[creator.id]
+    players = [sim.make_user() for _ in range(8)]
+    for player in players:
+        run(sim.invoke(player, player.dm_channel, "join %s" % session_id))
+    looked_up = slow_dm_lookups(monkeypatch)
+
+    started = time.perf_counter()
+    run(sim.invoke(creator, creator.dm_channel, "end"))
+    assert time.perf_counter() - started < 3 * DM_LOOKUP_SECONDS
+    assert sorted(looked_up) == sorted(player.id for player in players)
+    assert session_id not in FishbowlBot.sessions
+    assert not any(player.id in FishbowlBot.users for player in players + [creator])
+
+
+def test_inactive_sessions_close_before_notifying(sim, run, monkeypatch):
+    opened = [run(sim.open_session(3, 5)) for _ in range(4)]
+    for session_id, channel, players in opened:
+        FishbowlBot.sessions[session_id].last_active -= FishbowlBot.SESSION_TIMEOUT + 1
+        FishbowlBot.registry.track_expiry(session_id)
+    looked_up = slow_dm_lookups(monkeypatch)
+
+    async def check_closed_first():
+        await asyncio.sleep(DM_LOOKUP_SECONDS / 2)
+        return [session_id in FishbowlBot.sessions for session_id, channel, players in opened]
+
+    started = time.perf_counter()
+    _, still_open = run(asyncio.gather(FishbowlBot.clean_inactive_sessions.coro(), check_closed_first()))
+    assert time.perf_counter() - started < 3 * DM_LOOKUP_SECONDS
+    assert still_open == [False] * 4
+    assert len(looked_up) == 12
+
+
+def failing_dm_lookup(monkeypatch, failing_id):
+    # create_dm fails for one user; records every message that goes out
+    sent = []
+    find_dm = FishbowlBackend.find_dm
+    send_message = FishbowlBackend.send_message
+
+    async def find_dm_or_fail(user_id):
+        if user_id == failing_id:
+            raise discord.HTTPException(SimpleNamespace(status=500, reason="Internal Server Error"), "create_dm failed")
+        return await find_dm(user_id)
+
+    async def recorded_send_message(context, msg_text, view=None):
+        sent.append((context, msg_text))
+        return await send_message(context, msg_text, view)
+    monkeypatch.setattr(FishbowlBackend, "find_dm", find_dm_or_fail)
+    monkeypatch.setattr(FishbowlBackend, "send_message", recorded_send_message)
+    return sent
+
+
+def test_end_reports_a_failed_dm_lookup(sim, run, monkeypatch, invoke_errors):
+    creator = sim.make_user()
+    run(sim.invoke(creator, creator.dm_channel, "start"))
+    session_id = FishbowlBot.users[creator.id]
+    players = [sim.make_user() for _ in range(3)]
+    for player in players:
+        run(sim.invoke(player, player.dm_channel, "join %s" % session_id))
+    sent = failing_dm_lookup(monkeypatch, players[0].id)
+
+    run(sim.invoke(creator, creator.dm_channel, "end"))
+    assert invoke_errors() == {}
+    assert session_id not in FishbowlBot.sessions
+    assert {NotificationDispatcher.route_key(context) for context, msg_text in sent} == {players[1].id, players[2].id, creator.id}
+    assert sent[-1][1] == "Session #%s ended! (Couldn't notify 1 player(s))" % session_id
+
+
+def test_inactive_sessions_survive_a_failed_dm_lookup(sim, run, monkeypatch):
+    session_id, channel, players = run(sim.open_session(3, 0))
+    FishbowlBot.sessions[session_id].last_active -= FishbowlBot.SESSION_TIMEOUT + 1
+    FishbowlBot.registry.track_expiry(session_id)
+    sent = failing_dm_lookup(monkeypatch, players[0].id)
+
+    run(FishbowlBot.clean_inactive_sessions.coro())
+    assert session_id not in FishbowlBot.sessions
+    assert [NotificationDispatcher.route_key(context) for context, msg_text in sent] == [players[1].id, players[2].id]
@@ -0,0 +1,42 @@
+import json
+from types import SimpleNamespace
+
+import discord
+
+import FishbowlBackend
+
+
+def message_in(guild_id):
+    return SimpleNamespace(channel=SimpleNamespace(type=discord.ChannelType.text), guild=SimpleNamespace(id=guild_id))
+
+
+def test_prefix_changes_are_served_from_memory_and_saved_once(run, monkeypatch, tmp_path):
+    path = str(tmp_path / "guild_prefixes.json")
+    with open(path, 'w') as f:
+        json.dump({"1": "?"}, f)
+    monkeypatch.setattr(FishbowlBackend, "PREFIX_JSON", path)
+    monkeypatch.setattr(FishbowlBackend, "PREFIX_SAVE_DELAY", 0.01)
+    writes = []
+    write_prefixes = FishbowlBackend.write_prefixes
+    monkeypatch.setattr(FishbowlBackend, "write_prefixes",
+                        lambda snapshot: (writes.append(snapshot), write_prefixes(snapshot)))
+    FishbowlBackend.load_prefixes()
+    assert FishbowlBackend.get_prefix(None, message_in(1)) == "?"
+    assert FishbowlBackend.get_prefix(None, message_in(2)) == FishbowlBackend.DEFAULT_PREFIX
+
+    async def change():
+        for guild_id in range(2, 12):
+            await FishbowlBackend.changeprefix(guild_id, "$")
+        # served from memory before anything is written
+        assert FishbowlBackend.get_prefix(None, message_in(5)) == "$"
+        assert not writes
+        await FishbowlBackend._prefix_save_task
+    run(change())
+
+    assert len(writes) == 1
+    with open(path) as f:
+        saved = json.load(f)
+    assert saved["1"] == "?" and saved["11"] == "$" and len(saved) == 11
+    assert not (tmp_path / "guild_prefixes.json.tmp").exists()
+    FishbowlBackend.load_prefixes()
+    assert FishbowlBackend.get_prefix(None, message_in(11)) == "$"
@@ -0,0 +1,77 @@
+import FishbowlBackend
+import FishbowlBot
+from CommandRecorder import CommandRecorder, read_recording
+from Simulator import Replayer
+
+ALICE = 123456789012345678
+
+
+def make_recorder(tmp_path):
+    names = {"alice": ALICE}
+    return CommandRecorder(str(tmp_path / "commands.jsonl"), salt=b"salt",
+                           resolve_user=lambda session_id, name: names.get(name),
+                           user_arguments={'pass': 1, 'ban': None, 'show': 1}, keywords=('all',))
+
+
+def test_names_and_bare_ids_hash_like_mentions(tmp_path):
+    recorder = make_recorder(tmp_path)
+    alice = "<@%s>" % recorder.anonymize(ALICE)
+    assert recorder.anonymize_text('alice "apple pie"', 0, 1) == alice + ' "apple pie"'
+    assert recorder.anonymize_text('%d apple' % ALICE, 0, 1) == alice + ' apple'
+    assert recorder.anonymize_text('<@!%d> apple' % ALICE, 0, 1) == alice + ' apple'
+    # scraps that look like IDs are hashed too; other scraps are kept even if they match a name
+    assert recorder.anonymize_text('bob alice %d' % ALICE, 0, 1) == \
+        "<@%s> alice %s" % (recorder.anonymize("bob"), alice)
+    assert recorder.anonymize_text('all', 0, 1) == 'all'
+    assert recorder.anonymize_text('"alice" bob', 0, None) == "%s <@%s>" % (alice, recorder.anonymize("bob"))
+    recorder.close()
+
+
+def test_recording_leaks_nothing_and_replays(sim, run, monkeypatch, tmp_path):
+    path = str(tmp_path / "commands.jsonl")
+    recorder = CommandRecorder(path, session_of=FishbowlBot.users.get, resolve_user=FishbowlBot.recorded_user_id,
+                               user_arguments=FishbowlBot.USER_ARGUMENTS, keywords=FishbowlBot.SHOW_KEYWORDS)
+    monkeypatch.setattr(FishbowlBackend, "recorder", recorder)
+    sim.accept_rate = 1.0
+    session_id, channel, (creator, player, banned) = run(sim.open_session(3, 0))
+    outsider = sim.make_user()
+    run(sim.invoke(creator, channel, "add apple pear"))
+    run(sim.invoke(creator, channel, "draw apple pear"))
+    run(sim.invoke(creator, channel, 'pass %s apple' % player.name))
+    run(sim.invoke(creator, channel, 'pass %d pear' % player.id))
+    run(sim.invoke(creator, channel, "ban %s %d" % (banned.name, outsider.id)))
+    assert FishbowlBot.sessions[session_id].bans == {banned.id, outsider.id}
+    assert sorted(FishbowlBot.sessions[session_id].players[player.id]) == ["apple", "pear"]
+    run(sim.invoke(creator, channel, "end"))
+    monkeypatch.setattr(FishbowlBackend, "recorder", None)
+    recorder.close()
+
+    with open(path) as f:
+        recording = f.read()
+    for user in (creator, player, banned, outsider):
+        assert str(user.id) not in recording and user.name not in recording
+    entries = list(read_recording(path))
+    assert all(entry['ok'] for entry in entries)
+    # both passes name the same user, however they were typed
+    passes = [entry['a'].split()[0] for entry in entries if entry['c'] == 'pass']
+    assert passes[0] == passes[1]
+
+    replayer = Replayer(entries, speed=0, accept_rate=1.0)
+    started = []
+    start = FishbowlBot.start.callback
+
+    async def record_start(ctx, *args):
+        await start(ctx, *args)
+        started.append(FishbowlBot.users[ctx.author.id])
+    monkeypatch.setattr(FishbowlBot.start, "callback", record_start)
+    ended = []
+    end = FishbowlBot.end.callback
+
+    async def record_end(ctx, *args):
+        session = FishbowlBot.sessions[FishbowlBot.users[ctx.author.id]]
+        ended.append((len(session.bans), sorted(len(hand) for hand in session.players.values())))
+        await end(ctx, *args)
+    monkeypatch.setattr(FishbowlBot.end, "callback", record_end)
+    run(replayer.run())
+    assert len(started) == 1
+    assert ended == [(2, [0, 2])]
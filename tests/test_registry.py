@@ -0,0 +1,30 @@
+import gc
+
+import FishbowlBot
+from Session import Session
+from SessionRegistry import SessionRegistry
+
+
+def test_expiry_skips_reused_ids():
+    registry = SessionRegistry(10, 60)
+    session_id = registry.allocate_id()
+    registry.sessions[session_id] = Session(session_id, 1, None, 0.0)
+    registry.track_expiry(session_id)
+    # ended and its ID handed to a newer session before the old deadline came up
+    del registry.sessions[session_id]
+    registry.release_id(session_id)
+    assert registry.allocate_id() == session_id
+    registry.sessions[session_id] = Session(session_id, 2, None, 50.0)
+    registry.track_expiry(session_id)
+    assert registry.pop_expired(70.0) == []
+    assert registry.pop_expired(120.0) == [session_id]
+
+
+def test_ended_sessions_are_freed(sim, run):
+    session_id, channel, players = run(sim.open_session(3, 10))
+    run(sim.invoke(players[0], channel, "end"))
+    assert session_id not in FishbowlBot.sessions
+    # the expiry heap still has the session's entry until its deadline, but not the session
+    assert any(entry[2] == session_id for entry in FishbowlBot.registry.expiry_heap)
+    gc.collect()
+    assert not [obj for obj in gc.get_objects() if isinstance(obj, Session) and obj.id == session_id]
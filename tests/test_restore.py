@@ -0,0 +1,58 @@
+import time
+
+import FishbowlBot
+import SessionStore
+from SessionRegistry import SessionRegistry
+
+
+def test_claim_id_tolerates_taken_ids():
+    registry = SessionRegistry(10, 60)
+    first = registry.allocate_id()
+    # allocated but not registered yet
+    assert not registry.claim_id(first)
+    registry.sessions[first] = object()
+    assert not registry.claim_id(first)
+    assert registry.claim_id(5)
+    assert not registry.claim_id(5)
+    assert registry.claim_id(3)
+    assert 3 not in registry.free_ids and 5 not in registry.free_ids
+    assert sorted(registry.free_ids) == [1, 2, 4]
+
+
+def test_restore_skips_conflicts(sim, run, monkeypatch, tmp_path):
+    live_id, channel, (alice, bob) = run(sim.open_session(2, 0))
+    carol, dave = sim.make_user(), sim.make_user()
+
+    store = SessionStore.SQLiteStore(str(tmp_path / "sessions.db"))
+    now = time.time()
+    # same ID as the live session
+    store.create_session(live_id, carol.id, 0, now)
+    # alice is playing the live session by now; her hand goes back to the bowl
+    store.create_session(live_id + 1, carol.id, 0, now)
+    store.add_player(live_id + 1, alice.id)
+    store.add_scraps(live_id + 1, SessionStore.hand(alice.id), ["a1", "a2"])
+    store.add_scraps(live_id + 1, SessionStore.BOWL, ["b1"])
+    # its creator, bob, is playing the live session
+    store.create_session(live_id + 2, bob.id, 0, now)
+    store.add_player(live_id + 2, dave.id)
+    store.commit()
+    monkeypatch.setattr(FishbowlBot, "store", store)
+
+    run(FishbowlBot.restore_sessions())
+
+    assert FishbowlBot.sessions[live_id].creator == alice.id
+    assert FishbowlBot.users[alice.id] == live_id
+    assert FishbowlBot.users[bob.id] == live_id
+    restored = FishbowlBot.sessions[live_id + 1]
+    assert set(restored.players) == {carol.id}
+    assert sorted(restored.bowl) == ["a1", "a2", "b1"]
+    assert restored.total_scraps == 3
+    assert FishbowlBot.users[carol.id] == live_id + 1
+    assert live_id + 2 not in FishbowlBot.sessions
+    assert dave.id not in FishbowlBot.users
+
+    reloaded = store.load()
+    assert live_id + 2 not in reloaded
+    assert set(reloaded[live_id + 1].players) == {carol.id}
+    assert sorted(reloaded[live_id + 1].bowl) == ["a1", "a2", "b1"]
+    store.close()
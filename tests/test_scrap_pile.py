@@ -0,0 +1,70 @@
+import random
+from collections import Counter
+
+from ScrapPile import ScrapPile, scrap_bytes
+
+
+def test_exact_match_wins_over_other_case():
+    pile = ScrapPile(["Apple", "apple", "APPLE"])
+    assert pile.take("apple") == "apple"
+    assert pile.take("apple") in ("Apple", "APPLE")
+    assert pile.take("aPpLe") is not None
+    assert pile.take("apple") is None
+    assert len(pile) == 0
+
+
+def test_duplicates_and_prefixes():
+    pile = ScrapPile(["pear", "pear", "peach", "plum"])
+    assert pile.match("pea") == (None, ["peach", "pear"])
+    assert pile.match("plu") == ("plum", [])
+    assert pile.take("pear") == "pear"
+    assert "pear" in pile
+    assert pile.take_match("pea") == (None, ["peach", "pear"])
+    pile.remove("pear")
+    assert pile.take_match("pea") == ("peach", [])
+    assert list(pile) == ["plum"]
+
+
+def test_matches_a_list_under_random_changes():
+    rng = random.Random(3)
+    words = ["Word%d" % i for i in range(30)] + ["word%d" % i for i in range(10)]
+    pile, model = ScrapPile(), []
+    for _ in range(3000):
+        action = rng.random()
+        if action < 0.4 or not model:
+            scrap = rng.choice(words)
+            pile.append(scrap)
+            model.append(scrap)
+        elif action < 0.7:
+            scrap = rng.choice(words)
+            taken = pile.take(scrap)
+            if scrap in model:
+                assert taken == scrap
+            elif any(s.casefold() == scrap.casefold() for s in model):
+                assert taken.casefold() == scrap.casefold()
+            else:
+                assert taken is None
+            if taken is not None:
+                model.remove(taken)
+        elif action < 0.85:
+            drawn = pile.draw(min(len(model), 3), rng)
+            for scrap in drawn:
+                model.remove(scrap)
+        else:
+            old = rng.choice(model)
+            pile.replace(old, "new" + old)
+            model.remove(old)
+            model.append("new" + old)
+        assert Counter(pile) == Counter(model)
+        assert pile.nbytes == sum(scrap_bytes(scrap) for scrap in model)
+        assert all(pile[i] == scrap for i, scrap in enumerate(pile))
+
+
+def test_draw_is_uniform_over_copies():
+    rng = random.Random(5)
+    counts = Counter()
+    for _ in range(4000):
+        pile = ScrapPile(["a", "a", "b", "c"])
+        counts[pile.draw(1, rng)[0]] += 1
+    assert 1800 < counts["a"] < 2200
+    assert 800 < counts["b"] < 1200 and 800 < counts["c"] < 1200
@@ -0,0 +1,38 @@
+import pytest
+
+import FishbowlBot
+import SlashCommands
+
+pytestmark = pytest.mark.skipif(not SlashCommands.SLASH_SUPPORTED, reason="slash commands need discord.py 2.0")
+
+
+def test_every_command_is_registered(bot):
+    assert {command.name for command in bot.tree.get_commands()} == set(FishbowlBot.help_table)
+
+
+def test_slash_draw(sim, run, invoke_errors):
+    session_id, channel, (creator, player) = run(sim.open_session(2, 3))
+    calls = sim.api_calls
+    run(sim.slash(player, channel, "draw 2"))
+    assert len(FishbowlBot.sessions[session_id].players[player.id]) == 2
+    assert len(FishbowlBot.sessions[session_id].bowl) == 1
+    # the interaction response, fetching it back, and the drawn scraps in a DM
+    assert sim.api_calls - calls == 3
+    assert not invoke_errors()
+
+
+def test_slash_pass_confirmation(sim, run, invoke_errors):
+    sim.accept_rate = 1.0
+    session_id, channel, (creator, player) = run(sim.open_session(2, 0))
+    run(sim.slash(creator, channel, "addtohand apple"))
+    run(sim.slash(creator, channel, 'pass %s "apple"' % player.mention))
+    assert "apple" in FishbowlBot.sessions[session_id].players[player.id]
+    assert not invoke_errors()
+
+
+def test_slash_errors_reach_the_error_handlers(sim, run):
+    user = sim.make_user()
+    calls = sim.api_calls
+    run(sim.slash(user, user.dm_channel, "draw 1"))
+    # not in a session: answered with an error instead of raising
+    assert sim.api_calls - calls == 2
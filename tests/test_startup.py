@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import FishbowlBot
+import StartupProfiler
+
+
+def test_commands_wait_for_restore(sim, run, monkeypatch):
+    # a start that arrives mid-restore runs after it, so it can't take a restored session's ID
+    monkeypatch.setattr(FishbowlBot, "sessions_restored", asyncio.Event())
+    monkeypatch.setattr(FishbowlBot, "restore_task", None)
+    order = []
+
+    async def slow_restore():
+        await asyncio.sleep(0.01)
+        order.append("restored")
+    monkeypatch.setattr(FishbowlBot, "restore_sessions", slow_restore)
+
+    async def start():
+        user = sim.make_user()
+        await sim.invoke(user, user.dm_channel, "start")
+        order.append("started" if user.id in FishbowlBot.users else "refused")
+
+    async def startup():
+        await asyncio.sleep(0)
+        await FishbowlBot.accept_commands()
+
+    run(asyncio.gather(start(), startup()))
+    assert order == ["restored", "started"]
+
+
+def stubbed_startup(monkeypatch):
+    # a fresh, unrestored startup; the bot fixture has already run setup, which can't register twice
+    monkeypatch.setattr(FishbowlBot, "profiler", StartupProfiler.StartupProfiler(time.perf_counter()))
+    monkeypatch.setattr(FishbowlBot, "sessions_restored", asyncio.Event())
+    monkeypatch.setattr(FishbowlBot, "restore_task", None)
+    monkeypatch.setattr(FishbowlBot, "setup", lambda: None)
+    monkeypatch.setattr(StartupProfiler, "import_breakdown", lambda modules: "import breakdown")
+
+
+def test_check_startup(bot, monkeypatch, capsys):
+    stubbed_startup(monkeypatch)
+    assert FishbowlBot.check_startup()
+    assert FishbowlBot.sessions_restored.is_set()
+    assert FishbowlBot.profiler.ready is not None
+    assert [phase for phase, seconds in FishbowlBot.profiler.phases] == ["gateway connect", "session restore"]
+    assert "over the" not in capsys.readouterr().out
+
+
+def test_check_startup_over_budget(bot, monkeypatch, capsys):
+    stubbed_startup(monkeypatch)
+    monkeypatch.setattr(FishbowlBot, "STARTUP_BUDGET", -1.0)
+    assert not FishbowlBot.check_startup()
+    out = capsys.readouterr().out
+    assert "over the -1.000s budget!" in out
+    assert "import breakdown" in out
@@ -0,0 +1,81 @@
+import FishbowlBackend
+import FishbowlBot
+import SessionStore
+
+
+def piles(session):
+    # what's where, ignoring the order within each pile
+    locations = [SessionStore.BOWL, SessionStore.DISCARD] + [SessionStore.hand(user_id) for user_id in session.players]
+    return {location: sorted(SessionStore.pile_at(session, location)) for location in locations}
+
+
+def stored_session(sim, run, monkeypatch, tmp_path):
+    # a two-player session whose every change also goes to a SQLite store
+    store = SessionStore.SQLiteStore(str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(FishbowlBot, "store", store)
+    replies = []
+    send_error = FishbowlBackend.send_error
+
+    async def record_error(ctx, description="", *args, **kwargs):
+        replies.append(description)
+        return await send_error(ctx, description, *args, **kwargs)
+    monkeypatch.setattr(FishbowlBackend, "send_error", record_error)
+
+    session_id, channel, (creator, player) = run(sim.open_session(2, 10))
+    run(sim.invoke(creator, channel, "draw 3"))
+    run(sim.invoke(player, channel, "draw 2"))
+    run(sim.invoke(player, channel, 'play "%s"' % FishbowlBot.sessions[session_id].players[player.id][0]))
+    return store, replies, session_id, channel, creator
+
+
+def check_stored(store, session_id):
+    session = FishbowlBot.sessions[session_id]
+    store.commit()
+    assert piles(store.load()[session_id]) == piles(session)
+    assert session.total_scraps == sum(len(scraps) for scraps in piles(session).values()) == 10
+
+
+def test_undo_recall(sim, run, monkeypatch, tmp_path):
+    store, replies, session_id, channel, creator = stored_session(sim, run, monkeypatch, tmp_path)
+    session = FishbowlBot.sessions[session_id]
+    before = piles(session)
+
+    run(sim.invoke(creator, channel, "recall"))
+    assert all(len(hand) == 0 for hand in session.players.values())
+    run(sim.invoke(creator, channel, "undo"))
+    assert piles(session) == before
+    assert len(session.history) == 0
+    check_stored(store, session_id)
+    assert replies == []
+
+
+def test_undo_empty_all(sim, run, monkeypatch, tmp_path):
+    store, replies, session_id, channel, creator = stored_session(sim, run, monkeypatch, tmp_path)
+    session = FishbowlBot.sessions[session_id]
+    before = piles(session)
+
+    run(sim.invoke(creator, channel, "empty all"))
+    assert session.total_scraps == 0
+    assert not any(piles(session).values())
+    run(sim.invoke(creator, channel, "undo"))
+    assert piles(session) == before
+    check_stored(store, session_id)
+    assert replies == []
+
+
+def test_undo_with_nothing_to_undo(sim, run, monkeypatch, tmp_path):
+    store, replies, session_id, channel, creator = stored_session(sim, run, monkeypatch, tmp_path)
+    session = FishbowlBot.sessions[session_id]
+    before = piles(session)
+
+    run(sim.invoke(creator, channel, "undo"))
+    assert replies == ["Nothing to undo! (Only `recall`, `shuffle` and `empty` can be undone)"]
+    assert piles(session) == before
+
+    # a recall undone once leaves nothing for a second undo
+    run(sim.invoke(creator, channel, "recall"))
+    run(sim.invoke(creator, channel, "undo"))
+    run(sim.invoke(creator, channel, "undo"))
+    assert replies[-1].startswith("Nothing to undo!")
+    assert piles(session) == before
+    check_stored(store, session_id)